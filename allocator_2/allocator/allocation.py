@@ -1,45 +1,172 @@
 import json
+import os
+import sys
 import time
 import argparse
 import traceback
+from typing import Optional
 
-from gurobipy.gurobipy import GRB
+from gurobipy.gurobipy import GRB, GurobiError
 
 from allocator.constants import (
     FAILURE_TITLE,
     FAILURE_MESSAGE,
     GENERATED_MESSAGE,
     GENERATED_TITLE,
+    KILLED_MESSAGE,
+    KILLED_TITLE,
+    NOT_READY_MESSAGE,
+    NOT_READY_TITLE,
+    OUT_OF_MEMORY_MESSAGE,
+    OUT_OF_MEMORY_TITLE,
+    TIMEOUT_MESSAGE,
 )
 from allocator.utils import seconds_to_time
-from .type_hints import AllocationStatus, AllocationOutput
+from .type_hints import AllocationStatus, AllocationOutput, Allocation
 from .schema import InputData
-from .solver import Solver
+from .heuristic import GreedyAllocator
+from .matrix_solver import MatrixSolver
+from .profiling import Profiler
+from .resources import JobResources
+from .progress import ProgressCallback
+
+
+# Status of an allocation once a process starts running it
+RUNNING_STATE = {
+    "type": AllocationStatus.NOT_READY,
+    "title": NOT_READY_TITLE,
+    "message": NOT_READY_MESSAGE,
+}
+
+# Status of an allocation whose process quit without saving a result
+KILLED_STATE = {
+    "type": AllocationStatus.ERROR,
+    "title": KILLED_TITLE,
+    "message": KILLED_MESSAGE,
+    "progress": None,
+}
+
+# "exact" solves the model, "draft" only runs the greedy heuristic
+ALLOCATION_MODES = ("exact", "draft")
+# Largest share of the timeout the local search of the draft an exact solve
+# starts from may take
+DRAFT_TIMEOUT_SHARE = 0.01
 
 
 class Allocator:
-    def __init__(self, input_data: InputData):
+    def __init__(
+        self,
+        input_data: InputData,
+        initial_allocation: Optional[Allocation] = None,
+        resources: Optional[JobResources] = None,
+        progress: Optional[ProgressCallback] = None,
+        progress_interval: float = 5,
+        draft_time_limit: float = 0.5,
+    ):
         self._input_data = input_data
+        self._initial_allocation = initial_allocation
+        self._resources = resources
+        self._progress = progress
+        self._progress_interval = progress_interval
+        # Seconds the local search of the draft allocation may take
+        self._draft_time_limit = draft_time_limit
+
+    def set_initial_allocation(self, initial_allocation: Optional[Allocation]):
+        """Sets a previous allocation to warm start the solver from"""
+        self._initial_allocation = initial_allocation
+
+    def set_resources(self, resources: Optional[JobResources]):
+        """Sets the threads, memory and node files the solver may use"""
+        self._resources = resources
+
+    def set_progress(
+        self, progress: Optional[ProgressCallback], interval: float = 5
+    ):
+        """Sets a function called with the progress of the allocation, at
+        most once every interval seconds"""
+        self._progress = progress
+        self._progress_interval = interval
+
+    def _new_threshold(self) -> float:
+        if self._input_data.new_threshold is None:
+            return 1
+        return self._input_data.new_threshold
+
+    def _draft_allocation(self, time_limit: float) -> Allocation:
+        return GreedyAllocator(
+            self._input_data.staff,
+            self._input_data.session_streams,
+            self._input_data.weeks,
+            new_threshold=self._new_threshold(),
+            time_limit=time_limit,
+        ).run()
+
+    def run_draft_allocation(self) -> AllocationOutput:
+        """Allocates with the greedy heuristic only, which returns a feasible
+        but not optimal allocation in about a second"""
+        start_time = time.time()
+        profiler = Profiler()
+        with profiler.phase("draft"):
+            allocations = self._draft_allocation(self._draft_time_limit)
+        runtime = int(time.time() - start_time)
+        return AllocationOutput(
+            GENERATED_TITLE,
+            AllocationStatus.GENERATED,
+            GENERATED_MESSAGE.format(runtime=seconds_to_time(runtime)),
+            runtime,
+            result=allocations,
+            stats=profiler.to_dict(),
+        )
 
     def run_allocation(self) -> AllocationOutput:
+        if self._input_data.mode not in ALLOCATION_MODES:
+            raise ValueError(f"Unknown allocation mode {self._input_data.mode}")
+        if self._input_data.mode == "draft":
+            return self.run_draft_allocation()
         start_time = time.time()
-        solver = Solver(
+        profiler = Profiler()
+        # Without a previous allocation, the solver starts from a draft
+        initial_allocation = self._initial_allocation
+        if not initial_allocation:
+            with profiler.phase("draft"):
+                initial_allocation = self._draft_allocation(
+                    min(
+                        self._draft_time_limit,
+                        self._input_data.timeout * DRAFT_TIMEOUT_SHARE,
+                    )
+                )
+        solver = MatrixSolver(
             self._input_data.staff,
             self._input_data.session_streams,
             self._input_data.weeks,
+            new_threshold=self._new_threshold(),
             timeout=self._input_data.timeout,
+            initial_allocation=initial_allocation,
+            resources=self._resources,
+            progress=self._progress,
+            progress_interval=self._progress_interval,
+            stopping_rules=self._input_data.stopping_rules,
+            spread_mode=self._input_data.spread_mode,
+            backend=self._input_data.backend,
+            profiler=profiler,
         )
-        grb_status = solver.solve()
+        grb_status = solver.solve_decomposed()
         runtime = int(time.time() - start_time)
         allocations = {}
 
-        if grb_status == GRB.OPTIMAL or grb_status == GRB.TIME_LIMIT:
+        # Solves stopped with a solution return GRB.OPTIMAL, GRB.TIME_LIMIT
+        # means the timeout passed before any was found
+        if grb_status == GRB.OPTIMAL:
             title = GENERATED_TITLE
             allocations = solver.get_results()
             message = GENERATED_MESSAGE.format(runtime=seconds_to_time(runtime))
             status = AllocationStatus.GENERATED
         elif grb_status == GRB.INTERRUPTED:
             raise KeyboardInterrupt("Allocation process was interrupted")
+        elif grb_status == GRB.TIME_LIMIT:
+            title = FAILURE_TITLE
+            message = TIMEOUT_MESSAGE
+            status = AllocationStatus.ERROR
         else:
             title = FAILURE_TITLE
             message = FAILURE_MESSAGE
@@ -51,37 +178,76 @@ class Allocator:
             message,
             runtime,
             result=allocations,
+            stopped_by=solver.get_stopping_reasons(),
+            stats=solver.get_profile(),
         )
 
 
-def _run_allocation(allocator: Allocator, timetable_id: str):
+def _run_allocation(allocator: Allocator, timetable_id: str, data_hash: bytes):
     import django
 
     django.setup()
+    from django.conf import settings
+    from django.db import connections
+    from django.db.models import Q
+    from .cache import cache_result
     from .models import AllocationState
 
-    while True:
-        # Wait until allocation state is saved
-        try:
-            allocation_state = AllocationState.objects.get(
-                timetable_id=timetable_id
-            )
-            break
-        except AllocationState.DoesNotExist:
-            continue
+    # Database connections must not be shared with the parent process
+    connections.close_all()
+    # The allocation state is saved before this process is started, and its
+    # pid set once it started, which may be after this update
+    pid = os.getpid()
+    AllocationState.objects.filter(
+        Q(pid__isnull=True) | Q(pid=pid), timetable_id=timetable_id
+    ).update(pid=pid, **RUNNING_STATE)
+    # The allocation is replaced by a new process if its data changes, this
+    # one then mustn't overwrite its progress and result until it quits
+    allocation_state = AllocationState.objects.filter(
+        timetable_id=timetable_id, pid=pid
+    )
+    allocator.set_progress(
+        lambda progress: allocation_state.update(progress=progress),
+        settings.ALLOCATOR_PROGRESS_INTERVAL,
+    )
+    result = _allocation_result(allocator)
+    allocation_state.update(**result)
+    cache_result(data_hash, result)
+
 
+def _allocation_result(allocator: Allocator) -> dict:
+    """Runs the allocation and returns the AllocationState fields to save"""
     try:
         result = allocator.run_allocation()
-        allocation_state.result = result.result
-        allocation_state.runtime = result.runtime
-        allocation_state.title = result.title
-        allocation_state.type = result.type
-        allocation_state.message = result.message
+        return {
+            "result": result.result,
+            "runtime": result.runtime,
+            "title": result.title,
+            "type": result.type,
+            "message": result.message,
+            "progress": None,
+            "stopped_by": result.stopped_by,
+            "stats": result.stats,
+        }
     except:
-        allocation_state.type = AllocationStatus.ERROR
-        allocation_state.title = "An Error Occurred"
-        allocation_state.message = traceback.format_exc(0)
-    allocation_state.save()
+        error = sys.exc_info()[1]
+        if (
+            isinstance(error, GurobiError)
+            and error.errno == GRB.Error.OUT_OF_MEMORY
+        ):
+            # Gurobi needed more memory than the limit of the allocation
+            return {
+                "type": AllocationStatus.ERROR,
+                "title": OUT_OF_MEMORY_TITLE,
+                "message": OUT_OF_MEMORY_MESSAGE,
+                "progress": None,
+            }
+        return {
+            "type": AllocationStatus.ERROR,
+            "title": "An Error Occurred",
+            "message": traceback.format_exc(0),
+            "progress": None,
+        }
 
 
 def setup_parser():
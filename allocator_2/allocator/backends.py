@@ -0,0 +1,325 @@
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+import scipy.sparse as sp
+from gurobipy.gurobipy import GRB, Model
+
+BACKENDS = ("gurobi", "highs", "cpsat")
+
+# Continuous variables and fractional constraints are scaled by this factor
+# to become integer for CP-SAT
+CPSAT_SCALE = 1000
+# Bound of CP-SAT variables without a finite bound
+CPSAT_MAX_VALUE = 10 ** 12
+# Slack of the constraint keeping an optimised objective at its value
+OBJECTIVE_TOLERANCE = 1e-6
+
+
+@dataclass
+class Objective:
+    """Linear objective c x + constant"""
+
+    priority: int
+    coefficients: np.ndarray
+    constant: float = 0
+
+    def value(self, x: np.ndarray) -> float:
+        return float(self.coefficients @ x + self.constant)
+
+
+@dataclass
+class LinearProgram:
+    """
+    Solver independent form of a mixed integer program, minimising its
+    objectives lexicographically, from the highest priority, subject to
+    row_lb <= matrix x <= row_ub and lb <= x <= ub, where x is integer where
+    integer is True.
+    """
+
+    matrix: sp.csr_matrix
+    row_lb: np.ndarray
+    row_ub: np.ndarray
+    lb: np.ndarray
+    ub: np.ndarray
+    integer: np.ndarray
+    objectives: list[Objective]
+    # Start value of every variable, NaN where undefined
+    start: Optional[np.ndarray] = None
+
+    def add_rows(self, matrix: sp.spmatrix, row_lb, row_ub):
+        """Appends constraints row_lb <= matrix x <= row_ub"""
+        self.matrix = sp.vstack([self.matrix, sp.csr_matrix(matrix)]).tocsr()
+        self.row_lb = np.concatenate([self.row_lb, row_lb])
+        self.row_ub = np.concatenate([self.row_ub, row_ub])
+
+    def priority_objectives(self) -> list[Objective]:
+        """Objectives with the same priority blended by their weights, from
+        the highest priority"""
+        blended: dict[int, Objective] = {}
+        for objective in self.objectives:
+            total = blended.setdefault(
+                objective.priority,
+                Objective(objective.priority, np.zeros(len(self.lb))),
+            )
+            total.coefficients = total.coefficients + objective.coefficients
+            total.constant += objective.constant
+        return [blended[priority] for priority in sorted(blended, reverse=True)]
+
+
+def from_gurobi(model: Model) -> LinearProgram:
+    """
+    Extracts the linear program of a built multi-objective Gurobi model.
+    Args:
+        model: minimising model without general or quadratic constraints
+    Returns: linear program with every objective weighted by its ObjNWeight
+    """
+    model.update()
+    if model.NumGenConstrs or model.NumQConstrs or model.NumSOS:
+        raise ValueError("Only linear constraints can be solved elsewhere")
+    variables = model.getVars()
+    constraints = model.getConstrs()
+    rhs = np.array(model.getAttr("RHS", constraints), dtype=float)
+    senses = np.array(model.getAttr("Sense", constraints))
+    row_lb = np.where(senses == GRB.LESS_EQUAL, -np.inf, rhs)
+    row_ub = np.where(senses == GRB.GREATER_EQUAL, np.inf, rhs)
+    lb = np.array(model.getAttr("LB", variables), dtype=float)
+    ub = np.array(model.getAttr("UB", variables), dtype=float)
+    lb[lb <= -GRB.INFINITY] = -np.inf
+    ub[ub >= GRB.INFINITY] = np.inf
+    integer = np.array(model.getAttr("VType", variables)) != GRB.CONTINUOUS
+    start = np.array(model.getAttr("Start", variables), dtype=float)
+    start[start >= GRB.UNDEFINED] = np.nan
+
+    objectives = []
+    for objective in range(model.NumObj):
+        model.setParam("ObjNumber", objective)
+        weight = model.ObjNWeight * model.ModelSense
+        objectives.append(
+            Objective(
+                model.ObjNPriority,
+                weight
+                * np.array(model.getAttr("ObjN", variables), dtype=float),
+                weight * model.ObjNCon,
+            )
+        )
+    return LinearProgram(
+        matrix=sp.csr_matrix(model.getA()),
+        row_lb=row_lb,
+        row_ub=row_ub,
+        lb=lb,
+        ub=ub,
+        integer=integer,
+        objectives=objectives,
+        start=start if not np.isnan(start).all() else None,
+    )
+
+
+class _HighsPasses:
+    """Optimisation passes solved with HiGHS through SciPy"""
+
+    def __init__(self, program: LinearProgram, threads: Optional[int]):
+        # HiGHS doesn't parallelise branch and bound, threads are unused
+        self._program = program
+        self._objective_rows = []
+        self._objective_bounds = []
+
+    def minimise(
+        self,
+        objective: Objective,
+        time_limit: float,
+        start: Optional[np.ndarray],
+    ) -> tuple[int, Optional[np.ndarray]]:
+        # SciPy's HiGHS interface doesn't take starting solutions
+        from scipy.optimize import Bounds, LinearConstraint, milp
+
+        program = self._program
+        constraints = [
+            LinearConstraint(program.matrix, program.row_lb, program.row_ub)
+        ]
+        if self._objective_rows:
+            constraints.append(
+                LinearConstraint(
+                    sp.csr_matrix(np.vstack(self._objective_rows)),
+                    -np.inf,
+                    np.array(self._objective_bounds),
+                )
+            )
+        result = milp(
+            objective.coefficients,
+            integrality=program.integer.astype(int),
+            bounds=Bounds(program.lb, program.ub),
+            constraints=constraints,
+            options={"time_limit": time_limit, "disp": False},
+        )
+        if result.status == 0:
+            return GRB.OPTIMAL, result.x
+        if result.status == 1:
+            # The time limit may pass before any solution is found
+            if result.x is None:
+                return GRB.TIME_LIMIT, None
+            return GRB.TIME_LIMIT, result.x
+        if result.status == 2:
+            return GRB.INFEASIBLE, None
+        return GRB.NUMERIC, None
+
+    def bound(self, objective: Objective, value: float):
+        """Keeps the objective at most at its value in later passes"""
+        self._objective_rows.append(objective.coefficients)
+        self._objective_bounds.append(
+            value
+            - objective.constant
+            + max(OBJECTIVE_TOLERANCE, OBJECTIVE_TOLERANCE * abs(value))
+        )
+
+
+class _CpSatPasses:
+    """
+    Optimisation passes solved with OR-Tools CP-SAT. CP-SAT only solves
+    integer programs, so continuous variables are multiples of
+    1 / CPSAT_SCALE, and constraints and objectives with fractional
+    coefficients are multiplied by CPSAT_SCALE and rounded.
+    """
+
+    def __init__(self, program: LinearProgram, threads: Optional[int]):
+        try:
+            from ortools.sat.python import cp_model
+        except ImportError:
+            raise RuntimeError("The cpsat backend requires ortools")
+        self._cp_model = cp_model
+        self._threads = threads
+        self._model = cp_model.CpModel()
+        # Scale of every variable, CP-SAT variables are x times their scale
+        self._scale = np.where(program.integer, 1, CPSAT_SCALE)
+        lb = np.maximum(program.lb * self._scale, -CPSAT_MAX_VALUE)
+        ub = np.minimum(program.ub * self._scale, CPSAT_MAX_VALUE)
+        self._vars = [
+            self._model.NewIntVar(int(np.ceil(low)), int(np.floor(high)), "")
+            for low, high in zip(lb, ub)
+        ]
+        matrix = sp.csr_matrix(program.matrix @ sp.diags(1 / self._scale))
+        for row in range(matrix.shape[0]):
+            begin, end = matrix.indptr[row], matrix.indptr[row + 1]
+            coefficients, row_scale = self._integer_coefficients(
+                matrix.data[begin:end],
+                program.row_lb[row],
+                program.row_ub[row],
+            )
+            low = program.row_lb[row] * row_scale
+            high = program.row_ub[row] * row_scale
+            self._model.AddLinearConstraint(
+                self._expression(matrix.indices[begin:end], coefficients),
+                int(np.ceil(low - 1e-9)) if low > -np.inf else -CPSAT_MAX_VALUE,
+                int(np.floor(high + 1e-9))
+                if high < np.inf
+                else CPSAT_MAX_VALUE,
+            )
+
+    @staticmethod
+    def _integer_coefficients(coefficients, *bounds) -> tuple[list, int]:
+        """Returns integer coefficients and the factor they were scaled by"""
+        values = np.concatenate(
+            [coefficients, [bound for bound in bounds if np.isfinite(bound)]]
+        )
+        scale = 1 if np.allclose(values, np.round(values)) else CPSAT_SCALE
+        return np.round(coefficients * scale).astype(int).tolist(), scale
+
+    def _expression(self, indices, coefficients):
+        return self._cp_model.LinearExpr.WeightedSum(
+            [self._vars[index] for index in indices], coefficients
+        )
+
+    def _objective_expression(self, objective: Objective):
+        coefficients = objective.coefficients / self._scale
+        indices = np.flatnonzero(coefficients)
+        integer_coefficients, scale = self._integer_coefficients(
+            coefficients[indices]
+        )
+        return self._expression(indices, integer_coefficients), scale
+
+    def minimise(
+        self,
+        objective: Objective,
+        time_limit: float,
+        start: Optional[np.ndarray],
+    ) -> tuple[int, Optional[np.ndarray]]:
+        cp_model = self._cp_model
+        expression, _ = self._objective_expression(objective)
+        self._model.Minimize(expression)
+        self._model.ClearHints()
+        if start is not None:
+            for var, value, scale in zip(self._vars, start, self._scale):
+                if not np.isnan(value):
+                    self._model.AddHint(var, int(round(value * scale)))
+        solver = cp_model.CpSolver()
+        solver.parameters.max_time_in_seconds = time_limit
+        if self._threads:
+            solver.parameters.num_workers = self._threads
+        status = solver.Solve(self._model)
+        if status in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+            x = (
+                np.array([solver.Value(var) for var in self._vars])
+                / self._scale
+            )
+            return (
+                GRB.OPTIMAL if status == cp_model.OPTIMAL else GRB.TIME_LIMIT,
+                x,
+            )
+        if status == cp_model.INFEASIBLE:
+            return GRB.INFEASIBLE, None
+        if status == cp_model.UNKNOWN:
+            return GRB.TIME_LIMIT, None
+        return GRB.NUMERIC, None
+
+    def bound(self, objective: Objective, value: float):
+        """Keeps the objective at most at its value in later passes"""
+        expression, scale = self._objective_expression(objective)
+        scaled_value = (value - objective.constant) * scale
+        self._model.Add(expression <= int(np.floor(scaled_value + 0.5)))
+
+
+_PASSES = {"highs": _HighsPasses, "cpsat": _CpSatPasses}
+
+
+def solve_lexicographic(
+    program: LinearProgram,
+    backend: str,
+    timeout: float,
+    threads: Optional[int] = None,
+) -> tuple[int, Optional[np.ndarray]]:
+    """
+    Minimises the objectives of a linear program one priority at a time,
+    keeping every optimised objective at its best value, like Gurobi solves
+    multi-objective models. Passes share the time limit, and the solve stops
+    with the solution of the last finished pass once it runs out.
+    Args:
+        program: linear program to solve
+        backend: "highs" or "cpsat"
+        timeout: time limit of the whole solve in seconds
+        threads: threads used by the backend, defaults to all cores
+    Returns: GRB.OPTIMAL if every pass was solved, GRB.TIME_LIMIT if the time
+        limit stopped the solve, or another GRB status if no solution was
+        found, and the solution if there is one
+    """
+    passes = _PASSES[backend](program, threads)
+    deadline = time.time() + timeout
+    status = GRB.OPTIMAL
+    x = program.start
+    solution = None
+    for objective in program.priority_objectives():
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            status = GRB.TIME_LIMIT
+            break
+        pass_status, pass_x = passes.minimise(objective, remaining, x)
+        if pass_x is None:
+            if solution is None:
+                return pass_status, None
+            status = GRB.TIME_LIMIT
+            break
+        x = solution = pass_x
+        if pass_status == GRB.TIME_LIMIT:
+            status = GRB.TIME_LIMIT
+        passes.bound(objective, objective.value(solution))
+    return status, solution
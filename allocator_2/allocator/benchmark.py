@@ -0,0 +1,359 @@
+import argparse
+import json
+import multiprocessing as mp
+import platform
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from gurobipy.gurobipy import GRB, gurobi, quicksum, abs_
+
+from .backends import BACKENDS
+from .decoding import decode_input_data, loads
+from .generator import SCENARIOS, generate_input_data
+from .matrix_solver import MatrixSolver
+from .profiling import peak_rss
+from .schema import InputData
+
+
+class AbsSpreadSolver(MatrixSolver):
+    """Spread objective linked with abs_ general constraints, as it was
+    built before the linear formulation, kept as a benchmark baseline"""
+
+    # General constraints need a Gurobi model
+    _builds_program = False
+
+    def _setup_spread_objective(self):
+        total_hours = self._tutor_total_hours()
+        mean_hours = sum(
+            session_stream.time.duration()
+            * session_stream.number_of_tutors
+            * len(session_stream.weeks)
+            for session_stream in self._session_streams.values()
+        ) / len(self._tutors)
+        differences = {
+            tutor_id: self._model.addVar(lb=-GRB.INFINITY)
+            for tutor_id in self._tutors
+        }
+        variance = {tutor_id: self._model.addVar() for tutor_id in self._tutors}
+        for tutor_id in self._tutors:
+            self._model.addConstr(
+                total_hours[tutor_id] - differences[tutor_id] == mean_hours
+            )
+            self._model.addConstr(
+                variance[tutor_id] == abs_(differences[tutor_id])
+            )
+        spread = quicksum(variance[tutor_id] for tutor_id in self._tutors)
+        self._model.setObjectiveN(spread, 2, priority=1)
+
+
+# Spread objective formulation: solver class and arguments
+FORMULATIONS = {
+    "abs": (AbsSpreadSolver, {}),
+    "sum": (MatrixSolver, {"spread_mode": "sum"}),
+    "max": (MatrixSolver, {"spread_mode": "max"}),
+}
+
+
+# Phases of a profile that solve, rather than build, the model
+_SOLVE_PHASES = ("initial_allocation", "extract_model", "optimize")
+# Relative tolerance of objective values between runs
+_OBJECTIVE_TOLERANCE = 1e-6
+# Runtimes below this many seconds are too noisy to flag
+_MIN_FLAGGED_RUNTIME = 1
+
+
+def run_benchmark(
+    input_data: InputData,
+    formulation: str,
+    timeout: Optional[int] = None,
+    threads: Optional[int] = None,
+    backend: str = "gurobi",
+) -> dict:
+    """
+    Solves the input data with a spread objective formulation.
+    Args:
+        input_data: allocation input data
+        formulation: key of FORMULATIONS
+        timeout: time limit, defaults to the timeout of the input data
+        threads: solver threads, defaults to all cores
+        backend: solver of the model, one of BACKENDS
+    Returns: solve status, runtime, build and solve time in seconds, model
+        size, the value of every objective, objective values summed per
+        priority and peak memory in bytes
+    """
+    solver_class, kwargs = FORMULATIONS[formulation]
+    solver = solver_class(
+        input_data.staff,
+        input_data.session_streams,
+        input_data.weeks,
+        timeout=timeout or input_data.timeout,
+        threads=threads,
+        backend=backend,
+        **kwargs,
+    )
+    # Only Gurobi backends have a model
+    if solver._model is not None:
+        solver._model.setParam("OutputFlag", 0)
+    start_time = time.time()
+    status = solver.solve()
+    runtime = time.time() - start_time
+    objectives = []
+    priorities: dict[str, float] = {}
+    if status == GRB.OPTIMAL:
+        objectives = solver.objective_values()
+        for priority, value in zip(solver.objective_priorities(), objectives):
+            # JSON object keys are strings
+            priorities[str(priority)] = priorities.get(str(priority), 0) + value
+    phases = solver.get_profile()["phases"]
+    return {
+        "status": status,
+        "runtime": runtime,
+        "build_time": sum(
+            phase["wall"]
+            for phase in phases
+            if phase["name"] not in _SOLVE_PHASES
+        ),
+        "solve_time": sum(
+            phase["wall"] for phase in phases if phase["name"] in _SOLVE_PHASES
+        ),
+        **solver.model_size(),
+        "objectives": objectives,
+        "priorities": priorities,
+        "peak_rss": peak_rss(),
+    }
+
+
+def _run_isolated(*args) -> dict:
+    """Runs a benchmark in a new process, so that its peak memory isn't
+    that of earlier benchmarks"""
+    with ProcessPoolExecutor(1, mp_context=mp.get_context("spawn")) as pool:
+        return pool.submit(run_benchmark, *args).result()
+
+
+def load_input_data(path: str) -> InputData:
+    """Reads input data from a JSON file, either the input data itself or an
+    allocation request with the input data in its data member"""
+    with open(path, "rb") as file:
+        data = loads(file.read())
+    return decode_input_data(data.get("data", data))
+
+
+def _lower_priorities_worse(result: dict, baseline: dict) -> bool:
+    """Compares objective values lexicographically, from the highest
+    priority"""
+    for priority in sorted(baseline["priorities"], key=int, reverse=True):
+        value = result["priorities"].get(priority)
+        base = baseline["priorities"][priority]
+        if value is None:
+            return True
+        tolerance = _OBJECTIVE_TOLERANCE * max(1, abs(base))
+        if value > base + tolerance:
+            return True
+        if value < base - tolerance:
+            return False
+    return False
+
+
+def find_regressions(
+    results: list[dict], baseline: list[dict], tolerance: float
+) -> list[str]:
+    """
+    Compares benchmark results with the results of an earlier run.
+    Args:
+        results: results of this run
+        baseline: results of the earlier run
+        tolerance: relative increase of runtime or peak memory flagged
+    Returns: description of every regression
+    """
+    baseline_results = {
+        (result["name"], result["formulation"], result["backend"]): result
+        for result in baseline
+    }
+    regressions = []
+    for result in results:
+        key = (result["name"], result["formulation"], result["backend"])
+        base = baseline_results.get(key)
+        if base is None or "error" in base:
+            continue
+        name = "/".join(key)
+        if "error" in result:
+            regressions.append(f"{name}: failed with {result['error']}")
+            continue
+        if base["status"] == GRB.OPTIMAL and result["status"] != GRB.OPTIMAL:
+            regressions.append(f"{name}: status {result['status']}")
+            continue
+        if (
+            result["runtime"] > base["runtime"] * (1 + tolerance)
+            and result["runtime"] > _MIN_FLAGGED_RUNTIME
+        ):
+            regressions.append(
+                f"{name}: runtime {base['runtime']:.2f}s -> "
+                f"{result['runtime']:.2f}s"
+            )
+        if (
+            result["peak_rss"] is not None
+            and base["peak_rss"] is not None
+            and result["peak_rss"] > base["peak_rss"] * (1 + tolerance)
+        ):
+            regressions.append(
+                f"{name}: peak memory {base['peak_rss'] / 2 ** 20:.0f}MiB -> "
+                f"{result['peak_rss'] / 2 ** 20:.0f}MiB"
+            )
+        if _lower_priorities_worse(result, base):
+            regressions.append(
+                f"{name}: objectives {base['priorities']} -> "
+                f"{result['priorities']}"
+            )
+    return regressions
+
+
+def setup_parser():
+    parser = argparse.ArgumentParser(
+        prog="allocator.benchmark",
+        description="Compare solve times of spread objective formulations "
+        "and solver backends",
+    )
+    parser.add_argument(
+        "payloads", nargs="*", help="JSON files containing model input"
+    )
+    parser.add_argument(
+        "--scenarios",
+        nargs="+",
+        choices=list(SCENARIOS),
+        default=[],
+        help="generated timetables to solve",
+    )
+    parser.add_argument(
+        "--seed", type=int, default=0, help="seed of generated timetables"
+    )
+    parser.add_argument(
+        "--formulations",
+        nargs="+",
+        choices=list(FORMULATIONS),
+        default=list(FORMULATIONS),
+        help="spread objective formulations to compare",
+    )
+    parser.add_argument(
+        "--backends",
+        nargs="+",
+        choices=list(BACKENDS),
+        default=["gurobi"],
+        help="solver backends to compare",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=1, help="solves per formulation"
+    )
+    parser.add_argument(
+        "--timeout", type=int, help="time limit of every solve in seconds"
+    )
+    parser.add_argument("--threads", type=int, help="solver threads")
+    parser.add_argument("--output", help="JSON file to write results to")
+    parser.add_argument(
+        "--baseline",
+        help="JSON results of an earlier run, regressions from it are "
+        "flagged and make the benchmark exit with status 1",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="relative increase of runtime or peak memory flagged as a "
+        "regression",
+    )
+    return parser
+
+
+def _inputs(args):
+    """Yields the name and input data of every payload and scenario"""
+    for path in args.payloads:
+        yield path, load_input_data(path)
+    for scenario in args.scenarios:
+        yield scenario, generate_input_data(args.seed, **SCENARIOS[scenario])
+
+
+def main():
+    parser = setup_parser()
+    args = parser.parse_args()
+    if not args.payloads and not args.scenarios:
+        parser.error("no payloads or scenarios to solve")
+
+    print(
+        f"{'payload':30} {'formulation':>11} {'backend':>7} {'status':>6} "
+        f"{'build':>7} {'solve':>8} {'vars':>7} {'constrs':>8} "
+        f"{'genconstrs':>10} {'memory':>7}  objectives"
+    )
+    results = []
+    for name, input_data in _inputs(args):
+        for formulation in args.formulations:
+            for backend in args.backends:
+                if backend != "gurobi" and formulation == "abs":
+                    # Other backends can't solve general constraints
+                    continue
+                benchmark = {
+                    "name": name,
+                    "formulation": formulation,
+                    "backend": backend,
+                }
+                try:
+                    runs = [
+                        _run_isolated(
+                            input_data,
+                            formulation,
+                            args.timeout,
+                            args.threads,
+                            backend,
+                        )
+                        for _ in range(args.repeat)
+                    ]
+                except Exception as error:
+                    benchmark["error"] = str(error)
+                    results.append(benchmark)
+                    print(
+                        f"{name[-30:]:30} {formulation:>11} {backend:>7}  "
+                        f"{error}"
+                    )
+                    continue
+                result = benchmark | runs[-1]
+                for timing in ("runtime", "build_time", "solve_time"):
+                    result[timing] = statistics.median(
+                        run[timing] for run in runs
+                    )
+                results.append(result)
+                objectives = ", ".join(f"{v:g}" for v in result["objectives"])
+                memory = (result["peak_rss"] or 0) / 2 ** 20
+                print(
+                    f"{name[-30:]:30} {formulation:>11} {backend:>7} "
+                    f"{result['status']:>6} {result['build_time']:>7.2f} "
+                    f"{result['solve_time']:>8.2f} {result['vars']:>7} "
+                    f"{result['constrs']:>8} {result['gen_constrs']:>10} "
+                    f"{memory:>6.0f}M  {objectives}"
+                )
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(
+                {
+                    "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                    "python": platform.python_version(),
+                    "gurobi": ".".join(map(str, gurobi.version())),
+                    "seed": args.seed,
+                    "results": results,
+                },
+                file,
+                indent=2,
+            )
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)["results"]
+        regressions = find_regressions(results, baseline, args.tolerance)
+        for regression in regressions:
+            print("REGRESSION", regression)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
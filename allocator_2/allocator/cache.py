@@ -0,0 +1,96 @@
+import hashlib
+from typing import Optional
+
+from django.conf import settings
+from django.utils import timezone
+
+from .constants import GENERATED_MESSAGE, GENERATED_TITLE
+from .decoding import canonical_json
+from .models import CachedResult
+from .type_hints import AllocationStatus
+from .utils import seconds_to_time
+
+
+def input_hash(json_data: dict) -> bytes:
+    """
+    Hashes allocation input data independently of key order and of the
+    timetable it belongs to.
+    Args:
+        json_data: allocation input data, as sent to request_allocation
+    Returns: SHA-256 digest of the canonical serialisation of the input data
+    """
+    canonical = canonical_json(
+        {
+            key: value
+            for key, value in json_data.items()
+            if key != "timetable_id"
+        }
+    )
+    return hashlib.sha256(canonical).digest()
+
+
+def get_cached_result(data_hash: bytes) -> Optional[CachedResult]:
+    """Returns the cached result for the input data hash if there is one,
+    marking it as recently used"""
+    if settings.ALLOCATOR_RESULT_CACHE_SIZE <= 0:
+        return None
+    cached_result = CachedResult.objects.filter(data_hash=data_hash).first()
+    if cached_result is not None:
+        cached_result.last_used = timezone.now()
+        CachedResult.objects.filter(pk=cached_result.pk).update(
+            last_used=cached_result.last_used
+        )
+    return cached_result
+
+
+def cached_result_state(cached_result: CachedResult) -> dict:
+    """Returns the AllocationState fields to save for a cached result, as if
+    the allocation had generated it"""
+    return {
+        "pid": None,
+        "input_data": None,
+        "initial_allocation": None,
+        "progress": None,
+        "stopped_by": None,
+        "stats": None,
+        "result": cached_result.result,
+        "runtime": cached_result.runtime,
+        "type": AllocationStatus.GENERATED,
+        "title": GENERATED_TITLE,
+        "message": GENERATED_MESSAGE.format(
+            runtime=seconds_to_time(cached_result.runtime or 0)
+        ),
+    }
+
+
+def cache_result(data_hash: bytes, allocation_result: dict) -> None:
+    """
+    Caches a generated allocation, evicting the least recently used results
+    once the cache is full. Allocations stopped by the timeout or a stopping
+    rule aren't cached, as a new solve may find a better one.
+    Args:
+        data_hash: hash of the input data the allocation was generated from
+        allocation_result: AllocationState fields saved for the allocation
+    """
+    size = settings.ALLOCATOR_RESULT_CACHE_SIZE
+    if (
+        size <= 0
+        or allocation_result["type"] != AllocationStatus.GENERATED
+        or allocation_result.get("stopped_by")
+    ):
+        return
+    CachedResult.objects.update_or_create(
+        data_hash=data_hash,
+        defaults={
+            "result": allocation_result["result"],
+            "runtime": allocation_result["runtime"],
+            "last_used": timezone.now(),
+        },
+    )
+    evicted = list(
+        CachedResult.objects.order_by("-last_used").values_list(
+            "pk", flat=True
+        )[size:]
+    )
+    if evicted:
+        CachedResult.objects.filter(pk__in=evicted).delete()
@@ -8,20 +8,39 @@ FAILURE_MESSAGE = (
     "satisfy the current availability, preference and session settings."
 )
 
+TIMEOUT_MESSAGE = (
+    "Allocation algorithm found no allocation before the timeout.\n"
+    "Please request a new allocation with a longer timeout."
+)
+
 NOT_READY_TITLE = "Allocation Already Requested"
 NOT_READY_MESSAGE = (
     "Allocation is already running and is not yet ready.\n"
     "Estimated time remaining: {time}."
 )
 
+QUEUED_TITLE = "Allocation Queued"
+QUEUED_MESSAGE = (
+    "Allocation is waiting for an allocation worker to become available."
+)
+
 REQUESTED_TITLE = "Allocation Successfully Requested"
 REQUESTED_MESSAGE = (
     "Allocation successfully requested. Estimated time " "remaining: {time}."
 )
 
+INVALID_REQUEST_TITLE = "Invalid Allocation Request"
+
 KILLED_TITLE = "Allocation Process Killed"
 KILLED_MESSAGE = (
     "For some reason the allocation process quit unexpectedly. "
     "This might be because of a server restart. Please request "
     "a new allocation. We're sorry for the inconvenience."
 )
+
+OUT_OF_MEMORY_TITLE = "Allocation Out Of Memory"
+OUT_OF_MEMORY_MESSAGE = (
+    "The allocation needed more memory than it may use on the server. "
+    "Please try again when fewer allocations are running, or with a "
+    "shorter timeout."
+)
@@ -0,0 +1,409 @@
+import json
+from typing import Any, Union
+
+from .allocation import ALLOCATION_MODES
+from .backends import BACKENDS
+from .schema import (
+    Hour,
+    InputData,
+    SessionStream,
+    Staff,
+    StoppingRules,
+    Timeslot,
+    Week,
+)
+from .solver import SPREAD_MODES
+from .type_hints import IsoDay
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _members_of(required: set, optional: set = frozenset()) -> tuple:
+    """Returns the (required, allowed) members of an object"""
+    return frozenset(required), frozenset(required | optional)
+
+
+# Members of every object of the input data
+_INPUT_DATA_MEMBERS = _members_of(
+    {"timetable_id", "weeks", "session_streams", "staff"},
+    {
+        "new_threshold",
+        "timeout",
+        "stopping_rules",
+        "spread_mode",
+        "backend",
+        "mode",
+    },
+)
+_WEEK_MEMBERS = _members_of({"id", "name"})
+_SESSION_STREAM_MEMBERS = _members_of(
+    {
+        "id",
+        "name",
+        "type",
+        "day",
+        "number_of_tutors",
+        "location",
+        "is_root",
+        "time",
+    },
+    {"weeks"},
+)
+_STAFF_MEMBERS = _members_of(
+    {"id", "name", "new", "availabilities"},
+    {"type_preference", "max_contiguous_hours", "max_weekly_hours"},
+)
+_STOPPING_RULES_MEMBERS = _members_of(
+    set(), {"mip_gap", "no_improvement_time", "unallocated_hours"}
+)
+
+# Accepted types of parsed JSON values, which are always exactly these types,
+# so booleans aren't accepted as numbers even though bool is a subclass of int
+_NUMBER = (int, float)
+_INTEGER = (int,)
+_STRING = (str,)
+_BOOLEAN = (bool,)
+# Ids are strings, or numbers in older clients
+_ID = (str, int)
+
+_DAYS = frozenset(int(day) for day in IsoDay)
+
+# Priorities are saved in a 32 bit integer column
+_PRIORITIES = range(-(2 ** 31), 2 ** 31)
+
+
+class InputError(ValueError):
+    """Invalid allocation request, with the path of the invalid value"""
+
+
+def _json_type(value: Any) -> str:
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "boolean"
+    if isinstance(value, _NUMBER):
+        return "number"
+    if isinstance(value, str):
+        return "string"
+    if isinstance(value, list):
+        return "array"
+    return "object"
+
+
+def _path(path: str, key: Union[str, int]) -> str:
+    return f"{path}[{key}]" if isinstance(key, int) else f"{path}.{key}"
+
+
+def _get(
+    container: Union[dict, list],
+    key: Union[str, int],
+    types: tuple,
+    path: str,
+    expected: str,
+) -> Any:
+    """
+    Returns a member of an object or an item of an array, checking its type.
+    Paths of values are only built for errors, as most values are valid.
+    Args:
+        container: object or array containing the value
+        key: member or index of the value
+        types: accepted types, None is accepted if it's one of them
+        path: path of the container
+        expected: description of the accepted values for errors
+    """
+    value = container[key]
+    if type(value) not in types:
+        raise InputError(
+            f"{_path(path, key)}: expected {expected}, "
+            f"got {_json_type(value)}"
+        )
+    return value
+
+
+def _members(value: Any, path: str, members: tuple) -> dict:
+    """Checks that the value is an object with every required member and no
+    unknown member"""
+    if type(value) is not dict:
+        raise InputError(f"{path}: expected object, got {_json_type(value)}")
+    required, allowed = members
+    keys = value.keys()
+    if not keys >= required:
+        missing = ", ".join(sorted(required - keys))
+        raise InputError(f"{path}: missing {missing}")
+    if not keys <= allowed:
+        unknown = ", ".join(sorted(keys - allowed))
+        raise InputError(f"{path}: unknown {unknown}")
+    return value
+
+
+def _choice(value: Any, choices: tuple, path: str) -> str:
+    if value not in choices:
+        raise InputError(f"{path}: expected one of {', '.join(choices)}")
+    return value
+
+
+def _day(value: Any, path: str, key: str) -> int:
+    if type(value) is str and value.isdigit():
+        # Object members are strings
+        value = int(value)
+    if type(value) is not int or value not in _DAYS:
+        raise InputError(
+            f"{_path(path, key)}: expected ISO day number from 1 to 7"
+        )
+    return value
+
+
+class _Decoder:
+    """Builds the schema objects of input data, checking every value"""
+
+    def __init__(self):
+        # Hours are immutable and shared between time slots
+        self._hours: dict[float, Hour] = {}
+
+    def _hour(self, value: Any) -> Hour:
+        hour = self._hours.get(value)
+        if hour is None:
+            hour = self._hours[value] = Hour(value)
+        return hour
+
+    def timeslot(
+        self, container: Union[dict, list], key: Union[str, int], path: str
+    ) -> Timeslot:
+        timeslot = container[key]
+        if (
+            type(timeslot) is not list
+            or len(timeslot) != 2
+            or type(timeslot[0]) not in _NUMBER
+            or type(timeslot[1]) not in _NUMBER
+        ):
+            raise InputError(f"{_path(path, key)}: expected [start, end]")
+        start = self._hour(timeslot[0])
+        end = self._hour(timeslot[1])
+        if end < start:
+            raise InputError(f"{_path(path, key)}: ends before it starts")
+        return Timeslot(start, end)
+
+    @staticmethod
+    def week(value: Any, path: str) -> Week:
+        week = _members(value, path, _WEEK_MEMBERS)
+        return Week(
+            _get(week, "id", _INTEGER, path, "integer"),
+            _get(week, "name", _STRING, path, "string"),
+        )
+
+    def session_stream(self, value: Any, path: str) -> SessionStream:
+        stream = _members(value, path, _SESSION_STREAM_MEMBERS)
+        weeks = stream.get("weeks", [])
+        if type(weeks) is not list or not set(map(type, weeks)) <= {int}:
+            raise InputError(f"{path}.weeks: expected array of week ids")
+        number_of_tutors = stream["number_of_tutors"]
+        # Every member is checked at once, and again one by one to describe
+        # the invalid one
+        if not (
+            type(stream["id"]) in _ID
+            and type(stream["name"]) is str
+            and type(stream["type"]) is str
+            and type(number_of_tutors) is int
+            and type(stream["location"]) is str
+            and type(stream["is_root"]) is bool
+        ):
+            for member, types, expected in (
+                ("id", _ID, "string"),
+                ("name", _STRING, "string"),
+                ("type", _STRING, "string"),
+                ("number_of_tutors", _INTEGER, "integer"),
+                ("location", _STRING, "string"),
+                ("is_root", _BOOLEAN, "boolean"),
+            ):
+                _get(stream, member, types, path, expected)
+        if number_of_tutors < 0:
+            raise InputError(f"{path}.number_of_tutors: must not be negative")
+        return SessionStream(
+            id=stream["id"],
+            name=stream["name"],
+            type=stream["type"],
+            day=_day(stream["day"], path, "day"),
+            number_of_tutors=number_of_tutors,
+            location=stream["location"],
+            is_root=stream["is_root"],
+            time=self.timeslot(stream, "time", path),
+            weeks=weeks,
+        )
+
+    def staff(self, value: Any, path: str) -> Staff:
+        staff = _members(value, path, _STAFF_MEMBERS)
+        availabilities = _get(staff, "availabilities", (dict,), path, "object")
+        optional = {}
+        if "type_preference" in staff:
+            optional["type_preference"] = _get(
+                staff,
+                "type_preference",
+                (str, type(None)),
+                path,
+                "string or null",
+            )
+        for member in ("max_contiguous_hours", "max_weekly_hours"):
+            if member in staff:
+                optional[member] = _get(staff, member, _NUMBER, path, "number")
+        decoded = {}
+        for day in availabilities:
+            timeslots = _get(
+                availabilities, day, (list,), f"{path}.availabilities", "array"
+            )
+            day_path = f"{path}.availabilities.{day}"
+            decoded[_day(day, path, "availabilities")] = [
+                self.timeslot(timeslots, index, day_path)
+                for index in range(len(timeslots))
+            ]
+        return Staff(
+            id=_get(staff, "id", _ID, path, "string"),
+            name=_get(staff, "name", _STRING, path, "string"),
+            new=_get(staff, "new", _BOOLEAN, path, "boolean"),
+            availabilities=decoded,
+            **optional,
+        )
+
+    @staticmethod
+    def stopping_rules(value: Any, path: str) -> StoppingRules:
+        rules = _members(value, path, _STOPPING_RULES_MEMBERS)
+        optional = {}
+        if "mip_gap" in rules:
+            mip_gap = _get(rules, "mip_gap", (dict,), path, "object")
+            for priority in mip_gap:
+                if not priority.lstrip("-").isdigit():
+                    raise InputError(
+                        f"{path}.mip_gap: expected integer priorities, got "
+                        f"{priority}"
+                    )
+                _get(mip_gap, priority, _NUMBER, f"{path}.mip_gap", "number")
+            optional["mip_gap"] = mip_gap
+        for member in ("no_improvement_time", "unallocated_hours"):
+            if member in rules:
+                optional[member] = _get(
+                    rules,
+                    member,
+                    (*_NUMBER, type(None)),
+                    path,
+                    "number or null",
+                )
+        return StoppingRules(**optional)
+
+
+def loads(body: Union[bytes, str]) -> Any:
+    """Parses JSON, with orjson if it's installed"""
+    try:
+        if orjson is not None:
+            return orjson.loads(body)
+
+        def reject_constant(constant):
+            raise ValueError(f"{constant} is not valid JSON")
+
+        # NaN and Infinity aren't JSON, orjson rejects them too
+        return json.loads(body, parse_constant=reject_constant)
+    except ValueError as error:
+        raise InputError(f"Invalid JSON: {error}")
+
+
+def canonical_json(value: Any) -> bytes:
+    """
+    Serialises parsed JSON independently of the order of object members.
+    Both serialisers give the same bytes, except for numbers written with an
+    exponent, e.g. 1e-05.
+    """
+    if orjson is not None:
+        return orjson.dumps(value, option=orjson.OPT_SORT_KEYS)
+    return json.dumps(
+        value, sort_keys=True, separators=(",", ":"), ensure_ascii=False
+    ).encode()
+
+
+def decode_input_data(json_data: Any) -> InputData:
+    """
+    Builds input data from its parsed JSON, checking the type of every value.
+    Args:
+        json_data: input data, as in the data member of a request
+    Returns: input data
+    Raises:
+        InputError: if a value is missing, unknown or invalid, with its path
+    """
+    data = _members(json_data, "data", _INPUT_DATA_MEMBERS)
+    decoder = _Decoder()
+    optional = {}
+    if "new_threshold" in data:
+        optional["new_threshold"] = _get(
+            data, "new_threshold", (*_NUMBER, type(None)), "data", "number"
+        )
+    if "timeout" in data:
+        optional["timeout"] = _get(data, "timeout", _NUMBER, "data", "number")
+        if optional["timeout"] <= 0:
+            raise InputError("data.timeout: must be positive")
+    if data.get("stopping_rules") is not None:
+        optional["stopping_rules"] = decoder.stopping_rules(
+            data["stopping_rules"], "data.stopping_rules"
+        )
+    for member, choices in (
+        ("spread_mode", SPREAD_MODES),
+        ("backend", BACKENDS),
+        ("mode", ALLOCATION_MODES),
+    ):
+        if member in data:
+            optional[member] = _choice(data[member], choices, f"data.{member}")
+    weeks = _get(data, "weeks", (list,), "data", "array")
+    session_streams = _get(data, "session_streams", (list,), "data", "array")
+    staff = _get(data, "staff", (list,), "data", "array")
+    return InputData(
+        timetable_id=_get(data, "timetable_id", _STRING, "data", "string"),
+        weeks=[
+            decoder.week(week, f"data.weeks[{index}]")
+            for index, week in enumerate(weeks)
+        ],
+        session_streams=[
+            decoder.session_stream(stream, f"data.session_streams[{index}]")
+            for index, stream in enumerate(session_streams)
+        ],
+        staff=[
+            decoder.staff(tutor, f"data.staff[{index}]")
+            for index, tutor in enumerate(staff)
+        ],
+        **optional,
+    )
+
+
+def request_priority(request_data: dict, path: str = "request") -> int:
+    """
+    Returns the scheduling priority of a parsed allocation request.
+    Args:
+        request_data: parsed allocation request
+        path: path of the request for errors
+    Returns: priority member of the request, 0 if it has none
+    Raises:
+        InputError: if the priority isn't an integer the priority column
+            can hold
+    """
+    priority = request_data.get("priority", 0)
+    if type(priority) is not int or priority not in _PRIORITIES:
+        raise InputError(
+            f"{path}.priority: expected integer from {_PRIORITIES.start} to "
+            f"{_PRIORITIES.stop - 1}"
+        )
+    return priority
+
+
+def decode_request(body: Union[bytes, str]) -> tuple[dict, InputData]:
+    """
+    Parses an allocation request and builds its input data.
+    Args:
+        body: JSON request, with the input data in its data member
+    Returns: parsed request, and its input data
+    Raises:
+        InputError: if the request isn't valid JSON, or its priority or input
+            data is invalid
+    """
+    request_data = loads(body)
+    if not isinstance(request_data, dict) or "data" not in request_data:
+        raise InputError("request: expected object with data member")
+    request_priority(request_data)
+    return request_data, decode_input_data(request_data["data"])
@@ -0,0 +1,121 @@
+import random
+from typing import Optional
+
+from .schema import InputData, Staff
+from .type_hints import IsoDay, SessionType
+
+# Days and hours session streams run on
+_DAYS = [IsoDay.MON, IsoDay.TUE, IsoDay.WED, IsoDay.THU, IsoDay.FRI]
+_FIRST_HOUR = 8
+_LAST_HOUR = 18
+_SESSION_TYPES = [SessionType.PRACTICAL, SessionType.TUTORIAL]
+
+# Benchmark scenario: generator arguments
+SCENARIOS = {
+    "small": {"tutors": 20, "streams": 50},
+    "medium": {"tutors": 100, "streams": 400},
+    "faculty": {"tutors": 300, "streams": 1500},
+}
+
+
+def _staff_payload(
+    rng: random.Random, dummy_id: int, availability: float, new_ratio: float
+) -> dict:
+    """Turns a dummy tutor, available all week, into a tutor available for a
+    block of some of its days, with random preferences and limits"""
+    tutor = Staff.create_dummy(dummy_id)
+    availabilities = {}
+    for day in tutor.availabilities:
+        if rng.random() >= availability:
+            continue
+        start = rng.randint(_FIRST_HOUR, _LAST_HOUR - 3)
+        end = rng.randint(start + 3, _LAST_HOUR)
+        availabilities[int(day)] = [[start, end]]
+    return {
+        "id": tutor.id,
+        "name": tutor.name,
+        "new": rng.random() < new_ratio,
+        "availabilities": availabilities,
+        "type_preference": rng.choice([None, *_SESSION_TYPES]),
+        "max_contiguous_hours": rng.choice([2, 3, 4, 24]),
+        "max_weekly_hours": rng.choice([6, 10, 12, 20]),
+    }
+
+
+def generate_payload(
+    seed: int,
+    tutors: int,
+    streams: int,
+    weeks: int = 13,
+    clash_density: float = 0.5,
+    availability: float = 0.6,
+    new_ratio: float = 0.3,
+    timeout: Optional[int] = None,
+) -> dict:
+    """
+    Generates the JSON input data of a random timetable, the same for the
+    same arguments.
+    Args:
+        seed: seed of the random generator
+        tutors: number of tutors
+        streams: number of session streams
+        weeks: number of teaching weeks
+        clash_density: share of the weekly time slots left without session
+            streams, from 0 (streams spread over every time slot) to 1 (every
+            stream starts at the same time), so that more streams clash
+        availability: probability of a tutor being available on a day, for
+            a block of at least 3 hours of that day
+        new_ratio: share of new tutors
+        timeout: time limit of the allocation, defaults to the InputData
+            default
+    Returns: input data as sent to request_allocation
+    """
+    rng = random.Random(seed)
+    slots = [
+        (day, hour)
+        for day in _DAYS
+        for hour in range(_FIRST_HOUR, _LAST_HOUR - 1)
+    ]
+    rng.shuffle(slots)
+    slots = slots[: max(1, round(len(slots) * (1 - clash_density)))]
+
+    session_streams = []
+    for stream_index in range(streams):
+        day, start = rng.choice(slots)
+        duration = rng.choice([1, 2, 2, 3])
+        first_week = rng.choice([1, 1, 1, 2, weeks // 2 + 1])
+        last_week = rng.choice([weeks, weeks, first_week + weeks // 3])
+        session_streams.append(
+            {
+                "id": f"stream-{stream_index}",
+                "name": f"P{stream_index:04}",
+                "type": rng.choice(_SESSION_TYPES),
+                "day": int(day),
+                "number_of_tutors": rng.choice([1, 1, 2, 2, 3]),
+                "location": "Room",
+                "is_root": rng.random() < 0.8,
+                "time": [start, min(start + duration, _LAST_HOUR)],
+                "weeks": list(range(first_week, min(last_week, weeks) + 1)),
+            }
+        )
+    payload = {
+        "timetable_id": "00000000-0000-0000-0000-000000000000",
+        "weeks": [
+            {"id": week, "name": str(week)} for week in range(1, weeks + 1)
+        ],
+        "session_streams": session_streams,
+        "staff": [
+            _staff_payload(rng, dummy_id, availability, new_ratio)
+            for dummy_id in range(tutors)
+        ],
+    }
+    if timeout is not None:
+        payload["timeout"] = timeout
+    return payload
+
+
+def generate_input_data(
+    seed: int, tutors: int, streams: int, **kwargs
+) -> InputData:
+    """Generates a random timetable as InputData, see generate_payload"""
+    return InputData(**generate_payload(seed, tutors, streams, **kwargs))
@@ -0,0 +1,360 @@
+import time
+from typing import Optional
+
+import numpy as np
+
+from .intervals import streams_clash
+from .schema import SessionStream, Staff, Week, availability_matrix
+from .type_hints import Allocation
+
+# Smallest change of an objective counted as an improvement
+_EPSILON = 1e-9
+
+
+def _lower(cost: tuple, other: tuple) -> bool:
+    """Compares (spread, workdays) objective changes lexicographically"""
+    if abs(cost[0] - other[0]) > _EPSILON:
+        return cost[0] < other[0]
+    return cost[1] < other[1]
+
+
+class GreedyAllocator:
+    """
+    Builds a feasible allocation in a fraction of a second, without a MIP
+    solver. Session streams with the fewest available tutors are filled
+    first, each slot going to the tutor that keeps hours most even, then
+    a local search moves streams between tutors while that lowers the spread
+    and type preference objectives, or the number of workdays without
+    raising them. Every hard rule of the model holds in the allocation:
+    availability, clashes, seniority, and weekly and contiguous hours.
+    """
+
+    def __init__(
+        self,
+        tutors: list[Staff],
+        session_streams: list[SessionStream],
+        weeks: list[Week],
+        new_threshold: float = 1,
+        time_limit: float = 0.5,
+    ):
+        """
+        Args:
+            tutors: tutors to allocate
+            session_streams: session streams to allocate tutors to
+            weeks: weeks of the timetable, workdays are counted in these
+            new_threshold: ratio of the hours of a new tutor to the hours of
+                a senior tutor when balancing hours
+            time_limit: seconds after which the local search stops
+        """
+        self._tutors: dict[str, Staff] = {tutor.id: tutor for tutor in tutors}
+        self._session_streams: dict[str, SessionStream] = {
+            stream.id: stream for stream in session_streams
+        }
+        self._weeks = {week.id for week in weeks}
+        self._new_threshold = new_threshold
+        self._time_limit = time_limit
+
+        # stream: duration, total hours and set of weeks, looked up for every
+        # rule check and cost
+        self._duration = {
+            stream_id: stream.time.duration()
+            for stream_id, stream in self._session_streams.items()
+        }
+        self._total_hours = {
+            stream_id: stream.total_hours()
+            for stream_id, stream in self._session_streams.items()
+        }
+        self._stream_weeks = {
+            stream_id: set(stream.weeks)
+            for stream_id, stream in self._session_streams.items()
+        }
+        # stream: (day, week) of every week it runs in the timetable
+        self._stream_days = {
+            stream_id: [
+                (stream.day, week)
+                for week in self._stream_weeks[stream_id]
+                if week in self._weeks
+            ]
+            for stream_id, stream in self._session_streams.items()
+        }
+
+        # stream: tutors available for this stream
+        self._stream_tutors: dict[str, list[str]] = {}
+        self._setup_availability_data()
+
+        self._allocation: Allocation = {
+            stream_id: [] for stream_id in self._session_streams
+        }
+        # (tutor, day): allocated streams on that day
+        self._tutor_day_streams: dict[tuple[str, int], list[str]] = {}
+        # (tutor, week): allocated hours
+        self._weekly_hours: dict[tuple[str, int], float] = {}
+        # (tutor, day, week): number of allocated streams
+        self._day_streams: dict[tuple[str, int, int], int] = {}
+        # tutor: allocated hours, weighted by seniority
+        self._hours = dict.fromkeys(self._tutors, 0.0)
+
+        try:
+            self._mean_hours = sum(
+                stream.total_hours() * stream.number_of_tutors
+                for stream in self._session_streams.values()
+            ) / len(self._tutors)
+        except ZeroDivisionError:
+            raise RuntimeError("You must provide at least 1 tutor")
+
+    def _setup_availability_data(self):
+        tutor_ids = list(self._tutors)
+        available = availability_matrix(
+            list(self._tutors.values()), list(self._session_streams.values())
+        )
+        for stream_index, stream_id in enumerate(self._session_streams):
+            self._stream_tutors[stream_id] = [
+                tutor_ids[tutor_index]
+                for tutor_index in np.flatnonzero(available[:, stream_index])
+            ]
+
+    def _weighted_hours(self, tutor_id: str, stream_id: str) -> float:
+        """Hours of the stream counted towards the spread of the tutor"""
+        hours = self._total_hours[stream_id]
+        if self._tutors[tutor_id].new:
+            return hours / self._new_threshold
+        return hours
+
+    def _add(self, tutor_id: str, stream_id: str):
+        stream = self._session_streams[stream_id]
+        self._allocation[stream_id].append(tutor_id)
+        self._tutor_day_streams.setdefault((tutor_id, stream.day), []).append(
+            stream_id
+        )
+        for week in self._stream_weeks[stream_id]:
+            self._weekly_hours[tutor_id, week] = (
+                self._weekly_hours.get((tutor_id, week), 0)
+                + self._duration[stream_id]
+            )
+        for day, week in self._stream_days[stream_id]:
+            key = (tutor_id, day, week)
+            self._day_streams[key] = self._day_streams.get(key, 0) + 1
+        self._hours[tutor_id] += self._weighted_hours(tutor_id, stream_id)
+
+    def _remove(self, tutor_id: str, stream_id: str):
+        stream = self._session_streams[stream_id]
+        self._allocation[stream_id].remove(tutor_id)
+        self._tutor_day_streams[tutor_id, stream.day].remove(stream_id)
+        for week in self._stream_weeks[stream_id]:
+            self._weekly_hours[tutor_id, week] -= self._duration[stream_id]
+        for day, week in self._stream_days[stream_id]:
+            self._day_streams[tutor_id, day, week] -= 1
+        self._hours[tutor_id] -= self._weighted_hours(tutor_id, stream_id)
+
+    def _contiguous_hours(self, tutor_id: str, stream: SessionStream) -> float:
+        """Hours of the longest chain of back to back streams through the
+        stream if the tutor worked it"""
+        same_day = [
+            self._session_streams[stream_id]
+            for stream_id in self._tutor_day_streams.get(
+                (tutor_id, stream.day), []
+            )
+            if self._duration[stream_id] > 0
+        ]
+
+        # (stream, forward): hours of the longest chain extending the stream,
+        # so that streams reached through several chains are extended once
+        longest: dict[tuple[str, bool], float] = {}
+
+        def extend(current: SessionStream, forward: bool) -> float:
+            if (current.id, forward) in longest:
+                return longest[current.id, forward]
+            hours = 0
+            for other in same_day:
+                if forward:
+                    adjacent = other.time.is_contiguous(current.time)
+                else:
+                    adjacent = current.time.is_contiguous(other.time)
+                if adjacent and not set(other.weeks).isdisjoint(current.weeks):
+                    hours = max(
+                        hours, self._duration[other.id] + extend(other, forward)
+                    )
+            longest[current.id, forward] = hours
+            return hours
+
+        return (
+            self._duration[stream.id]
+            + extend(stream, forward=True)
+            + extend(stream, forward=False)
+        )
+
+    def _seniority_holds(self, stream: SessionStream, tutor_ids: list[str]):
+        if not stream.is_root:
+            return True
+        new = sum(self._tutors[tutor_id].new for tutor_id in tutor_ids)
+        return (len(tutor_ids) - new) * (stream.number_of_tutors - 1) >= new
+
+    def _can_work(
+        self, tutor_id: str, stream_id: str, replacing: Optional[str] = None
+    ) -> bool:
+        """
+        Checks every hard rule for the tutor working the stream, in place of
+        the replaced tutor if given.
+        """
+        stream = self._session_streams[stream_id]
+        tutor = self._tutors[tutor_id]
+        allocated = self._allocation[stream_id]
+        if tutor_id in allocated:
+            return False
+        # Rules most tutors break are checked first
+        duration = self._duration[stream_id]
+        for week in self._stream_weeks[stream_id]:
+            hours = self._weekly_hours.get((tutor_id, week), 0)
+            if hours + duration > tutor.max_weekly_hours:
+                return False
+        for other_id in self._tutor_day_streams.get((tutor_id, stream.day), []):
+            if streams_clash(stream, self._session_streams[other_id]):
+                return False
+        tutor_ids = [
+            allocated_id
+            for allocated_id in allocated
+            if allocated_id != replacing
+        ] + [tutor_id]
+        if len(tutor_ids) > stream.number_of_tutors:
+            return False
+        if not self._seniority_holds(stream, tutor_ids):
+            return False
+        return (
+            self._contiguous_hours(tutor_id, stream)
+            <= tutor.max_contiguous_hours
+        )
+
+    def _spread_change(self, tutor_id: str, hours: float) -> float:
+        """Change of the spread objective if the tutor worked that many more
+        weighted hours"""
+        current = self._hours[tutor_id]
+        return abs(current + hours - self._mean_hours) - abs(
+            current - self._mean_hours
+        )
+
+    def _preference_cost(self, tutor_id: str, stream_id: str) -> float:
+        preference = self._tutors[tutor_id].type_preference
+        if (
+            preference is None
+            or self._session_streams[stream_id].type == preference
+        ):
+            return 0
+        return self._total_hours[stream_id]
+
+    def _workday_change(self, tutor_id: str, stream_id: str, sign: int) -> int:
+        """Change of the number of workdays if the tutor started (sign 1) or
+        stopped (sign -1) working the stream"""
+        change = 0
+        for day, week in self._stream_days[stream_id]:
+            count = self._day_streams.get((tutor_id, day, week), 0)
+            if sign > 0 and count == 0:
+                change += 1
+            elif sign < 0 and count == 1:
+                change -= 1
+        return change
+
+    def _add_cost(self, tutor_id: str, stream_id: str) -> tuple:
+        """Objective changes of adding the tutor to the stream, compared
+        lexicographically. Workdays only count whether the tutor already
+        works that day in some week, which is cheaper to check"""
+        day = self._session_streams[stream_id].day
+        return (
+            self._spread_change(
+                tutor_id, self._weighted_hours(tutor_id, stream_id)
+            )
+            + self._preference_cost(tutor_id, stream_id),
+            not self._tutor_day_streams.get((tutor_id, day)),
+        )
+
+    def _fill(self) -> bool:
+        """Fills free slots of streams, scarcest streams first. Returns True
+        if any slot was filled"""
+        filled = False
+        stream_ids = sorted(
+            self._session_streams,
+            key=lambda stream_id: (
+                len(self._stream_tutors[stream_id]),
+                -self._total_hours[stream_id],
+            ),
+        )
+        for stream_id in stream_ids:
+            stream = self._session_streams[stream_id]
+            while len(self._allocation[stream_id]) < stream.number_of_tutors:
+                # Senior tutors first on root streams without one, so that new
+                # tutors can join
+                needs_senior = stream.is_root and all(
+                    self._tutors[tutor_id].new
+                    for tutor_id in self._allocation[stream_id]
+                )
+                candidates = sorted(
+                    self._stream_tutors[stream_id],
+                    key=lambda tutor_id: (
+                        needs_senior and self._tutors[tutor_id].new,
+                        self._add_cost(tutor_id, stream_id),
+                    ),
+                )
+                # Checking rules is slower than comparing costs, so tutors
+                # are checked from the cheapest until one can work the stream
+                tutor_id = next(
+                    (
+                        tutor_id
+                        for tutor_id in candidates
+                        if self._can_work(tutor_id, stream_id)
+                    ),
+                    None,
+                )
+                if tutor_id is None:
+                    break
+                self._add(tutor_id, stream_id)
+                filled = True
+        return filled
+
+    def _move_cost(self, stream_id: str, tutor_id: str, other_id: str):
+        """Objective changes of moving the stream from a tutor to another"""
+        hours = self._weighted_hours(tutor_id, stream_id)
+        other_hours = self._weighted_hours(other_id, stream_id)
+        return (
+            self._spread_change(tutor_id, -hours)
+            + self._spread_change(other_id, other_hours)
+            + self._preference_cost(other_id, stream_id)
+            - self._preference_cost(tutor_id, stream_id),
+            self._workday_change(tutor_id, stream_id, -1)
+            + self._workday_change(other_id, stream_id, 1),
+        )
+
+    def _improve(self, deadline: float) -> bool:
+        """Moves streams to other tutors while that improves the objectives.
+        Returns True if any stream was moved"""
+        moved = False
+        for stream_id, tutor_ids in self._allocation.items():
+            for tutor_id in list(tutor_ids):
+                if time.time() > deadline:
+                    return moved
+                # Only moves that lower the objectives are made
+                best, best_cost = None, (0, 0)
+                for other_id in self._stream_tutors[stream_id]:
+                    if not self._can_work(other_id, stream_id, tutor_id):
+                        continue
+                    cost = self._move_cost(stream_id, tutor_id, other_id)
+                    if _lower(cost, best_cost):
+                        best, best_cost = other_id, cost
+                if best is not None:
+                    self._remove(tutor_id, stream_id)
+                    self._add(best, stream_id)
+                    moved = True
+        return moved
+
+    def run(self) -> Allocation:
+        """Returns the allocated tutors of every session stream"""
+        deadline = time.time() + self._time_limit
+        self._fill()
+        while time.time() < deadline:
+            moved = self._improve(deadline)
+            # Moves can free tutors for streams that couldn't be filled
+            filled = self._fill()
+            if not moved and not filled:
+                break
+        return {
+            stream_id: list(tutor_ids)
+            for stream_id, tutor_ids in self._allocation.items()
+        }
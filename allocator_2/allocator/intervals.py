@@ -0,0 +1,222 @@
+from typing import Iterable
+
+from .schema import SessionStream
+
+
+def week_masks(session_streams: Iterable[SessionStream]) -> dict[str, int]:
+    """
+    Encodes the weeks of every session stream as a bitmask, so that week
+    overlap becomes a single bitwise and.
+    Args:
+        session_streams: session streams to encode
+    Returns: mapping from session stream id to its week bitmask
+    """
+    session_streams = list(session_streams)
+    week_bits = {
+        week: 1 << index
+        for index, week in enumerate(
+            sorted(
+                {week for stream in session_streams for week in stream.weeks}
+            )
+        )
+    }
+    masks = {}
+    for stream in session_streams:
+        mask = 0
+        for week in stream.weeks:
+            mask |= week_bits[week]
+        masks[stream.id] = mask
+    return masks
+
+
+def streams_by_day(
+    session_streams: Iterable[SessionStream],
+) -> dict[int, list[SessionStream]]:
+    """Buckets session streams per day, sorted by start then end time"""
+    days: dict[int, list[SessionStream]] = {}
+    for stream in session_streams:
+        days.setdefault(stream.day, []).append(stream)
+    for streams in days.values():
+        streams.sort(key=lambda s: (s.time.start_time, s.time.end_time))
+    return days
+
+
+def _interval_cliques(streams: list[SessionStream]) -> list[frozenset[str]]:
+    """
+    Finds the maximal cliques of the interval graph formed by session streams
+    running on the same day in the same week.
+    Args:
+        streams: session streams to check
+    Returns: list of maximal cliques of at least 2 session stream ids
+    """
+    cliques = []
+    # Each stream clashes with the streams running at its start time
+    for stream in streams:
+        if stream.time.duration() > 0:
+            continue
+        clique = frozenset(
+            other.id
+            for other in streams
+            if other is stream or stream.time.clashes_with(other.time)
+        )
+        if len(clique) > 1:
+            cliques.append(clique)
+
+    # Ends are processed before starts at the same time as time slots don't
+    # include their end time
+    events = sorted(
+        (
+            (time, is_start, stream.id)
+            for stream in streams
+            if stream.time.duration() > 0
+            for time, is_start in (
+                (stream.time.start_time, True),
+                (stream.time.end_time, False),
+            )
+        ),
+        key=lambda event: (event[0], event[1]),
+    )
+    active: dict[str, None] = {}
+    grown = False
+    for _, is_start, stream_id in events:
+        if is_start:
+            active[stream_id] = None
+            grown = True
+            continue
+        if grown and len(active) > 1:
+            cliques.append(frozenset(active))
+        grown = False
+        del active[stream_id]
+    return cliques
+
+
+def clash_cliques(
+    session_streams: Iterable[SessionStream],
+) -> list[list[str]]:
+    """
+    Groups clashing session streams into maximal cliques, i.e. sets of
+    session streams which all pairwise clash with each other. Every clashing
+    pair of session streams is contained in at least one clique.
+    Args:
+        session_streams: session streams to check
+    Returns: list of cliques of session stream ids, each with at least 2
+        session streams
+    """
+    cliques: set[frozenset[str]] = set()
+    for streams in streams_by_day(session_streams).values():
+        # Weeks with the same streams running on this day share cliques
+        week_streams: dict[int, list[SessionStream]] = {}
+        for stream in streams:
+            for week in set(stream.weeks):
+                week_streams.setdefault(week, []).append(stream)
+        checked = set()
+        for streams_in_week in week_streams.values():
+            key = frozenset(stream.id for stream in streams_in_week)
+            if key in checked:
+                continue
+            checked.add(key)
+            cliques.update(_interval_cliques(streams_in_week))
+
+    # Only keep cliques that aren't contained in a bigger clique
+    maximal_cliques: list[frozenset[str]] = []
+    cliques_by_stream: dict[str, list[frozenset[str]]] = {}
+    for clique in sorted(cliques, key=len, reverse=True):
+        first_stream_id = min(clique)
+        if any(
+            clique <= other
+            for other in cliques_by_stream.get(first_stream_id, [])
+        ):
+            continue
+        maximal_cliques.append(clique)
+        for stream_id in clique:
+            cliques_by_stream.setdefault(stream_id, []).append(clique)
+    return [sorted(clique) for clique in maximal_cliques]
+
+
+def streams_clash(stream_a: SessionStream, stream_b: SessionStream) -> bool:
+    """Returns True if both session streams run at the same time on the same
+    day in at least one common week"""
+    return (
+        stream_a.day == stream_b.day
+        and stream_a.time.clashes_with(stream_b.time)
+        and not set(stream_a.weeks).isdisjoint(stream_b.weeks)
+    )
+
+
+def contiguous_chains(
+    session_streams: Iterable[SessionStream], max_hours: float
+) -> list[list[list[str]]]:
+    """
+    Finds the shortest chains of session streams running back to back for
+    longer than max_hours, where every stream starts when the previous one
+    ends, on the same day and in at least one common week. Streams with the
+    same time and weeks all clash with each other, so they form a single link
+    of a chain, of which a tutor can only work one.
+    Args:
+        session_streams: session streams to check
+        max_hours: maximum number of contiguous hours
+    Returns: list of chains, each a list of links given as session stream
+        ids. A tutor can work at most one stream less than the number of
+        links of every chain.
+    """
+    links: dict[tuple, list[str]] = {}
+    for stream in session_streams:
+        key = (
+            stream.day,
+            stream.time.start_time.value,
+            stream.time.end_time.value,
+            frozenset(stream.weeks),
+        )
+        links.setdefault(key, []).append(stream.id)
+    # (day, start time): links starting then, zero length links can't extend
+    # a chain
+    successors: dict[tuple, list[tuple]] = {}
+    for key in links:
+        if key[2] > key[1]:
+            successors.setdefault((key[0], key[1]), []).append(key)
+
+    chains: list[list[tuple]] = []
+    stack = [([key], key[2] - key[1]) for key in links]
+    while stack:
+        chain, hours = stack.pop()
+        if hours > max_hours:
+            chains.append(chain)
+            continue
+        last = chain[-1]
+        for key in successors.get((last[0], last[2]), []):
+            if last[3] & key[3]:
+                stack.append((chain + [key], hours + key[2] - key[1]))
+    return [[links[key] for key in chain] for chain in chains]
+
+
+def contiguous_successors(
+    session_streams: Iterable[SessionStream],
+) -> dict[str, list[str]]:
+    """
+    Finds the session streams a tutor could work straight after each session
+    stream, i.e. those starting when it ends, on the same day and in at least
+    one common week. Zero length streams don't follow any stream, so that
+    successors never form a cycle.
+    Args:
+        session_streams: session streams to check
+    Returns: mapping from every session stream id to the ids of its
+        successors
+    """
+    session_streams = list(session_streams)
+    masks = week_masks(session_streams)
+    starting: dict[tuple[int, float], list[SessionStream]] = {}
+    for stream in session_streams:
+        if stream.time.duration() > 0:
+            starting.setdefault(
+                (stream.day, stream.time.start_time.value), []
+            ).append(stream)
+    return {
+        stream.id: [
+            other.id
+            for other in starting.get(
+                (stream.day, stream.time.end_time.value), []
+            )
+            if masks[stream.id] & masks[other.id]
+        ]
+        for stream in session_streams
+    }
@@ -0,0 +1,91 @@
+import asyncio
+import uuid
+import weakref
+from datetime import datetime
+from typing import Optional
+
+from asgiref.sync import sync_to_async
+
+from .models import AllocationState
+
+
+def state_version(updated_at: Optional[datetime]) -> Optional[str]:
+    """Version of an allocation state returned to clients, which send it back
+    to wait for the next version"""
+    return updated_at.isoformat() if updated_at is not None else None
+
+
+def _state_versions(timetable_ids: list[uuid.UUID]) -> dict:
+    return {
+        timetable_id: state_version(updated_at)
+        for timetable_id, updated_at in AllocationState.objects.filter(
+            timetable_id__in=timetable_ids
+        ).values_list("timetable_id", "updated_at")
+    }
+
+
+class StatePoller:
+    """
+    Wakes long polls when the allocation state they wait on changes. A single
+    task per event loop reads the version of every timetable waited on at
+    each interval, so the database is queried once per interval however many
+    requests are waiting, and only for the small updated_at column.
+    """
+
+    # Event loop: its poller
+    _pollers: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+    def __init__(self, interval: float):
+        """
+        Args:
+            interval: seconds between reads of the versions
+        """
+        self._interval = interval
+        # timetable: (version, future) of every request waiting on it
+        self._waiters: dict[uuid.UUID, list[tuple]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def current(cls, interval: float) -> "StatePoller":
+        """Returns the poller of the running event loop"""
+        loop = asyncio.get_running_loop()
+        poller = cls._pollers.get(loop)
+        if poller is None:
+            poller = cls._pollers[loop] = cls(interval)
+        return poller
+
+    async def wait(
+        self, timetable_id: uuid.UUID, version: Optional[str], timeout: float
+    ) -> bool:
+        """
+        Waits until the version of the allocation state changes.
+        Args:
+            timetable_id: timetable of the allocation state
+            version: version known by the client, None if there's no state
+            timeout: most seconds to wait
+        Returns: True if the version changed, False if the wait timed out
+        """
+        future = asyncio.get_running_loop().create_future()
+        waiter = (version, future)
+        self._waiters.setdefault(timetable_id, []).append(waiter)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            waiters = self._waiters[timetable_id]
+            waiters.remove(waiter)
+            if not waiters:
+                del self._waiters[timetable_id]
+
+    async def _run(self):
+        while self._waiters:
+            await asyncio.sleep(self._interval)
+            versions = await sync_to_async(_state_versions)(list(self._waiters))
+            for timetable_id, waiters in self._waiters.items():
+                current = versions.get(timetable_id)
+                for version, future in waiters:
+                    if current != version and not future.done():
+                        future.set_result(True)
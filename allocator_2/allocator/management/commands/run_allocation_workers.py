@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from allocator.resources import job_resources
+from allocator.worker import WorkerPool
+
+
+class Command(BaseCommand):
+    help = "Runs a pool of workers for queued allocation requests"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=settings.ALLOCATOR_WORKERS,
+            help="Number of allocations to run at once",
+        )
+        parser.add_argument(
+            "--threads",
+            type=int,
+            default=None,
+            help="Number of Gurobi threads per allocation",
+        )
+
+    def handle(self, *args, **options):
+        workers = options["workers"]
+        resources = job_resources(workers, options["threads"])
+        memory = (
+            f"{resources.mem_limit:.1f} GB"
+            if resources.mem_limit is not None
+            else "unlimited memory"
+        )
+        self.stdout.write(
+            f"Starting {workers} allocation workers "
+            f"with {resources.threads} threads and {memory} each"
+        )
+        WorkerPool(workers, resources, settings.ALLOCATOR_POLL_INTERVAL).run()
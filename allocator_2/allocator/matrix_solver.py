@@ -0,0 +1,491 @@
+import numpy as np
+import scipy.sparse as sp
+from gurobipy.gurobipy import GRB, LinExpr
+
+from .backends import LinearProgram, Objective
+from .solver import Solver
+
+
+class MatrixSolver(Solver):
+    """
+    Builds the same model as Solver, but creates variables with addMVar and
+    constraint blocks from sparse coefficient matrices with addMConstr,
+    indexed by integer tutor, stream and week positions. Other backends than
+    Gurobi get the same blocks as a linear program, without a Gurobi model.
+    Solver is kept as the reference implementation of every constraint.
+    """
+
+    _builds_program = True
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # (tutor, stream): position of its allocation variable, allocation
+        # variables follow the pairs of the compiled problem
+        self._pair_index: dict[tuple[str, str], int] = {}
+
+        # Allocation variable and tutor on day variable position of every
+        # (tutor, stream, week) the stream runs in
+        self._tutor_on_day_pairs = np.zeros(0, dtype=int)
+        self._tutor_on_day_rows = np.zeros(0, dtype=int)
+
+        # Gurobi variables, or columns of the linear program without a model
+        self._allocation_var_list = []
+        self._tutor_on_day_var_list = []
+        self._stream_allocation_var_list = []
+
+        # Linear program built without a model: upper bound and integrality
+        # of every column, (rows, columns, coefficients, row_lb, row_ub) of
+        # every constraint block, and (priority, coefficients, columns,
+        # constant) of every objective by index
+        self._column_ub: list[np.ndarray] = []
+        self._column_integer: list[np.ndarray] = []
+        self._number_of_columns = 0
+        self._program_blocks: list[tuple] = []
+        self._program_objectives: dict[int, tuple] = {}
+
+    def _setup_data(self):
+        super()._setup_data()
+        self._profile_builders(self._setup_array_data, model=False)
+
+    def _setup_array_data(self):
+        """Set up the positions of allocation and tutor on day variables"""
+        problem = self._problem
+        self._pair_index = {
+            (problem.tutor_ids[tutor], problem.stream_ids[stream]): i
+            for i, (tutor, stream) in enumerate(
+                zip(problem.pair_tutor.tolist(), problem.pair_stream.tolist())
+            )
+        }
+
+        # Tutor on day variables follow the order of self._tutor_day_streams
+        _, _, _, pairs, starts = problem.tutor_days
+        self._tutor_on_day_pairs = pairs
+        self._tutor_on_day_rows = np.repeat(
+            np.arange(len(starts) - 1), np.diff(starts)
+        )
+
+    def _add_variables(self, count: int, vtype: str) -> list:
+        """
+        Adds variables with a lower bound of 0
+        Args:
+            count: number of variables
+            vtype: GRB.BINARY or GRB.CONTINUOUS
+        Returns: Gurobi variables, or columns of the linear program without
+            a model
+        """
+        if self._model is not None:
+            return self._model.addMVar(count, vtype=vtype).tolist()
+        columns = list(
+            range(self._number_of_columns, self._number_of_columns + count)
+        )
+        self._number_of_columns += count
+        self._column_ub.append(
+            np.full(count, 1 if vtype == GRB.BINARY else np.inf, dtype=float)
+        )
+        self._column_integer.append(np.full(count, vtype == GRB.BINARY))
+        return columns
+
+    def _add_constraint_block(self, blocks, sense, rhs):
+        """
+        Adds the rows sum(matrix @ variables) (sense) rhs
+        Args:
+            blocks: list of (sparse matrix, list of variables) with the same
+                number of rows
+            sense: GRB.LESS_EQUAL, GRB.GREATER_EQUAL or GRB.EQUAL
+            rhs: right hand side of every row
+        """
+        matrix = sp.hstack([matrix for matrix, _ in blocks], format="csr")
+        if matrix.shape[0] == 0:
+            return
+        matrix.eliminate_zeros()
+        variables = [var for _, block_vars in blocks for var in block_vars]
+        if self._model is not None:
+            self._model.addMConstr(matrix, variables, sense, rhs)
+            return
+        matrix = matrix.tocoo()
+        rhs = np.asarray(rhs, dtype=float)
+        self._program_blocks.append(
+            (
+                matrix.row,
+                np.array(variables)[matrix.col],
+                matrix.data,
+                rhs if sense != GRB.LESS_EQUAL else np.full(len(rhs), -np.inf),
+                rhs
+                if sense != GRB.GREATER_EQUAL
+                else np.full(len(rhs), np.inf),
+            )
+        )
+
+    def _set_objective(
+        self, coefficients, variables, constant, index: int, priority: int
+    ):
+        """Sets objective index to coefficients @ variables + constant"""
+        if self._model is not None:
+            expression = LinExpr(
+                np.asarray(coefficients, dtype=float).tolist(), variables
+            )
+            expression.addConstant(constant)
+            self._model.setObjectiveN(expression, index, priority=priority)
+            return
+        self._program_objectives[index] = (
+            priority,
+            np.asarray(coefficients, dtype=float),
+            variables,
+            constant,
+        )
+
+    def _linear_program(self) -> LinearProgram:
+        if self._model is not None:
+            return super()._linear_program()
+        number_of_columns = self._number_of_columns
+        rows, columns = [np.zeros(0, dtype=int)], [np.zeros(0, dtype=int)]
+        data, row_lb, row_ub = [np.zeros(0)], [np.zeros(0)], [np.zeros(0)]
+        number_of_rows = 0
+        for (
+            block_rows,
+            block_columns,
+            block_data,
+            lb,
+            ub,
+        ) in self._program_blocks:
+            rows.append(block_rows + number_of_rows)
+            columns.append(block_columns)
+            data.append(block_data)
+            row_lb.append(lb)
+            row_ub.append(ub)
+            number_of_rows += len(lb)
+        objectives = []
+        for index in sorted(self._program_objectives):
+            (
+                priority,
+                coefficients,
+                variables,
+                constant,
+            ) = self._program_objectives[index]
+            objective = np.zeros(number_of_columns)
+            np.add.at(objective, np.array(variables, dtype=int), coefficients)
+            objectives.append(Objective(priority, objective, constant))
+        start = None
+        if self._start is not None:
+            # Allocation variables are the first columns
+            start = np.full(number_of_columns, np.nan)
+            start[: len(self._start)] = list(self._start.values())
+        return LinearProgram(
+            matrix=sp.csr_matrix(
+                (
+                    np.concatenate(data),
+                    (np.concatenate(rows), np.concatenate(columns)),
+                ),
+                shape=(number_of_rows, number_of_columns),
+            ),
+            row_lb=np.concatenate(row_lb),
+            row_ub=np.concatenate(row_ub),
+            lb=np.zeros(number_of_columns),
+            ub=np.concatenate(self._column_ub),
+            integer=np.concatenate(self._column_integer),
+            objectives=objectives,
+            start=start,
+        )
+
+    def _setup_allocation_var(self):
+        self._allocation_var_list = self._add_variables(
+            len(self._pair_index), GRB.BINARY
+        )
+        self._allocation_var = dict(
+            zip(self._pair_index, self._allocation_var_list)
+        )
+
+    def _setup_tutor_on_day_var(self):
+        self._tutor_on_day_var_list = self._add_variables(
+            len(self._tutor_day_streams), GRB.BINARY
+        )
+        self._tutor_on_day_var = dict(
+            zip(self._tutor_day_streams, self._tutor_on_day_var_list)
+        )
+
+    def _setup_stream_allocation_var(self):
+        self._stream_allocation_var_list = self._add_variables(
+            len(self._session_streams), GRB.BINARY
+        )
+        self._stream_allocation_var = dict(
+            zip(self._session_streams, self._stream_allocation_var_list)
+        )
+
+    def _setup_tutor_on_day_var_constraint(self):
+        number_of_rows = len(self._tutor_on_day_pairs)
+        rows = np.arange(number_of_rows)
+        self._add_constraint_block(
+            [
+                (
+                    sp.csr_matrix(
+                        (
+                            np.ones(number_of_rows),
+                            (rows, self._tutor_on_day_rows),
+                        ),
+                        shape=(
+                            number_of_rows,
+                            len(self._tutor_on_day_var_list),
+                        ),
+                    ),
+                    self._tutor_on_day_var_list,
+                ),
+                (
+                    sp.csr_matrix(
+                        (
+                            -np.ones(number_of_rows),
+                            (rows, self._tutor_on_day_pairs),
+                        ),
+                        shape=(number_of_rows, len(self._pair_index)),
+                    ),
+                    self._allocation_var_list,
+                ),
+            ],
+            GRB.GREATER_EQUAL,
+            np.zeros(number_of_rows),
+        )
+
+    def _setup_tutor_on_stream_var_constraint(self):
+        number_of_pairs = len(self._pair_index)
+        rows = np.arange(number_of_pairs)
+        self._add_constraint_block(
+            [
+                (
+                    sp.csr_matrix(
+                        (
+                            np.ones(number_of_pairs),
+                            (rows, self._problem.pair_stream),
+                        ),
+                        shape=(number_of_pairs, len(self._session_streams)),
+                    ),
+                    self._stream_allocation_var_list,
+                ),
+                (-sp.identity(number_of_pairs), self._allocation_var_list),
+            ],
+            GRB.GREATER_EQUAL,
+            np.zeros(number_of_pairs),
+        )
+
+    def _setup_seniority_for_session_constraint(self):
+        """Each session has to have a least 1 senior tutor if possible"""
+        problem = self._problem
+        root_streams = np.flatnonzero(problem.stream_is_root)
+        stream_rows = np.full(len(self._session_streams), -1)
+        stream_rows[root_streams] = np.arange(len(root_streams))
+        pairs = np.flatnonzero(problem.stream_is_root[problem.pair_stream])
+        streams = problem.pair_stream[pairs]
+        new = problem.tutor_new[problem.pair_tutor[pairs]].astype(int)
+        coefficients = (1 - new) * (
+            problem.stream_number_of_tutors[streams] - 1
+        ) - new
+        self._add_constraint_block(
+            [
+                (
+                    sp.csr_matrix(
+                        (coefficients, (stream_rows[streams], pairs)),
+                        shape=(len(root_streams), len(self._pair_index)),
+                    ),
+                    self._allocation_var_list,
+                )
+            ],
+            GRB.GREATER_EQUAL,
+            np.zeros(len(root_streams)),
+        )
+
+    def _setup_allocation_collision_constraint(self):
+        """tutor must work on at most one session per time slot,
+        i.e. no collision"""
+        rows = []
+        pairs = []
+        for row, (tutor_id, stream_ids) in enumerate(self._collision_groups()):
+            rows.extend(row for _ in stream_ids)
+            pairs.extend(
+                self._pair_index[tutor_id, stream_id]
+                for stream_id in stream_ids
+            )
+        number_of_rows = rows[-1] + 1 if rows else 0
+        self._add_constraint_block(
+            [
+                (
+                    sp.csr_matrix(
+                        (np.ones(len(rows)), (rows, pairs)),
+                        shape=(number_of_rows, len(self._pair_index)),
+                    ),
+                    self._allocation_var_list,
+                )
+            ],
+            GRB.LESS_EQUAL,
+            np.ones(number_of_rows),
+        )
+
+    def _setup_number_of_tutors_constraint(self):
+        """
+        Each session stream should be allocated exactly the number of staff that
+        stream requires.
+        """
+        self._add_constraint_block(
+            [(self._stream_pairs_matrix(), self._allocation_var_list)],
+            GRB.LESS_EQUAL,
+            self._problem.stream_number_of_tutors.astype(float),
+        )
+
+    def _setup_maximum_weekly_hours_constraint(self):
+        """Staff must not work more than their maximum weekly hours per week"""
+        problem = self._problem
+        number_of_weeks = len(problem.week_ids)
+        pairs, weeks = np.nonzero(problem.stream_weeks[problem.pair_stream])
+        # One row per (tutor, week) the tutor can be allocated in
+        tutor_weeks = problem.pair_tutor[pairs] * number_of_weeks + weeks
+        tutor_weeks, rows = np.unique(tutor_weeks, return_inverse=True)
+        self._add_constraint_block(
+            [
+                (
+                    sp.csr_matrix(
+                        (
+                            problem.stream_duration[problem.pair_stream[pairs]],
+                            (rows, pairs),
+                        ),
+                        shape=(len(tutor_weeks), len(self._pair_index)),
+                    ),
+                    self._allocation_var_list,
+                )
+            ],
+            GRB.LESS_EQUAL,
+            problem.tutor_max_weekly_hours[tutor_weeks // number_of_weeks],
+        )
+
+    def _setup_allocated_hours_objective(self):
+        """Minimises the number of unallocated hours"""
+        problem = self._problem
+        self._set_objective(
+            -problem.stream_total_hours[problem.pair_stream],
+            self._allocation_var_list,
+            float(problem.stream_number_of_tutors @ problem.stream_total_hours),
+            0,
+            priority=self._allocated_hours_priority,
+        )
+
+    def _tutor_hours_matrix(self) -> sp.csr_matrix:
+        """Tutors x pairs matrix of the allocated hours of every tutor,
+        weighted by seniority"""
+        problem = self._problem
+        weights = np.where(problem.tutor_new, self._new_threshold, 1)
+        return sp.csr_matrix(
+            (
+                problem.stream_total_hours[problem.pair_stream]
+                / weights[problem.pair_tutor],
+                (problem.pair_tutor, np.arange(len(self._pair_index))),
+            ),
+            shape=(len(self._tutors), len(self._pair_index)),
+        )
+
+    def _stream_pairs_matrix(self) -> sp.csr_matrix:
+        """Streams x pairs matrix of the tutors allocated to every stream"""
+        problem = self._problem
+        number_of_pairs = len(self._pair_index)
+        return sp.csr_matrix(
+            (
+                np.ones(number_of_pairs),
+                (problem.pair_stream, np.arange(number_of_pairs)),
+            ),
+            shape=(len(self._session_streams), number_of_pairs),
+        )
+
+    def _setup_spread_objective(self):
+        """Minimises spread between tutors"""
+        mean_hours = self._mean_hours()
+        number_of_tutors = len(self._tutors)
+        if self._spread_mode == "max":
+            # Largest absolute difference between allocated and mean hours
+            variance_vars = self._add_variables(1, GRB.CONTINUOUS)
+            variance = sp.csr_matrix(np.ones((number_of_tutors, 1)))
+        else:
+            # Absolute difference between allocated and mean hours
+            variance_vars = self._add_variables(
+                number_of_tutors, GRB.CONTINUOUS
+            )
+            variance = sp.identity(number_of_tutors, format="csr")
+        total_hours = self._tutor_hours_matrix()
+        # Variances are minimised, so bounding them from below by the
+        # difference and its negation is exact
+        for sign in (1, -1):
+            self._add_constraint_block(
+                [
+                    (variance, variance_vars),
+                    (-sign * total_hours, self._allocation_var_list),
+                ],
+                GRB.GREATER_EQUAL,
+                np.full(number_of_tutors, -sign * mean_hours),
+            )
+        self._set_objective(
+            np.ones(len(variance_vars)), variance_vars, 0, 2, priority=1
+        )
+
+    def _setup_symmetry_breaking_constraint(self):
+        """Interchangeable tutors are ordered by allocated hours, and
+        interchangeable streams by number of allocated tutors"""
+        problem = self._problem
+        for totals_matrix, groups, index in (
+            (self._tutor_hours_matrix, self._tutor_groups, problem.tutor_index),
+            (
+                self._stream_pairs_matrix,
+                self._stream_groups,
+                problem.stream_index,
+            ),
+        ):
+            first = [index[key] for group in groups for key in group[:-1]]
+            if not first:
+                continue
+            following = [index[key] for group in groups for key in group[1:]]
+            totals = totals_matrix()
+            self._add_constraint_block(
+                [
+                    (
+                        totals[first] - totals[following],
+                        self._allocation_var_list,
+                    )
+                ],
+                GRB.GREATER_EQUAL,
+                np.zeros(len(first)),
+            )
+
+    def _setup_preference_hour_objective(self):
+        """Tutors should work more in their preferred session type"""
+        problem = self._problem
+        pairs = np.flatnonzero(problem.pair_prefers_other_type())
+        self._set_objective(
+            problem.stream_total_hours[problem.pair_stream[pairs]],
+            [self._allocation_var_list[pair] for pair in pairs],
+            0,
+            1,
+            priority=1,
+        )
+
+    def _setup_workday_objective(self):
+        """Minimises number of days everyone has to go to work"""
+        self._set_objective(
+            np.ones(len(self._tutor_on_day_var_list)),
+            self._tutor_on_day_var_list,
+            0,
+            3,
+            priority=0,
+        )
+
+    def _setup_unallocated_sessions_objective(self):
+        """Minimises number of unallocated sessions"""
+        self._set_objective(
+            np.ones(len(self._stream_allocation_var_list)),
+            self._stream_allocation_var_list,
+            0,
+            4,
+            priority=0,
+        )
+
+    def _populate_allocation(self):
+        problem = self._problem
+        allocated = np.array(
+            self._model.getAttr("X", self._allocation_var_list)
+        )
+        for pair in np.flatnonzero(allocated > 0.99):
+            tutor_id = problem.tutor_ids[problem.pair_tutor[pair]]
+            stream_id = problem.stream_ids[problem.pair_stream[pair]]
+            self._results[stream_id].append(tutor_id)
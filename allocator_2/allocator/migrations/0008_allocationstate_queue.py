@@ -0,0 +1,33 @@
+# Generated by Django 3.2.9 on 2026-10-17 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("allocator", "0007_allocationstate_timeout"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="allocationstate",
+            name="pid",
+            field=models.IntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name="allocationstate",
+            name="input_data",
+            field=models.JSONField(null=True),
+        ),
+        migrations.AddField(
+            model_name="allocationstate",
+            name="initial_allocation",
+            field=models.JSONField(null=True),
+        ),
+        migrations.AddField(
+            model_name="allocationstate",
+            name="priority",
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 3.2.9 on 2026-10-17 11:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("allocator", "0008_allocationstate_queue"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CachedResult",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("data_hash", models.BinaryField(unique=True)),
+                ("result", models.JSONField()),
+                ("runtime", models.IntegerField(null=True)),
+                ("last_used", models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
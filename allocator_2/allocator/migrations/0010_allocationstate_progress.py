@@ -0,0 +1,18 @@
+# Generated by Django 3.2.9 on 2026-10-17 13:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("allocator", "0009_cachedresult"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="allocationstate",
+            name="progress",
+            field=models.JSONField(null=True),
+        ),
+    ]
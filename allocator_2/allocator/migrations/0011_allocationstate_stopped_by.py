@@ -0,0 +1,18 @@
+# Generated by Django 3.2.9 on 2026-10-17 14:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("allocator", "0010_allocationstate_progress"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="allocationstate",
+            name="stopped_by",
+            field=models.JSONField(null=True),
+        ),
+    ]
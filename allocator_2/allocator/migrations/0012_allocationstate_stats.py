@@ -0,0 +1,18 @@
+# Generated by Django 3.2.9 on 2026-10-17 19:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("allocator", "0011_allocationstate_stopped_by"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="allocationstate",
+            name="stats",
+            field=models.JSONField(null=True),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 3.2.9 on 2026-10-18 09:12
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("allocator", "0012_allocationstate_stats"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="allocationstate",
+            name="updated_at",
+            field=models.DateTimeField(
+                auto_now=True, default=django.utils.timezone.now
+            ),
+            preserve_default=False,
+        ),
+    ]
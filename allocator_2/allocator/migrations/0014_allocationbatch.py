@@ -0,0 +1,36 @@
+# Generated by Django 3.2.9 on 2026-10-18 11:40
+
+from django.db import migrations, models
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("allocator", "0013_allocationstate_updated_at"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AllocationBatch",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("created", models.DateTimeField(auto_now_add=True)),
+                (
+                    "allocations",
+                    models.ManyToManyField(
+                        related_name="batches",
+                        to="allocator.AllocationState",
+                    ),
+                ),
+            ],
+        ),
+    ]
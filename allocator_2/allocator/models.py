@@ -1,10 +1,21 @@
+import uuid
+
 from django.db import models
+from django.utils import timezone
+
+
+class AllocationStateQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        """Updates the rows, marking them as updated for long polls"""
+        kwargs.setdefault("updated_at", timezone.now())
+        return super().update(**kwargs)
 
 
 class AllocationState(models.Model):
     timetable_id = models.UUIDField(primary_key=True)
     data_hash = models.BinaryField()
-    pid = models.IntegerField()
+    # Process running the allocation, None while queued for a worker
+    pid = models.IntegerField(null=True)
     request_time = models.DateTimeField()
     timeout = models.IntegerField()
     runtime = models.IntegerField(null=True)
@@ -12,3 +23,38 @@ class AllocationState(models.Model):
     title = models.TextField(default="Allocation Requested")
     type = models.TextField()
     message = models.TextField(null=True)
+    # Allocation request data and previous allocation, read by workers
+    input_data = models.JSONField(null=True)
+    initial_allocation = models.JSONField(null=True)
+    priority = models.IntegerField(default=0)
+    # Latest progress reported by the running allocation
+    progress = models.JSONField(null=True)
+    # Stopping rules that ended the allocation before its timeout
+    stopped_by = models.JSONField(null=True)
+    # Time taken by every phase of the allocation and solve statistics
+    stats = models.JSONField(null=True)
+    # Last time any field changed, waited on by long polls
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = AllocationStateQuerySet.as_manager()
+
+
+class AllocationBatch(models.Model):
+    """Allocations requested together, whose status is read in one query"""
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    created = models.DateTimeField(auto_now_add=True)
+    allocations = models.ManyToManyField(
+        AllocationState, related_name="batches"
+    )
+
+
+class CachedResult(models.Model):
+    """Result of a generated allocation, reused by any timetable requesting an
+    allocation with the same input data"""
+
+    data_hash = models.BinaryField(unique=True)
+    result = models.JSONField()
+    runtime = models.IntegerField(null=True)
+    # Least recently used results are evicted first
+    last_used = models.DateTimeField(db_index=True)
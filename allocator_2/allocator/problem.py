@@ -0,0 +1,253 @@
+from dataclasses import dataclass
+from functools import cached_property
+
+import numpy as np
+
+from .schema import InputData, SessionStream, Staff, Week, availability_matrix
+from .type_hints import IsoDay
+
+MINUTES_PER_HOUR = 60
+# Preference code of tutors without a preferred session type
+NO_PREFERENCE = -1
+
+
+def _type_name(type_) -> str:
+    """Session types are either SessionType or their value when parsed from
+    JSON, which are equal but hash differently"""
+    return getattr(type_, "value", type_)
+
+
+def _read_only(array: np.ndarray) -> np.ndarray:
+    array.setflags(write=False)
+    return array
+
+
+@dataclass(frozen=True)
+class ProblemArrays:
+    """
+    Compiled form of the allocation input, where tutors, session streams and
+    weeks are integer positions and their attributes are read only NumPy
+    arrays indexed by position, so that model builders and callbacks don't
+    follow attributes of the schema objects.
+    """
+
+    tutor_ids: tuple[str, ...]
+    stream_ids: tuple[str, ...]
+    # Weeks of the timetable, followed by other weeks streams run in
+    week_ids: tuple[int, ...]
+    tutor_index: dict[str, int]
+    stream_index: dict[str, int]
+    week_index: dict[int, int]
+    # Session types, indexed by type code
+    session_types: tuple[str, ...]
+
+    # Stream attributes, indexed by stream position
+    stream_day: np.ndarray
+    # Start and end times in minutes
+    stream_start: np.ndarray
+    stream_end: np.ndarray
+    # Duration of a single session and of every session in hours
+    stream_duration: np.ndarray
+    stream_total_hours: np.ndarray
+    stream_number_of_tutors: np.ndarray
+    stream_is_root: np.ndarray
+    stream_type: np.ndarray
+    # (stream, week): True if the stream runs that week
+    stream_weeks: np.ndarray
+
+    # Week attributes, indexed by week position
+    week_in_timetable: np.ndarray
+
+    # Tutor attributes, indexed by tutor position
+    tutor_new: np.ndarray
+    tutor_max_weekly_hours: np.ndarray
+    tutor_max_contiguous_hours: np.ndarray
+    # Type code of the preferred session type, or NO_PREFERENCE
+    tutor_preference: np.ndarray
+
+    # Tutor and stream positions of every pair where the tutor is available,
+    # sorted by tutor then stream
+    pair_tutor: np.ndarray
+    pair_stream: np.ndarray
+
+    @classmethod
+    def compile(
+        cls,
+        tutors: list[Staff],
+        session_streams: list[SessionStream],
+        weeks: list[Week],
+    ) -> "ProblemArrays":
+        """
+        Compiles the arrays of the input.
+        Args:
+            tutors: tutors to allocate
+            session_streams: session streams to allocate tutors to
+            weeks: weeks of the timetable
+        Returns: compiled input, with positions in input order
+        """
+        week_ids = list(dict.fromkeys(week.id for week in weeks))
+        number_of_timetable_weeks = len(week_ids)
+        for stream in session_streams:
+            week_ids.extend(
+                week
+                for week in dict.fromkeys(stream.weeks)
+                if week not in week_ids
+            )
+        week_index = {week: i for i, week in enumerate(week_ids)}
+        session_types = tuple(
+            dict.fromkeys(
+                [_type_name(stream.type) for stream in session_streams]
+                + [
+                    _type_name(tutor.type_preference)
+                    for tutor in tutors
+                    if tutor.type_preference is not None
+                ]
+            )
+        )
+        type_codes = {type_: i for i, type_ in enumerate(session_types)}
+
+        stream_weeks = np.zeros((len(session_streams), len(week_ids)), bool)
+        for stream_index, stream in enumerate(session_streams):
+            stream_weeks[
+                stream_index, [week_index[week] for week in stream.weeks]
+            ] = True
+        available = availability_matrix(tutors, session_streams)
+        pair_tutor, pair_stream = np.nonzero(available)
+
+        stream_duration = np.array(
+            [stream.time.duration() for stream in session_streams], float
+        )
+        arrays = {
+            "stream_day": np.array(
+                [stream.day for stream in session_streams], np.int8
+            ),
+            "stream_start": np.array(
+                [
+                    round(stream.time.start_time.value * MINUTES_PER_HOUR)
+                    for stream in session_streams
+                ],
+                np.int32,
+            ),
+            "stream_end": np.array(
+                [
+                    round(stream.time.end_time.value * MINUTES_PER_HOUR)
+                    for stream in session_streams
+                ],
+                np.int32,
+            ),
+            "stream_duration": stream_duration,
+            # Weeks listed twice are counted twice, like total_hours
+            "stream_total_hours": stream_duration
+            * np.array([len(stream.weeks) for stream in session_streams]),
+            "stream_number_of_tutors": np.array(
+                [stream.number_of_tutors for stream in session_streams], int
+            ),
+            "stream_is_root": np.array(
+                [stream.is_root for stream in session_streams], bool
+            ),
+            "stream_type": np.array(
+                [
+                    type_codes[_type_name(stream.type)]
+                    for stream in session_streams
+                ],
+                np.int8,
+            ),
+            "stream_weeks": stream_weeks,
+            "week_in_timetable": np.arange(len(week_ids))
+            < number_of_timetable_weeks,
+            "tutor_new": np.array([tutor.new for tutor in tutors], bool),
+            "tutor_max_weekly_hours": np.array(
+                [tutor.max_weekly_hours for tutor in tutors], float
+            ),
+            "tutor_max_contiguous_hours": np.array(
+                [tutor.max_contiguous_hours for tutor in tutors], float
+            ),
+            "tutor_preference": np.array(
+                [
+                    type_codes.get(
+                        _type_name(tutor.type_preference), NO_PREFERENCE
+                    )
+                    for tutor in tutors
+                ],
+                np.int8,
+            ),
+            "pair_tutor": pair_tutor,
+            "pair_stream": pair_stream,
+        }
+        return cls(
+            tutor_ids=tuple(tutor.id for tutor in tutors),
+            stream_ids=tuple(stream.id for stream in session_streams),
+            week_ids=tuple(week_ids),
+            tutor_index={tutor.id: i for i, tutor in enumerate(tutors)},
+            stream_index={
+                stream.id: i for i, stream in enumerate(session_streams)
+            },
+            week_index=week_index,
+            session_types=session_types,
+            **{name: _read_only(array) for name, array in arrays.items()},
+        )
+
+    @classmethod
+    def from_input(cls, data: InputData) -> "ProblemArrays":
+        """Compiles the arrays of the input data of a request"""
+        return cls.compile(data.staff, data.session_streams, data.weeks)
+
+    def streams_clash(self, stream: int, other: int) -> bool:
+        """Returns True if both streams run at the same time on the same day
+        in at least one common week"""
+        return bool(
+            self.stream_day[stream] == self.stream_day[other]
+            and (
+                self.stream_start[stream]
+                <= self.stream_start[other]
+                < self.stream_end[stream]
+                or self.stream_start[other]
+                <= self.stream_start[stream]
+                < self.stream_end[other]
+            )
+            and (self.stream_weeks[stream] & self.stream_weeks[other]).any()
+        )
+
+    def pair_prefers_other_type(self) -> np.ndarray:
+        """Returns True for every pair where the tutor prefers another type
+        of session than the stream's"""
+        preference = self.tutor_preference[self.pair_tutor]
+        return (preference != NO_PREFERENCE) & (
+            preference != self.stream_type[self.pair_stream]
+        )
+
+    @cached_property
+    def tutor_days(self) -> tuple[np.ndarray, ...]:
+        """
+        Pairs grouped by the (tutor, day, week) of the timetable their stream
+        runs on, in the order each group first appears in the pairs, as the
+        tutor, day and week position of every group, the pair positions of
+        every group member sorted by group then pair, and the start of every
+        group in these pair positions followed by their number.
+        """
+        pairs, weeks = np.nonzero(
+            self.stream_weeks[self.pair_stream] & self.week_in_timetable
+        )
+        tutors = self.pair_tutor[pairs]
+        days = self.stream_day[self.pair_stream[pairs]]
+        keys = (tutors * (max(IsoDay) + 1) + days) * len(self.week_ids) + weeks
+        _, first, groups = np.unique(
+            keys, return_index=True, return_inverse=True
+        )
+        # Unique keys are sorted, number them by first appearance instead
+        appearance = np.argsort(first)
+        rank = np.empty_like(appearance)
+        rank[appearance] = np.arange(len(appearance))
+        groups = rank[groups]
+        order = np.argsort(groups, kind="stable")
+        first = first[appearance]
+        return tuple(
+            _read_only(array)
+            for array in (
+                tutors[first],
+                days[first],
+                weeks[first],
+                pairs[order],
+                np.concatenate([[0], np.cumsum(np.bincount(groups))]),
+            )
+        )
@@ -0,0 +1,153 @@
+import math
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+import psutil
+from gurobipy.gurobipy import GRB, GurobiError, Model
+
+# Parameters of the resources a model may use, saved once it's created
+_RESOURCE_PARAMETERS = ("Threads", "MemLimit", "NodefileStart", "NodefileDir")
+
+# Model attributes saved after the solve, missing ones are saved as None
+_GUROBI_ATTRIBUTES = (
+    "Status",
+    "Runtime",
+    "NodeCount",
+    "IterCount",
+    "MIPGap",
+    "SolCount",
+    "NumVars",
+    "NumBinVars",
+    "NumConstrs",
+    "NumGenConstrs",
+    "NumNZs",
+)
+
+
+def peak_rss() -> Optional[int]:
+    """
+    Returns the peak resident set size in bytes of this process or any of
+    its finished child processes, since the process started.
+    """
+    try:
+        import resource
+    except ImportError:
+        # Windows only reports the peak of this process
+        return getattr(psutil.Process().memory_info(), "peak_wset", None)
+    # Linux reports kilobytes, MacOS bytes
+    unit = 1 if psutil.MACOS else 1024
+    return unit * max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+
+
+def _model_attribute(model: Model, attribute: str):
+    try:
+        return model.getAttr(attribute)
+    except (GurobiError, AttributeError):
+        # e.g. MIPGap without a solution
+        return None
+
+
+def gurobi_stats(model: Model) -> dict:
+    """Returns the solve statistics of an optimised model"""
+    return {
+        attribute: _model_attribute(model, attribute)
+        for attribute in _GUROBI_ATTRIBUTES
+    }
+
+
+class Profiler:
+    """
+    Records the wall and CPU time of every phase of an allocation, the
+    variables and constraints added to the model by each phase, and solve
+    statistics. The profile is a JSON serialisable dict with members:
+        phases: list of phases in the order they ran, with their name, wall
+            and cpu time in seconds, and the number of vars, constrs and
+            gen_constrs they added if they built the model
+        presolve: seconds Gurobi spent before branch and bound of the first
+            objective started
+        gurobi: statistics of the Gurobi model after the solve
+        resources: Gurobi parameters limiting the threads, memory and node
+            files of the model, None for parameters without limit
+        components: profiles of components solved separately
+        peak_rss: peak resident set size in bytes of the process running
+            the allocation, over the lifetime of that process
+    """
+
+    def __init__(self):
+        self._phases: list[dict] = []
+        self._presolve: Optional[float] = None
+        self._gurobi: Optional[dict] = None
+        self._components: list[dict] = []
+        self._resources: Optional[dict] = None
+
+    @staticmethod
+    def _model_size(model: Model) -> tuple[int, int, int]:
+        model.update()
+        return model.NumVars, model.NumConstrs, model.NumGenConstrs
+
+    @contextmanager
+    def phase(self, name: str, model: Optional[Model] = None):
+        """
+        Times the phase run in the context.
+        Args:
+            name: name of the phase
+            model: model built by the phase, to count what it adds
+        """
+        size = self._model_size(model) if model is not None else None
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            phase = {
+                "name": name,
+                "wall": time.perf_counter() - wall,
+                "cpu": time.process_time() - cpu,
+            }
+            if model is not None:
+                added = [
+                    after - before
+                    for before, after in zip(size, self._model_size(model))
+                ]
+                phase.update(
+                    vars=added[0], constrs=added[1], gen_constrs=added[2]
+                )
+            self._phases.append(phase)
+
+    def resources(self, model: Model):
+        """Records the resource parameters applied to the model"""
+        self._resources = {}
+        for name in _RESOURCE_PARAMETERS:
+            value = model.getParamInfo(name)[2]
+            # Unlimited by default
+            if isinstance(value, float) and math.isinf(value):
+                value = None
+            self._resources[name] = value
+
+    def callback(self, model: Model, where: int):
+        """Records the end of presolve from a Gurobi callback"""
+        if where == GRB.Callback.MIP and self._presolve is None:
+            self._presolve = model.cbGet(GRB.Callback.RUNTIME)
+
+    def solved(self, model: Model):
+        """Records the statistics of the solved model"""
+        self._gurobi = gurobi_stats(model)
+
+    def add_component(self, profile: dict):
+        """Adds the profile of a component solved in another process"""
+        self._components.append(profile)
+
+    def to_dict(self) -> dict:
+        profile = {
+            "phases": self._phases,
+            "presolve": self._presolve,
+            "gurobi": self._gurobi,
+            "resources": self._resources,
+            "peak_rss": peak_rss(),
+        }
+        if self._components:
+            profile["components"] = self._components
+        return profile
@@ -0,0 +1,118 @@
+import time
+from typing import Callable, Iterable, Optional
+
+from gurobipy.gurobipy import GRB
+
+from .type_hints import Allocation, SessionId, StaffId
+
+ProgressCallback = Callable[[dict], None]
+
+
+def _finite(value: float) -> Optional[float]:
+    """Gurobi reports missing bounds and incumbents as +-GRB.INFINITY"""
+    return value if abs(value) < GRB.INFINITY else None
+
+
+class ProgressReporter:
+    """
+    Collects the progress of a solve from Gurobi callbacks, and reports it at
+    most once every interval so that the solver isn't slowed down.
+    Reported progress is a JSON serialisable dict with members:
+        objectives_solved: number of objective priorities already optimised,
+            from the highest priority
+        objectives: number of objective priorities
+        incumbent: objective value of the best solution of the priority being
+            optimised
+        bound: best bound of the priority being optimised
+        gap: relative MIP gap of the priority being optimised
+        runtime: seconds since solving started
+        best_allocation: allocation of the best solution found so far
+    When components of the input are solved separately, only the number of
+    components and of solved components is reported with the allocation of
+    the solved components, in members components and components_solved.
+    """
+
+    def __init__(
+        self,
+        report: ProgressCallback,
+        session_stream_ids: Iterable[SessionId],
+        interval: float = 5,
+        objectives: int = 1,
+        components: Optional[int] = None,
+    ):
+        self._report = report
+        self._session_stream_ids = list(session_stream_ids)
+        self._interval = interval
+        self._start_time = time.time()
+        self._last_report: Optional[float] = None
+        self._progress = {
+            "objectives_solved": 0,
+            "objectives": objectives,
+            "incumbent": None,
+            "bound": None,
+            "gap": None,
+            "runtime": 0,
+            "best_allocation": None,
+        }
+        if components is not None:
+            self._progress = {
+                "components": components,
+                "components_solved": 0,
+                "runtime": 0,
+                "best_allocation": None,
+            }
+
+    def objectives_solved(self, objectives_solved: int):
+        """Starts optimising the next objective priority"""
+        self._progress.update(
+            objectives_solved=objectives_solved,
+            incumbent=None,
+            bound=None,
+            gap=None,
+        )
+        self.report()
+
+    def mip(self, incumbent: float, bound: float):
+        """Updates the incumbent objective value and best bound"""
+        incumbent, bound = _finite(incumbent), _finite(bound)
+        gap = None
+        if incumbent is not None and bound is not None:
+            gap = abs(bound - incumbent) / max(abs(incumbent), 1e-10)
+        self._progress.update(incumbent=incumbent, bound=bound, gap=gap)
+        self.report(force=False)
+
+    def solution(self, solution: dict[tuple[StaffId, SessionId], float]):
+        """Records a new best solution, given the value of the allocation
+        variable of every (tutor, stream) pair"""
+        allocation: Allocation = {
+            stream_id: [] for stream_id in self._session_stream_ids
+        }
+        for (tutor_id, stream_id), value in solution.items():
+            if value > 0.99:
+                allocation[stream_id].append(tutor_id)
+        self._progress["best_allocation"] = allocation
+        self.report(force=False)
+
+    def component_solved(self, allocation: Allocation):
+        """Adds the allocation of a solved component to the best allocation"""
+        self._progress["components_solved"] += 1
+        if self._progress["best_allocation"] is None:
+            self._progress["best_allocation"] = {
+                stream_id: [] for stream_id in self._session_stream_ids
+            }
+        self._progress["best_allocation"].update(allocation)
+        self.report(force=False)
+
+    def report(self, force: bool = True):
+        """Reports progress, unless reported less than an interval ago and
+        not forced"""
+        now = time.time()
+        if (
+            not force
+            and self._last_report is not None
+            and now - self._last_report < self._interval
+        ):
+            return
+        self._last_report = now
+        self._progress["runtime"] = int(now - self._start_time)
+        self._report(dict(self._progress))
@@ -0,0 +1,94 @@
+import os
+import tempfile
+from dataclasses import dataclass
+from typing import Optional
+
+import psutil
+from django.conf import settings
+
+_BYTES_PER_GB = 1024 ** 3
+
+
+@dataclass(frozen=True)
+class JobResources:
+    """
+    Share of the machine an allocation may use, applied to Gurobi as
+    parameters, so that allocations running at once don't compete for cores
+    or run the machine out of memory.
+    """
+
+    # Gurobi threads, 0 lets Gurobi use every core
+    threads: int = 0
+    # Most memory in GB Gurobi may use, the solve fails instead of the
+    # process being killed when it needs more, None for no limit
+    mem_limit: Optional[float] = None
+    # Memory in GB used by branch and bound nodes before further nodes are
+    # written to files in nodefile_dir, None to keep every node in memory
+    nodefile_start: Optional[float] = None
+    nodefile_dir: Optional[str] = None
+
+    def gurobi_parameters(self) -> dict:
+        """Returns the Gurobi parameters of the resources which are set"""
+        parameters = {
+            "Threads": self.threads or None,
+            "MemLimit": self.mem_limit,
+            "NodefileStart": self.nodefile_start,
+            "NodefileDir": self.nodefile_dir,
+        }
+        return {
+            name: value
+            for name, value in parameters.items()
+            if value is not None
+        }
+
+    def split(self, jobs: int) -> "JobResources":
+        """Returns the share of each of that many jobs run at once, e.g. the
+        components of an allocation"""
+
+        def share(value: Optional[float]) -> Optional[float]:
+            return value / jobs if value is not None else None
+
+        return JobResources(
+            threads=max(1, self.threads // jobs) if self.threads else 0,
+            mem_limit=share(self.mem_limit),
+            nodefile_start=share(self.nodefile_start),
+            nodefile_dir=self.nodefile_dir,
+        )
+
+
+def threads_per_job(jobs: int) -> int:
+    """Number of Gurobi threads each job gets. Unless configured, cores are
+    split evenly between jobs"""
+    if settings.ALLOCATOR_THREADS_PER_JOB:
+        return settings.ALLOCATOR_THREADS_PER_JOB
+    return max(1, (os.cpu_count() or 1) // jobs)
+
+
+def job_resources(jobs: int, threads: Optional[int] = None) -> JobResources:
+    """
+    Splits the cores and memory of the machine between allocations, as
+    configured in settings.
+    Args:
+        jobs: number of allocations running at once
+        threads: threads of every job, instead of the configured number
+    Returns: resources of every allocation
+    """
+    jobs = max(1, jobs)
+    # Memory isn't limited if neither setting is set
+    mem_limit = (
+        settings.ALLOCATOR_MEMORY_PER_JOB
+        or psutil.virtual_memory().total
+        / _BYTES_PER_GB
+        * settings.ALLOCATOR_MEMORY_SHARE
+        / jobs
+        or None
+    )
+    nodefile_start = None
+    if mem_limit is not None and settings.ALLOCATOR_NODEFILE_START > 0:
+        nodefile_start = mem_limit * settings.ALLOCATOR_NODEFILE_START
+    return JobResources(
+        threads=threads or threads_per_job(jobs),
+        mem_limit=mem_limit,
+        nodefile_start=nodefile_start,
+        nodefile_dir=settings.ALLOCATOR_NODEFILE_DIR or tempfile.gettempdir(),
+    )
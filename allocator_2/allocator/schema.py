@@ -1,6 +1,9 @@
+from bisect import bisect_right
 from dataclasses import dataclass, field
 from typing import List, Optional
 
+import numpy as np
+
 from allocator.type_hints import (
     IsoDay,
     SessionType,
@@ -9,8 +12,27 @@ from allocator.type_hints import (
 )
 
 
+class _FrozenSlots:
+    """
+    Pickling support for frozen dataclasses with __slots__, which have no
+    __dict__ and can't be restored with setattr.
+    """
+
+    __slots__ = ()
+
+    def __getstate__(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __setstate__(self, state):
+        for name, value in zip(self.__slots__, state):
+            object.__setattr__(self, name, value)
+
+
+# Weeks, hours and time slots are created for every stream and availability,
+# so they use __slots__ instead of a __dict__ per instance
 @dataclass(frozen=True, eq=True)
-class Week:
+class Week(_FrozenSlots):
+    __slots__ = ("id", "name")
     id: int
     name: str
 
@@ -22,8 +44,9 @@ class Week:
 
 
 @dataclass(frozen=True, order=True, eq=True)
-class Hour:
-    value: float = field(compare=True)
+class Hour(_FrozenSlots):
+    __slots__ = ("value",)
+    value: float
 
     def in_time_range(self, time_slot: "Timeslot"):
         return time_slot.start_time <= self < time_slot.end_time
@@ -43,6 +66,7 @@ class Hour:
 
 @dataclass
 class Timeslot:
+    __slots__ = ("start_time", "end_time")
     start_time: Hour
     end_time: Hour
 
@@ -67,8 +91,10 @@ class Timeslot:
         return str(self)
 
     def __post_init__(self):
-        self.start_time = Hour(self.start_time)  # type: ignore
-        self.end_time = Hour(self.end_time)  # type: ignore
+        if not isinstance(self.start_time, Hour):
+            self.start_time = Hour(self.start_time)  # type: ignore
+        if not isinstance(self.end_time, Hour):
+            self.end_time = Hour(self.end_time)  # type: ignore
 
 
 @dataclass
@@ -80,6 +106,10 @@ class Staff:
     type_preference: SessionType = None
     max_contiguous_hours: float = 24
     max_weekly_hours: float = 100
+    # day: (starts, ends) of merged availabilities, sorted by start time
+    _available_times: dict[int, tuple[list[float], list[float]]] = field(
+        default_factory=dict, init=False, repr=False, compare=False
+    )
 
     def __str__(self):
         return f"Staff {self.name}"
@@ -94,37 +124,60 @@ class Staff:
             session_stream: session stream to check if this tutor is available on
         Returns: True if this tutor is available on this stream, False otherwise
         """
-        availabilities = self.availabilities.get(session_stream.day)
-        if availabilities is None:
+        available_times = self._available_times.get(session_stream.day)
+        if available_times is None:
             return False
-        availabilities = sorted(
-            availabilities, key=lambda t: (t.start_time, t.end_time)
+        starts, ends = available_times
+        start = session_stream.time.start_time.value
+        index = bisect_right(starts, start) - 1
+        return (
+            index >= 0
+            and start < ends[index]
+            and session_stream.time.end_time.value <= ends[index]
         )
-        start_check = session_stream.time.start_time
-        for time_slot in availabilities:
-            if time_slot.start_time > start_check:
-                return False
-            if time_slot.start_time <= start_check < time_slot.end_time:
-                if session_stream.time.end_time <= time_slot.end_time:
-                    return True
-                start_check = time_slot.end_time
-        return False
+
+    def _compile_availabilities(self):
+        """
+        Merges overlapping and touching availabilities of every day, so that
+        availability checks only need a binary search.
+        Must be called again whenever availabilities are changed.
+        """
+        self._available_times = {}
+        for day, timeslots in self.availabilities.items():
+            starts: list[float] = []
+            ends: list[float] = []
+            for timeslot in sorted(
+                timeslots, key=lambda t: (t.start_time, t.end_time)
+            ):
+                if timeslot.duration() <= 0:
+                    continue
+                if ends and timeslot.start_time.value <= ends[-1]:
+                    ends[-1] = max(ends[-1], timeslot.end_time.value)
+                else:
+                    starts.append(timeslot.start_time.value)
+                    ends.append(timeslot.end_time.value)
+            self._available_times[day] = (starts, ends)
 
     def __post_init__(self):
         self.availabilities = {
             int(day): [
-                Timeslot(*timeslot) for timeslot in timeslots  # type: ignore
+                timeslot
+                if isinstance(timeslot, Timeslot)
+                else Timeslot(*timeslot)  # type: ignore
+                for timeslot in timeslots
             ]
             for day, timeslots in self.availabilities.items()
         }
+        self._compile_availabilities()
 
     @classmethod
     def create_dummy(cls, dummy_id: int) -> "Staff":
         availabilities = {}
-        for day in [IsoDay.MON, IsoDay.THU, IsoDay.WED, IsoDay.THU, IsoDay.FRI]:
+        for day in [IsoDay.MON, IsoDay.TUE, IsoDay.WED, IsoDay.THU, IsoDay.FRI]:
             availabilities[day] = [Timeslot(Hour(1), Hour(23))]
-        instance = cls(str(dummy_id), f"Dummy {dummy_id}", False)
+        instance = cls(str(dummy_id), f"Dummy {dummy_id}", False, {})
         instance.availabilities = availabilities
+        instance._compile_availabilities()
         return instance
 
 
@@ -147,12 +200,71 @@ class SessionStream:
         return str(self)
 
     def __post_init__(self):
-        self.time = Timeslot(*self.time)  # type: ignore
+        if not isinstance(self.time, Timeslot):
+            self.time = Timeslot(*self.time)  # type: ignore
 
     def total_hours(self):
         return self.time.duration() * len(self.weeks)
 
 
+def availability_matrix(
+    staff: list[Staff], session_streams: list[SessionStream]
+) -> np.ndarray:
+    """
+    Checks availability of every tutor for every session stream at once.
+    Args:
+        staff: tutors to check
+        session_streams: session streams to check
+    Returns: boolean array of shape (len(staff), len(session_streams)), True
+        where the tutor is available on the session stream
+    """
+    days = np.array([stream.day for stream in session_streams], dtype=int)
+    starts = np.array(
+        [stream.time.start_time.value for stream in session_streams],
+        dtype=float,
+    )
+    ends = np.array(
+        [stream.time.end_time.value for stream in session_streams],
+        dtype=float,
+    )
+    matrix = np.zeros((len(staff), len(session_streams)), dtype=bool)
+    for tutor_index, tutor in enumerate(staff):
+        for day, (
+            available_starts,
+            available_ends,
+        ) in tutor._available_times.items():
+            if not available_starts:
+                continue
+            on_day = np.flatnonzero(days == day)
+            index = (
+                np.searchsorted(available_starts, starts[on_day], side="right")
+                - 1
+            )
+            available_ends_ = np.asarray(available_ends)[np.maximum(index, 0)]
+            matrix[tutor_index, on_day] = (
+                (index >= 0)
+                & (starts[on_day] < available_ends_)
+                & (ends[on_day] <= available_ends_)
+            )
+    return matrix
+
+
+@dataclass
+class StoppingRules:
+    # Objective priority: relative MIP gap at which optimising stops
+    mip_gap: dict[int, float] = field(default_factory=dict)
+    # Stop after this many seconds without a better solution
+    no_improvement_time: Optional[float] = None
+    # Stop minimising unallocated hours once at most this many are left
+    unallocated_hours: Optional[float] = None
+
+    def __post_init__(self):
+        # JSON object keys are strings
+        self.mip_gap = {
+            int(priority): gap for priority, gap in self.mip_gap.items()
+        }
+
+
 @dataclass
 class InputData:
     timetable_id: str
@@ -161,14 +273,33 @@ class InputData:
     staff: list["Staff"]
     new_threshold: Optional[float] = None
     timeout: int = 3600
+    stopping_rules: Optional[StoppingRules] = None
+    spread_mode: str = "sum"
+    backend: str = "gurobi"
+    mode: str = "exact"
 
     def __post_init__(self):
-        self.weeks = [Week(**week) for week in self.weeks]  # type: ignore
+        # Members are either parsed JSON, or already built by the decoder
+        self.weeks = [
+            week if isinstance(week, Week) else Week(**week)  # type: ignore
+            for week in self.weeks
+        ]
         self.session_streams = [
-            SessionStream(**stream)  # type: ignore
+            stream
+            if isinstance(stream, SessionStream)
+            else SessionStream(**stream)  # type: ignore
             for stream in self.session_streams
         ]
-        self.staff = [Staff(**staff) for staff in self.staff]  # type: ignore
+        self.staff = [
+            staff if isinstance(staff, Staff) else Staff(**staff)  # type: ignore
+            for staff in self.staff
+        ]
+        if self.stopping_rules is not None and not isinstance(
+            self.stopping_rules, StoppingRules
+        ):
+            self.stopping_rules = StoppingRules(
+                **self.stopping_rules  # type: ignore
+            )
 
 
 @dataclass
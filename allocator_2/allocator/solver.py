@@ -1,28 +1,117 @@
+import dataclasses
+import multiprocessing as mp
+import os
 import time
-from itertools import product
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Optional
 
-from gurobipy.gurobipy import GRB, quicksum, Model, abs_, max_
+import numpy as np
+import scipy.sparse as sp
+from gurobipy.gurobipy import GRB, quicksum, Model
+from scipy.sparse.csgraph import connected_components
 
+from .backends import BACKENDS, from_gurobi, LinearProgram, solve_lexicographic
+from .intervals import clash_cliques, contiguous_chains, contiguous_successors
+from .problem import ProblemArrays
+from .profiling import Profiler
+from .progress import ProgressCallback, ProgressReporter
+from .resources import JobResources
+from .stopping import StoppingPolicy
+from .symmetry import equivalent_streams, equivalent_tutors
 from .schema import *
+from .type_hints import Allocation
 
 
-def lazy_constraints(vars_dict, *constraints):
+def lazy_constraints(
+    vars_dict,
+    *constraints,
+    progress: Optional[ProgressReporter] = None,
+    stopping: Optional[StoppingPolicy] = None,
+    profiler: Optional[Profiler] = None,
+):
+    keys = list(vars_dict)
+    variables = list(vars_dict.values())
+    # Later passes of multi-objective models report placeholder incumbents
+    # until a solution of the pass is accepted
+    objectives_solved = 0
+    solution_found = False
+
     def callback(model, where):
+        nonlocal objectives_solved, solution_found
+        if profiler is not None:
+            profiler.callback(model, where)
         if where == GRB.Callback.MIPSOL:
-            solution = {
-                k: v
-                for (k, v) in zip(
-                    vars_dict.keys(),
-                    model.cbGetSolution(list(vars_dict.values())),
-                )
-            }
-            for constraint in constraints:
+            solution = dict(zip(keys, model.cbGetSolution(variables)))
+            # Every constraint returns True if it rejected the solution
+            rejected = [
                 constraint(model, vars_dict, solution)
+                for constraint in constraints
+            ]
+            if any(rejected):
+                return
+            solution_found = True
+            if progress is not None:
+                progress.solution(solution)
+            if stopping is not None:
+                stopping.solution(
+                    model.cbGet(GRB.Callback.MIPSOL_OBJ),
+                    model.cbGet(GRB.Callback.MIPSOL_OBJBND),
+                )
+        elif progress is None and stopping is None:
+            return
+        elif where == GRB.Callback.MULTIOBJ:
+            objective_count = model.cbGet(GRB.Callback.MULTIOBJ_OBJCNT)
+            if objective_count != objectives_solved:
+                objectives_solved = objective_count
+                solution_found = False
+            if progress is not None:
+                progress.objectives_solved(objective_count)
+            if stopping is not None:
+                stopping.objectives_solved(objective_count)
+        elif where == GRB.Callback.MIP:
+            incumbent = GRB.INFINITY
+            if solution_found:
+                incumbent = model.cbGet(GRB.Callback.MIP_OBJBST)
+            bound = model.cbGet(GRB.Callback.MIP_OBJBND)
+            if progress is not None:
+                progress.mip(incumbent, bound)
+            if stopping is not None:
+                stopping.mip(model, incumbent, bound)
 
     return callback
 
 
+def _solve_component(
+    solver_class: type,
+    tutors: list[Staff],
+    session_streams: list[SessionStream],
+    weeks: list[Week],
+    kwargs: dict,
+) -> tuple[int, Allocation, list[dict], dict]:
+    """Solves the model of a single component in a separate process"""
+    solver = solver_class(tutors, session_streams, weeks, **kwargs)
+    status = solver.solve()
+    return (
+        status,
+        solver.get_results() if status == GRB.OPTIMAL else {},
+        solver.get_stopping_reasons(),
+        solver.get_profile(),
+    )
+
+
+SPREAD_MODES = ("sum", "max")
+# Inputs with fewer pairs of a tutor and a stream they are available for are
+# solved as one model, which is faster than starting processes for their
+# components
+DECOMPOSITION_MIN_PAIRS = 1000
+
+
 class Solver:
+    # Priority of the objective minimising unallocated hours
+    _allocated_hours_priority = 2
+    # Builds the linear program of other backends without a Gurobi model
+    _builds_program = False
+
     #  (dis)preferred day
     def __init__(
         self,
@@ -31,7 +120,20 @@ class Solver:
         weeks: list[Week],
         new_threshold: float = 1,
         timeout=3600,
+        initial_allocation: Optional[Allocation] = None,
+        threads: Optional[int] = None,
+        progress: Optional[ProgressCallback] = None,
+        progress_interval: float = 5,
+        stopping_rules: Optional[StoppingRules] = None,
+        spread_mode: str = "sum",
+        backend: str = "gurobi",
+        profiler: Optional[Profiler] = None,
+        resources: Optional[JobResources] = None,
     ):
+        if spread_mode not in SPREAD_MODES:
+            raise ValueError(f"Unknown spread mode {spread_mode}")
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend {backend}")
 
         self._tutors: dict[str, Staff] = {tutor.id: tutor for tutor in tutors}
         self._session_streams: dict[str, SessionStream] = {
@@ -39,42 +141,97 @@ class Solver:
             for session_stream in session_streams
         }
         self._weeks: dict[int, Week] = {week.id: week for week in weeks}
-        self._week_sessions: dict[int, list[SessionStream]] = {}
-        for session_stream in session_streams:
-            for week in session_stream.weeks:
-                if week not in self._week_sessions:
-                    self._week_sessions[week] = []
-                self._week_sessions[week].append(session_stream)
-
-        self._model = Model()
-        self._model.setParam("LazyConstraints", 1)
-        self._model.setParam("TimeLimit", timeout)  # Run for at most 30 minutes
+
+        # Solvers building the linear program of other backends from their
+        # arrays don't need a Gurobi model
+        self._model: Optional[Model] = None
+        if backend == "gurobi" or not self._builds_program:
+            self._model = Model()
+            self._model.ModelSense = GRB.MINIMIZE
+            self._model.setParam("LazyConstraints", 1)
+            # Run for at most 30 minutes
+            self._model.setParam("TimeLimit", timeout)
+        self._timeout = timeout
+        # Threads, memory and node files the solve may use, threads override
+        # the threads of the resources
+        self._resources = resources or JobResources()
+        if threads:
+            self._resources = dataclasses.replace(
+                self._resources, threads=threads
+            )
+        self._threads = self._resources.threads or None
+        if self._model is not None:
+            for name, value in self._resources.gurobi_parameters().items():
+                self._model.setParam(name, value)
         # self._model.Params.LogToConsole = 0
 
-        # (tutor, stream): BINARY
+        # Arrays of the input, compiled when the data is set up
+        self._problem: Optional[ProblemArrays] = None
+
+        # (tutor, stream): BINARY, only for pairs where the tutor is available
         self._allocation_var = {}
 
-        # (tutor, day, week): BINARY
+        # tutor: streams this tutor is available for
+        self._tutor_streams: dict[str, list[str]] = {}
+
+        # stream: tutors available for this stream
+        self._stream_tutors: dict[str, list[str]] = {}
+
+        # (tutor, day, week): BINARY, only if the tutor can work that day
         self._tutor_on_day_var = {}
 
+        # (tutor, day, week): streams the tutor is available for on that day
+        self._tutor_day_streams: dict[tuple[str, int, int], list[str]] = {}
+
         # (stream): BINARY
         self._stream_allocation_var = {}
 
-        self._clashing_session_data = {}
+        # [stream]: maximal groups of streams which all clash with each other
+        self._clashing_streams: list[list[str]] = []
+
+        # Position of every stream when sorted by day, start and end time
+        self._stream_order = np.zeros(0, dtype=int)
+        # tutor: stream: streams the tutor is available for and could work
+        # straight after that stream, by position, only for tutors available
+        # for streams longer than their maximum contiguous hours back to back
+        self._contiguous_successors: dict[int, dict[int, list[int]]] = {}
+        # True for every pair whose tutor is in _contiguous_successors
+        self._contiguous_pairs = np.zeros(0, dtype=bool)
+
+        # Groups of interchangeable tutors and of interchangeable streams
+        self._tutor_groups: list[list[str]] = []
+        self._stream_groups: list[list[str]] = []
 
-        self._days = [
-            IsoDay.MON,
-            IsoDay.TUE,
-            IsoDay.WED,
-            IsoDay.THU,
-            IsoDay.FRI,
-        ]
         self._max_weekly_hours_constraint = {}
         self._results: dict[str, list[str]] = {
             session_stream_id: [] for session_stream_id in self._session_streams
         }
         self._new_threshold = new_threshold
-        self._start_time = time.time()
+        # stream: tutors, previous allocation to start the search from
+        self._initial_allocation: Allocation = initial_allocation or {}
+        # Called with the progress of the solve at most every interval
+        self._progress = progress
+        self._progress_interval = progress_interval
+        # Rules ending the solve before the time limit
+        self._stopping_rules = stopping_rules
+        # Rules that stopped the solve, or the optimisation of a priority
+        self._stopping_reasons: list[dict] = []
+        # Minimise the sum ("sum") or largest ("max") difference between
+        # allocated and mean hours of tutors
+        self._spread_mode = spread_mode
+        # Solver of the model, other backends than Gurobi solve its linear
+        # program, without stopping rules or progress
+        self._backend = backend
+        # (tutor, stream): start value of its allocation variable
+        self._start: Optional[dict[tuple[str, str], int]] = None
+        # Linear program solved by another backend, and the value of every
+        # variable in its solution
+        self._program: Optional[LinearProgram] = None
+        self._solution = None
+        # Records the time taken by every phase of building and solving
+        self._profiler = profiler or Profiler()
+        if self._model is not None:
+            self._profiler.resources(self._model)
 
     def add_tutors(self, *tutors: Staff):
         self._tutors.update((tutor.id, tutor) for tutor in tutors)
@@ -88,41 +245,66 @@ class Solver:
     def add_weeks(self, *weeks: Week):
         self._weeks.update((week.id, week) for week in weeks)
 
+    def _profile_builders(self, *builders, model: bool = True):
+        """
+        Runs every builder as a profiled phase named after it.
+        Args:
+            builders: methods setting up data or part of the model
+            model: count the variables and constraints added by builders
+        """
+        for builder in builders:
+            with self._profiler.phase(
+                builder.__name__.removeprefix("_setup_"),
+                self._model if model else None,
+            ):
+                builder()
+
     def _setup_variables(self):
-        self._setup_allocation_var()
-        self._setup_tutor_on_day_var()
-        self._setup_stream_allocation_var()
-        print("Finish setting up vars after", time.time() - self._start_time)
+        self._profile_builders(
+            self._setup_allocation_var,
+            self._setup_tutor_on_day_var,
+            self._setup_stream_allocation_var,
+        )
 
     def _setup_data(self):
-        self._setup_clashing_session_data()
-        print("Finish setting up data after", time.time() - self._start_time)
+        self._profile_builders(
+            self._setup_problem_data,
+            self._setup_availability_data,
+            self._setup_tutor_day_data,
+            self._setup_clashing_session_data,
+            self._setup_contiguous_data,
+            self._setup_symmetry_data,
+            model=False,
+        )
 
     def _setup_constraints(self):
-        # Variable constraints
-        self._setup_tutor_on_day_var_constraint()
-        self._setup_tutor_on_stream_var_constraint()
-
-        # Logic/Rule constraints
-        self._setup_allocation_collision_constraint()
-        self._setup_number_of_tutors_constraint()
-        self._setup_tutor_availability_constraint()
-        self._setup_seniority_for_session_constraint()
-        self._setup_maximum_weekly_hours_constraint()
+        self._profile_builders(
+            # Variable constraints
+            self._setup_tutor_on_day_var_constraint,
+            self._setup_tutor_on_stream_var_constraint,
+            # Logic/Rule constraints
+            self._setup_allocation_collision_constraint,
+            self._setup_number_of_tutors_constraint,
+            self._setup_seniority_for_session_constraint,
+            self._setup_maximum_weekly_hours_constraint,
+            # Symmetry breaking constraints
+            self._setup_symmetry_breaking_constraint,
+        )
 
     def _setup_allocation_var(self):
+        """Allocation variables only exist for pairs where the tutor is
+        available, which also enforces the availability rule. They follow the
+        order of the pairs of the compiled problem."""
         self._allocation_var = {
             (tutor_id, session_stream_id): self._model.addVar(vtype=GRB.BINARY)
-            for tutor_id in self._tutors
-            for session_stream_id in self._session_streams
+            for tutor_id, session_stream_ids in self._tutor_streams.items()
+            for session_stream_id in session_stream_ids
         }
 
     def _setup_tutor_on_day_var(self):
         self._tutor_on_day_var = {
-            (tutor_id, day_id, week): self._model.addVar(vtype=GRB.BINARY)
-            for tutor_id in self._tutors
-            for day_id in self._days
-            for week in self._weeks
+            key: self._model.addVar(vtype=GRB.BINARY)
+            for key in self._tutor_day_streams
         }
 
     def _setup_stream_allocation_var(self):
@@ -131,84 +313,181 @@ class Solver:
             for stream_id in self._session_streams
         }
 
+    def _setup_problem_data(self):
+        """Compiles the arrays of the input"""
+        self._problem = ProblemArrays.compile(
+            list(self._tutors.values()),
+            list(self._session_streams.values()),
+            list(self._weeks.values()),
+        )
+
+    def _setup_availability_data(self):
+        """Set up the sparse (tutor, stream) index of available pairs"""
+        problem = self._problem
+        self._tutor_streams = {tutor_id: [] for tutor_id in self._tutors}
+        self._stream_tutors = {
+            stream_id: [] for stream_id in self._session_streams
+        }
+        for tutor_index, stream_index in zip(
+            problem.pair_tutor.tolist(), problem.pair_stream.tolist()
+        ):
+            tutor_id = problem.tutor_ids[tutor_index]
+            stream_id = problem.stream_ids[stream_index]
+            self._tutor_streams[tutor_id].append(stream_id)
+            self._stream_tutors[stream_id].append(tutor_id)
+
+    def _setup_tutor_day_data(self):
+        """Set up the streams each tutor is available for on each day and week
+        of the timetable that stream runs"""
+        problem = self._problem
+        tutors, days, weeks, pairs, starts = problem.tutor_days
+        stream_ids = np.array(problem.stream_ids, dtype=object)[
+            problem.pair_stream[pairs]
+        ].tolist()
+        self._tutor_day_streams = {
+            (problem.tutor_ids[tutor], day, problem.week_ids[week]): stream_ids[
+                start:end
+            ]
+            for tutor, day, week, start, end in zip(
+                tutors.tolist(),
+                days.tolist(),
+                weeks.tolist(),
+                starts[:-1].tolist(),
+                starts[1:].tolist(),
+            )
+        }
+
     def _setup_clashing_session_data(self):
-        """Set up session data dictionary, 1 if session runs at a time,
-        0 otherwise"""
-        self._clashing_session_data = {
-            (stream_a_id, stream_b_id): int(
-                stream_a.time.clashes_with(stream_b.time)
-                and len(set(stream_a.weeks) & set(stream_b.weeks)) > 0
-                and stream_a.day == stream_b.day
+        """Set up list of cliques of session streams that run at the same
+        time"""
+        self._clashing_streams = clash_cliques(self._session_streams.values())
+
+    def _setup_contiguous_data(self):
+        """Set up the streams every tutor could work back to back, for the
+        contiguous hours constraint"""
+        problem = self._problem
+        # lexsort sorts by the last key first
+        order = np.lexsort(
+            (problem.stream_end, problem.stream_start, problem.stream_day)
+        )
+        self._stream_order = np.empty(len(order), dtype=int)
+        self._stream_order[order] = np.arange(len(order))
+        successors = contiguous_successors(self._session_streams.values())
+        stream_successors = [
+            [problem.stream_index[next_id] for next_id in successors[stream_id]]
+            for stream_id in problem.stream_ids
+        ]
+        available = np.zeros(
+            (len(problem.tutor_ids), len(problem.stream_ids)), dtype=bool
+        )
+        available[problem.pair_tutor, problem.pair_stream] = True
+        # (tutor, stream): hours of the longest chain the tutor could work
+        # from the stream, successors are later in the order so they're
+        # computed first
+        chain_hours = np.zeros(available.shape)
+        for stream in order[::-1].tolist():
+            next_streams = stream_successors[stream]
+            longest = (
+                chain_hours[:, next_streams].max(axis=1) if next_streams else 0
             )
-            for (stream_a_id, stream_a), (stream_b_id, stream_b) in product(
-                self._session_streams.items(), repeat=2
+            chain_hours[:, stream] = np.where(
+                available[:, stream],
+                problem.stream_duration[stream] + longest,
+                0,
             )
-        }
+        self._contiguous_successors = {}
+        for tutor in np.flatnonzero(
+            (chain_hours > problem.tutor_max_contiguous_hours[:, None]).any(1)
+        ).tolist():
+            self._contiguous_successors[tutor] = {
+                stream: [
+                    next_stream
+                    for next_stream in stream_successors[stream]
+                    if available[tutor, next_stream]
+                ]
+                for stream in np.flatnonzero(available[tutor]).tolist()
+            }
+        self._contiguous_pairs = np.isin(
+            problem.pair_tutor, list(self._contiguous_successors)
+        )
+
+    def _setup_symmetry_data(self):
+        """Set up groups of tutors and streams which can be swapped without
+        changing the feasibility or objectives of an allocation"""
+        self._tutor_groups = equivalent_tutors(self._tutors.values())
+        self._stream_groups = equivalent_streams(self._session_streams.values())
 
     def _setup_tutor_on_day_var_constraint(self):
-        self._model.addConstrs(
-            self._tutor_on_day_var[
-                tutor_id, self._session_streams[stream_id].day, week
-            ]
-            >= self._allocation_var[tutor_id, stream_id]
-            * int(week in self._session_streams[stream_id].weeks)
-            for stream_id in self._session_streams
-            for tutor_id in self._tutors
-            for week in self._weeks
-        )
+        for (
+            tutor_id,
+            day_id,
+            week,
+        ), stream_ids in self._tutor_day_streams.items():
+            for stream_id in stream_ids:
+                self._model.addConstr(
+                    self._tutor_on_day_var[tutor_id, day_id, week]
+                    >= self._allocation_var[tutor_id, stream_id]
+                )
 
     def _setup_tutor_on_stream_var_constraint(self):
         self._model.addConstrs(
-            self._stream_allocation_var[stream_id] >=
-            self._allocation_var[tutor_id, stream_id]
-            for tutor_id in self._tutors
-            for stream_id in self._session_streams
+            self._stream_allocation_var[stream_id]
+            >= self._allocation_var[tutor_id, stream_id]
+            for tutor_id, stream_id in self._allocation_var
         )
 
     def _setup_seniority_for_session_constraint(self):
         """Each session has to have a least 1 senior tutor if possible"""
-        for stream_id, stream in self._session_streams.items():
-            if not stream.is_root:
-                continue
+        problem = self._problem
+        new = problem.tutor_new.astype(int).tolist()
+        for stream in np.flatnonzero(problem.stream_is_root).tolist():
+            stream_id = problem.stream_ids[stream]
+            tutors = [
+                (tutor_id, new[problem.tutor_index[tutor_id]])
+                for tutor_id in self._stream_tutors[stream_id]
+            ]
             self._model.addConstr(
                 quicksum(
-                    self._allocation_var[tutor_id, stream_id]
-                    * (1 - int(tutor.new))
-                    for tutor_id, tutor in self._tutors.items()
+                    self._allocation_var[tutor_id, stream_id] * (1 - tutor_new)
+                    for tutor_id, tutor_new in tutors
                 )
-                * (stream.number_of_tutors - 1)
+                * (int(problem.stream_number_of_tutors[stream]) - 1)
                 >= quicksum(
-                    self._allocation_var[tutor_id, stream_id] * int(tutor.new)
-                    for tutor_id, tutor in self._tutors.items()
+                    self._allocation_var[tutor_id, stream_id] * tutor_new
+                    for tutor_id, tutor_new in tutors
                 )
             )
 
-    def _setup_tutor_availability_constraint(self):
-        """staff can only work when they're available"""
-        for tutor_id, tutor in self._tutors.items():
-            for stream_id, session_stream in self._session_streams.items():
-                self._model.addConstr(
-                    self._allocation_var[tutor_id, stream_id]
-                    <= int(tutor.is_available(session_stream))
-                )
+    def _collision_groups(self):
+        """
+        Yields (tutor, streams) for every clique of clashing streams, restricted
+        to the streams that tutor is available for
+        """
+        # Cliques restricted to a tutor's available streams can coincide
+        added = set()
+        for clique in self._clashing_streams:
+            tutor_streams: dict[str, list[str]] = {}
+            for stream_id in clique:
+                for tutor_id in self._stream_tutors[stream_id]:
+                    tutor_streams.setdefault(tutor_id, []).append(stream_id)
+            for tutor_id, stream_ids in tutor_streams.items():
+                key = (tutor_id, frozenset(stream_ids))
+                if len(stream_ids) < 2 or key in added:
+                    continue
+                added.add(key)
+                yield tutor_id, stream_ids
 
     def _setup_allocation_collision_constraint(self):
         """tutor must work on at most one session per time slot,
         i.e. no collision"""
-        for (stream_a_id, stream_a), (stream_b_id, stream_b) in product(
-            self._session_streams.items(), repeat=2
-        ):
-            if (
-                stream_a == stream_b
-                or self._clashing_session_data[stream_a_id, stream_b_id] == 0
-            ):
-                continue
-            for tutor_id in self._tutors:
-                self._model.addConstr(
-                    self._allocation_var[tutor_id, stream_a_id]
-                    + self._allocation_var[tutor_id, stream_b_id]
-                    <= 1
+        for tutor_id, stream_ids in self._collision_groups():
+            self._model.addConstr(
+                quicksum(
+                    self._allocation_var[tutor_id, stream_id]
+                    for stream_id in stream_ids
                 )
+                <= 1
+            )
 
     def _setup_number_of_tutors_constraint(self):
         """
@@ -219,175 +498,261 @@ class Solver:
             self._model.addConstr(
                 quicksum(
                     self._allocation_var[tutor_id, session_stream_id]
-                    for tutor_id in self._tutors
+                    for tutor_id in self._stream_tutors[session_stream_id]
                 )
                 <= session_stream.number_of_tutors
             )
 
+    def _contiguous_violations(
+        self, tutor: int, streams: list[int]
+    ) -> list[list[int]]:
+        """
+        Finds chains of allocated streams longer than the maximum contiguous
+        hours of the tutor.
+        Args:
+            tutor: position of the tutor to check
+            streams: positions of the streams allocated to the tutor
+        Returns: list of chains of stream positions, each ending at a
+            different stream and as short as possible
+        """
+        max_hours = self._problem.tutor_max_contiguous_hours[tutor]
+        durations = self._problem.stream_duration
+        successors = self._contiguous_successors[tutor]
+        streams = sorted(streams, key=self._stream_order.__getitem__)
+        # stream: hours of the longest chain ending at that stream, and the
+        # stream before it in that chain
+        hours = {stream: durations[stream] for stream in streams}
+        previous: dict[int, Optional[int]] = dict.fromkeys(streams)
+        chains = []
+        for stream in streams:
+            if hours[stream] > max_hours:
+                # Shortest end of the chain that is still too long
+                chain = [stream]
+                chain_hours = durations[stream]
+                while chain_hours <= max_hours:
+                    chain.append(previous[chain[-1]])
+                    chain_hours += durations[chain[-1]]
+                chains.append(chain)
+                # Longer chains through this stream are cut off already
+                continue
+            for next_stream in successors[stream]:
+                next_hours = hours[stream] + durations[next_stream]
+                if next_stream in hours and next_hours > hours[next_stream]:
+                    hours[next_stream] = next_hours
+                    previous[next_stream] = stream
+        return chains
+
     def _setup_contiguous_hours_constraint(
         self, model, allocation_vars, allocation_solution
     ):
         """Staff must not work consecutively longer than their maximum
-        contiguous hours constraint"""
-        for tutor_id, tutor in self._tutors.items():
-            allocated_streams = [
-                stream_id
-                for (tutor_id_, stream_id), value in allocation_solution.items()
-                if tutor_id == tutor_id_ and value > 0.99
-            ]
-            allocated_streams.sort(
-                key=lambda stream_id: (
-                    self._session_streams[stream_id].time.start_time,
-                    self._session_streams[stream_id].time.end_time,
-                )
-            )
-            if len(allocated_streams) == 0:
+        contiguous hours constraint. Returns True if the solution violates
+        the constraint"""
+        problem = self._problem
+        # Allocation variables follow the pairs of the compiled problem
+        values = np.fromiter(
+            allocation_solution.values(), float, len(allocation_solution)
+        )
+        pairs = np.flatnonzero((values > 0.5) & self._contiguous_pairs)
+        # Pairs are sorted by tutor
+        tutor_starts = np.flatnonzero(np.diff(problem.pair_tutor[pairs])) + 1
+        violated = False
+        for tutor_pairs in np.split(pairs, tutor_starts):
+            if not len(tutor_pairs):
                 continue
-            streams_to_check = [(0, allocated_streams[0])]
-            while len(streams_to_check) != 0:
-                first_stream_index, first_stream_id = streams_to_check.pop(0)
-                first_stream = self._session_streams[first_stream_id]
-                current_contiguous_hours = first_stream.time.duration()
-
-                if current_contiguous_hours > tutor.max_contiguous_hours:
-                    model.cbLazy(
-                        allocation_vars[tutor_id, first_stream_id] == 0
+            tutor = int(problem.pair_tutor[tutor_pairs[0]])
+            tutor_id = problem.tutor_ids[tutor]
+            streams = problem.pair_stream[tutor_pairs].tolist()
+            for chain in self._contiguous_violations(tutor, streams):
+                violated = True
+                model.cbLazy(
+                    quicksum(
+                        allocation_vars[tutor_id, problem.stream_ids[stream]]
+                        for stream in chain
                     )
+                    <= len(chain) - 1
+                )
+        return violated
 
-                violation_found = False
-
-                # All ids of currently found contiguous sessions
-                contiguous_ids = [self._session_streams[first_stream_id].id]
-
-                for stream_index, stream_id in enumerate(
-                    allocated_streams[first_stream_index + 1 :],
-                    start=first_stream_index + 1,
-                ):
-
-                    stream = self._session_streams[stream_id]
-                    current_stream = self._session_streams[contiguous_ids[-1]]
-
-                    # Immediately move on if there's a gap
-                    # Not really needed for logic, but for optimisation
-                    if stream.time.start_time > current_stream.time.end_time:
-                        streams_to_check.append((stream_index, stream_id))
-                        break
-
-                    # Found contiguous stream
-                    if (
-                        stream.time.is_contiguous(current_stream.time)
-                        and len(set(stream.weeks) & set(current_stream.weeks))
-                        > 0
-                        and stream.day == current_stream.day
-                    ):
-                        contiguous_ids.append(stream.id)
-                        current_contiguous_hours += stream.time.duration()
-
-                        if (
-                            current_contiguous_hours
-                            > tutor.max_contiguous_hours
-                        ):
-                            violation_found = True
-                            break
-
-                    # stream not contiguous
-                    else:
-                        streams_to_check.append((stream_index, stream_id))
-
-                if violation_found:
-                    model.cbLazy(
-                        quicksum(
-                            allocation_vars[tutor_id, stream_id]
-                            for stream_id in contiguous_ids
-                        )
-                        <= len(contiguous_ids) - 1
+    def _setup_symmetry_breaking_constraint(self):
+        """Interchangeable tutors are ordered by allocated hours, and
+        interchangeable streams by number of allocated tutors, so that
+        swapped copies of an allocation aren't explored again"""
+        if self._tutor_groups:
+            total_hours = self._tutor_total_hours()
+            for group in self._tutor_groups:
+                for tutor_id, next_tutor_id in zip(group, group[1:]):
+                    self._model.addConstr(
+                        total_hours[tutor_id] >= total_hours[next_tutor_id]
+                    )
+        for group in self._stream_groups:
+            for stream_id, next_stream_id in zip(group, group[1:]):
+                self._model.addConstr(
+                    quicksum(
+                        self._allocation_var[tutor_id, stream_id]
+                        for tutor_id in self._stream_tutors[stream_id]
+                    )
+                    >= quicksum(
+                        self._allocation_var[tutor_id, next_stream_id]
+                        for tutor_id in self._stream_tutors[next_stream_id]
                     )
+                )
+
+    def _order_symmetric_start(
+        self, starts: dict[tuple[str, str], int]
+    ) -> dict[tuple[str, str], int]:
+        """Swaps interchangeable streams and tutors of a MIP start so that it
+        satisfies the symmetry breaking constraints"""
+        total_hours = self._problem.stream_total_hours.tolist()
+        for group in self._stream_groups:
+            allocated = {
+                stream_id: [
+                    tutor_id
+                    for tutor_id in self._stream_tutors[stream_id]
+                    if starts[tutor_id, stream_id]
+                ]
+                for stream_id in group
+            }
+            ordered = sorted(allocated.values(), key=len, reverse=True)
+            for stream_id, tutor_ids in zip(group, ordered):
+                for tutor_id in self._stream_tutors[stream_id]:
+                    starts[tutor_id, stream_id] = int(tutor_id in tutor_ids)
+        for group in self._tutor_groups:
+            allocated = {
+                tutor_id: [
+                    stream_id
+                    for stream_id in self._tutor_streams[tutor_id]
+                    if starts[tutor_id, stream_id]
+                ]
+                for tutor_id in group
+            }
+            ordered = sorted(
+                allocated.values(),
+                key=lambda stream_ids: sum(
+                    total_hours[self._problem.stream_index[stream_id]]
+                    for stream_id in stream_ids
+                ),
+                reverse=True,
+            )
+            for tutor_id, stream_ids in zip(group, ordered):
+                for stream_id in self._tutor_streams[tutor_id]:
+                    starts[tutor_id, stream_id] = int(stream_id in stream_ids)
+        return starts
 
     def _setup_maximum_weekly_hours_constraint(self):
         """Staff must not work more than their maximum weekly hours per week"""
-        for tutor_id, tutor in self._tutors.items():
-            for week, streams in self._week_sessions.items():
+        problem = self._problem
+        durations = problem.stream_duration.tolist()
+        for tutor_id, stream_ids in self._tutor_streams.items():
+            week_streams: dict[int, list[str]] = {}
+            for stream_id in stream_ids:
+                stream = problem.stream_index[stream_id]
+                for week in np.flatnonzero(
+                    problem.stream_weeks[stream]
+                ).tolist():
+                    week_streams.setdefault(week, []).append(stream_id)
+            max_weekly_hours = float(
+                problem.tutor_max_weekly_hours[problem.tutor_index[tutor_id]]
+            )
+            for week, week_stream_ids in week_streams.items():
                 self._model.addConstr(
                     quicksum(
-                        self._allocation_var[tutor_id, stream.id]
-                        * stream.time.duration()
-                        for stream in streams
+                        self._allocation_var[tutor_id, stream_id]
+                        * durations[problem.stream_index[stream_id]]
+                        for stream_id in week_stream_ids
                     )
-                    <= tutor.max_weekly_hours
+                    <= max_weekly_hours
                 )
 
     def _setup_allocated_hours_objective(self):
         """Minimises the number of unallocated hours"""
+        problem = self._problem
+        total_hours = problem.stream_total_hours.tolist()
+        number_of_tutors = problem.stream_number_of_tutors.tolist()
         unallocated_hours = quicksum(
-            stream.number_of_tutors * stream.total_hours()
+            number_of_tutors[stream] * total_hours[stream]
             - quicksum(
-                self._allocation_var[tutor_id, stream.id]
-                for tutor_id in self._tutors
+                self._allocation_var[tutor_id, stream_id]
+                for tutor_id in self._stream_tutors[stream_id]
             )
-            * stream.total_hours()
-            for stream in self._session_streams.values()
+            * total_hours[stream]
+            for stream, stream_id in enumerate(problem.stream_ids)
+        )
+        self._model.setObjectiveN(
+            unallocated_hours, 0, priority=self._allocated_hours_priority
         )
-        self._model.setObjectiveN(unallocated_hours, 0, priority=2)
 
-    def _setup_spread_objective(self):
-        """Minimises spread between tutors"""
-        # Total hours for each tutor
-        total_hours = {
+    def _tutor_total_hours(self):
+        """Total allocated hours for each tutor, weighted by seniority"""
+        problem = self._problem
+        total_hours = problem.stream_total_hours.tolist()
+        new = problem.tutor_new.tolist()
+        return {
             tutor_id: quicksum(
                 self._allocation_var[tutor_id, session_stream_id]
-                * session_stream.time.duration()
-                * len(session_stream.weeks)
-                / (self._new_threshold if tutor.new else 1)
+                * total_hours[problem.stream_index[session_stream_id]]
+                / (self._new_threshold if new[tutor] else 1)
                 # account for seniority
-                for session_stream_id, session_stream in self._session_streams.items()
+                for session_stream_id in self._tutor_streams[tutor_id]
             )
-            for tutor_id, tutor in self._tutors.items()
+            for tutor_id, tutor in problem.tutor_index.items()
         }
 
-        # mean of number of allocated hours for every tutor
+    def _mean_hours(self) -> float:
+        """Mean number of hours to allocate to every tutor"""
+        problem = self._problem
         try:
-            mean_hours = sum(
-                session_stream.time.duration()
-                * session_stream.number_of_tutors
-                * len(session_stream.weeks)
-                for session_stream in self._session_streams.values()
+            return float(
+                problem.stream_number_of_tutors @ problem.stream_total_hours
             ) / len(self._tutors)
         except ZeroDivisionError:
             raise RuntimeError("You must provide at least 1 tutor")
 
-        # Difference between allocated hours and mean hours for every tutor
-        differences = {
-            tutor_id: self._model.addVar(lb=-GRB.INFINITY)
-            for tutor_id in self._tutors
-        }
+    def _setup_spread_objective(self):
+        """Minimises spread between tutors"""
+        # Total hours for each tutor
+        total_hours = self._tutor_total_hours()
+        mean_hours = self._mean_hours()
 
-        # Absolute variance between allocated hours and mean hours
-        variance = {tutor_id: self._model.addVar() for tutor_id in self._tutors}
+        if self._spread_mode == "max":
+            # Largest absolute difference between allocated and mean hours
+            max_variance = self._model.addVar()
+            variance = dict.fromkeys(self._tutors, max_variance)
+            spread = max_variance
+        else:
+            # Absolute difference between allocated and mean hours
+            variance = {
+                tutor_id: self._model.addVar() for tutor_id in self._tutors
+            }
+            spread = quicksum(variance.values())
 
-        # Link difference and absolute variances
+        # Variances are minimised, so bounding them from below by the
+        # difference and its negation is exact
         for tutor_id in self._tutors:
             self._model.addConstr(
-                total_hours[tutor_id] - differences[tutor_id] == mean_hours
+                variance[tutor_id] >= total_hours[tutor_id] - mean_hours
             )
             self._model.addConstr(
-                variance[tutor_id] == abs_(differences[tutor_id])
+                variance[tutor_id] >= mean_hours - total_hours[tutor_id]
             )
 
         # Minimize absolute variances between tutors
-        spread = quicksum(variance[tutor_id] for tutor_id in self._tutors)
         self._model.setObjectiveN(spread, 2, priority=1)
 
     def _setup_preference_hour_objective(self):
         """Tutors should work more in their preferred session type"""
         # TODO: Maybe maximise number of hours that is preferred
+        problem = self._problem
+        total_hours = problem.stream_total_hours[problem.pair_stream].tolist()
+        prefers_other_type = problem.pair_prefers_other_type().tolist()
+        # Allocation variables follow the pairs of the compiled problem
         self._model.setObjectiveN(
             quicksum(
-                self._allocation_var[tutor_id, session_stream_id]
-                * session_stream.total_hours()
-                * int(session_stream.type != tutor.type_preference)
-                for session_stream_id, session_stream in self._session_streams.items()
-                for tutor_id, tutor in self._tutors.items()
-                if tutor.type_preference is not None
+                allocation_var * total_hours[pair]
+                for pair, allocation_var in enumerate(
+                    self._allocation_var.values()
+                )
+                if prefers_other_type[pair]
             ),
             1,
             priority=1,
@@ -396,12 +761,7 @@ class Solver:
     def _setup_workday_objective(self):
         """Minimises number of days everyone has to go to work"""
         self._model.setObjectiveN(
-            quicksum(
-                self._tutor_on_day_var[tutor_id, day_id, week]
-                for tutor_id in self._tutors
-                for day_id in self._days
-                for week in self._weeks
-            ),
+            quicksum(self._tutor_on_day_var.values()),
             3,
             priority=0,
         )
@@ -422,41 +782,473 @@ class Solver:
         We want to minimize the variance, so people will have maximum spread.
         Weights for new staff will be accounted here.
         """
-        # dict containing total number of allocated hours of every tutor
-        self._model.ModelSense = GRB.MINIMIZE
         # TODO: For now unallocated sessions goes before unallocated hours,
         #  in the future maybe give this choice to the user
-        self._setup_unallocated_sessions_objective()
-        self._setup_allocated_hours_objective()
-        self._setup_spread_objective()
-        self._setup_preference_hour_objective()
-        self._setup_workday_objective()
+        self._profile_builders(
+            self._setup_unallocated_sessions_objective,
+            self._setup_allocated_hours_objective,
+            self._setup_spread_objective,
+            self._setup_preference_hour_objective,
+            self._setup_workday_objective,
+        )
 
-    def solve(self, output_log_file=""):
+    def build_model(self):
+        """Sets up all data, variables, objectives and constraints"""
         self._setup_data()
         self._setup_variables()
         self._setup_objective()
         self._setup_constraints()
-        # self._model.Params.LogFile = output_log_file
-        self._model.optimize(
-            lazy_constraints(
-                self._allocation_var, self._setup_contiguous_hours_constraint
+        if self._model is not None:
+            self._model.update()
+
+    def _setup_initial_allocation(self):
+        """
+        Uses the initial allocation as MIP start. Allocations that are no
+        longer feasible, e.g. because availabilities or streams changed, are
+        left out, and Gurobi completes the rest of the start.
+        """
+        if not self._initial_allocation:
+            return
+        problem = self._problem
+        # tutor: streams allocated to the tutor, by position
+        allocated_streams: dict[int, list[int]] = {}
+        weekly_hours = np.zeros((len(problem.tutor_ids), len(problem.week_ids)))
+        starts = dict.fromkeys(self._allocation_var, 0)
+        for stream_id, tutor_ids in self._initial_allocation.items():
+            stream = problem.stream_index.get(stream_id)
+            if stream is None:
+                continue
+            weeks = problem.stream_weeks[stream]
+            duration = problem.stream_duration[stream]
+            number_of_tutors = int(problem.stream_number_of_tutors[stream])
+            candidates = []
+            for tutor_id in dict.fromkeys(tutor_ids):
+                if (tutor_id, stream_id) not in self._allocation_var:
+                    continue
+                tutor = problem.tutor_index[tutor_id]
+                allocated = allocated_streams.get(tutor, [])
+                if any(
+                    problem.streams_clash(stream, other) for other in allocated
+                ):
+                    continue
+                if (
+                    weekly_hours[tutor, weeks] + duration
+                    > problem.tutor_max_weekly_hours[tutor]
+                ).any():
+                    continue
+                # Starts rejected by the lazy constraint would be discarded
+                if tutor in self._contiguous_successors and (
+                    self._contiguous_violations(tutor, allocated + [stream])
+                ):
+                    continue
+                candidates.append(tutor)
+            candidates = candidates[:number_of_tutors]
+            if problem.stream_is_root[stream]:
+                # Drop new tutors until there are enough senior tutors
+                new_tutors = [
+                    tutor for tutor in candidates if problem.tutor_new[tutor]
+                ]
+                while new_tutors and (len(candidates) - len(new_tutors)) * (
+                    number_of_tutors - 1
+                ) < len(new_tutors):
+                    candidates.remove(new_tutors.pop())
+            for tutor in candidates:
+                allocated_streams.setdefault(tutor, []).append(stream)
+                weekly_hours[tutor, weeks] += duration
+                starts[problem.tutor_ids[tutor], stream_id] = 1
+        self._start = self._order_symmetric_start(starts)
+        if self._model is not None:
+            self._model.setAttr(
+                "Start",
+                list(self._allocation_var.values()),
+                list(self._start.values()),
             )
+
+    def _progress_reporter(self) -> Optional[ProgressReporter]:
+        if self._progress is None:
+            return None
+        # Objectives with the same priority are optimised together
+        return ProgressReporter(
+            self._progress,
+            self._session_streams,
+            interval=self._progress_interval,
+            objectives=len(set(self.objective_priorities())),
+        )
+
+    def _stopping_policy(self) -> Optional[StoppingPolicy]:
+        if self._stopping_rules is None:
+            return None
+        stopping = StoppingPolicy(
+            self._stopping_rules, self._allocated_hours_priority
         )
-        if self._model.Status not in (GRB.OPTIMAL, GRB.TIME_LIMIT):
-            return self._model.Status
+        stopping.apply(self._model)
+        return stopping
+
+    def solve(self, output_log_file=""):
+        if self._backend != "gurobi":
+            return self._solve_with_backend()
+        self.build_model()
+        with self._profiler.phase("initial_allocation"):
+            self._setup_initial_allocation()
+        stopping = self._stopping_policy()
+        # self._model.Params.LogFile = output_log_file
+        with self._profiler.phase("optimize"):
+            self._model.optimize(
+                lazy_constraints(
+                    self._allocation_var,
+                    self._setup_contiguous_hours_constraint,
+                    progress=self._progress_reporter(),
+                    stopping=stopping,
+                    profiler=self._profiler,
+                )
+            )
+        self._profiler.solved(self._model)
+        if stopping is not None:
+            self._stopping_reasons.extend(stopping.fired)
+        if self._model.Status == GRB.TIME_LIMIT:
+            self._stopping_reasons.append({"rule": "timeout"})
+        status = self._model.Status
+        # Solves ended by a stopping rule keep their best solution, passes
+        # stopped at their objective target make the solve suboptimal
+        if (
+            status == GRB.INTERRUPTED
+            and stopping is not None
+            and stopping.terminated
+        ) or status in (GRB.USER_OBJ_LIMIT, GRB.SUBOPTIMAL):
+            status = GRB.OPTIMAL
+        if status not in (GRB.OPTIMAL, GRB.TIME_LIMIT):
+            return status
+        # The time limit may pass before any solution is found
+        if self._model.SolCount == 0:
+            return status
         self._populate_allocation()
         return GRB.OPTIMAL
 
-    def _populate_allocation(self):
-        for tutor_id in self._tutors:
-            for session_stream_id in self._session_streams:
-                if self._allocation_var[tutor_id, session_stream_id].x > 0.99:
-                    print(
-                        f"Tutor {self._tutors[tutor_id]} works on "
-                        f"{self._session_streams[session_stream_id]}"
+    def _setup_contiguous_hours_rows(self, program: LinearProgram):
+        """Adds the contiguous hours constraint of every chain of streams a
+        tutor is available for, as other backends have no lazy constraints"""
+        # Allocation variables are the first columns of the program
+        pair_columns = {
+            pair: column for column, pair in enumerate(self._allocation_var)
+        }
+        rows, columns, row_ub = [], [], []
+        # Tutors available for the same streams share their chains
+        chains: dict[tuple, list[list[list[str]]]] = {}
+        for tutor_id, tutor in self._tutors.items():
+            stream_ids = self._tutor_streams[tutor_id]
+            key = (tuple(stream_ids), tutor.max_contiguous_hours)
+            if key not in chains:
+                chains[key] = contiguous_chains(
+                    (
+                        self._session_streams[stream_id]
+                        for stream_id in stream_ids
+                    ),
+                    tutor.max_contiguous_hours,
+                )
+            for chain in chains[key]:
+                for link in chain:
+                    for stream_id in link:
+                        rows.append(len(row_ub))
+                        columns.append(pair_columns[tutor_id, stream_id])
+                row_ub.append(len(chain) - 1)
+        program.add_rows(
+            sp.csr_matrix(
+                (np.ones(len(rows)), (rows, columns)),
+                shape=(len(row_ub), program.matrix.shape[1]),
+            ),
+            np.full(len(row_ub), -np.inf),
+            np.array(row_ub, dtype=float),
+        )
+
+    def _linear_program(self) -> LinearProgram:
+        """Returns the linear program of the built model"""
+        return from_gurobi(self._model)
+
+    def _solve_with_backend(self) -> int:
+        """Builds the linear program of the model, then solves its
+        objectives one priority at a time with another backend"""
+        self.build_model()
+        with self._profiler.phase("initial_allocation"):
+            self._setup_initial_allocation()
+        with self._profiler.phase("extract_model"):
+            self._program = self._linear_program()
+            self._setup_contiguous_hours_rows(self._program)
+        with self._profiler.phase("optimize"):
+            status, self._solution = solve_lexicographic(
+                self._program, self._backend, self._timeout, self._threads
+            )
+        if status == GRB.TIME_LIMIT:
+            self._stopping_reasons.append({"rule": "timeout"})
+        if self._solution is None:
+            return status
+        # Allocation variables are the first columns of the program
+        for column, (tutor_id, session_stream_id) in enumerate(
+            self._allocation_var
+        ):
+            if self._solution[column] > 0.99:
+                self._results[session_stream_id].append(tutor_id)
+        return GRB.OPTIMAL
+
+    def objective_values(self) -> list[float]:
+        """Returns the value of every objective in the solution, by
+        objective index"""
+        if self._solution is not None:
+            return [
+                objective.value(self._solution)
+                for objective in self._program.objectives
+            ]
+        values = []
+        for objective in range(self._model.NumObj):
+            self._model.setParam("ObjNumber", objective)
+            values.append(self._model.ObjNVal)
+        return values
+
+    def objective_priorities(self) -> list[int]:
+        """Returns the priority of every objective, by objective index"""
+        if self._model is None:
+            return [
+                objective.priority for objective in self._program.objectives
+            ]
+        priorities = []
+        for objective in range(self._model.NumObj):
+            self._model.setParam("ObjNumber", objective)
+            priorities.append(self._model.ObjNPriority)
+        return priorities
+
+    def model_size(self) -> dict:
+        """Returns the number of variables, binary variables, constraints and
+        general constraints of the built model"""
+        if self._model is None:
+            program = self._program
+            return {
+                "vars": program.matrix.shape[1],
+                "bin_vars": int(
+                    (
+                        program.integer & (program.lb == 0) & (program.ub == 1)
+                    ).sum()
+                ),
+                "constrs": program.matrix.shape[0],
+                "gen_constrs": 0,
+            }
+        return {
+            "vars": self._model.NumVars,
+            "bin_vars": self._model.NumBinVars,
+            "constrs": self._model.NumConstrs,
+            "gen_constrs": self._model.NumGenConstrs,
+        }
+
+    def get_profile(self) -> dict:
+        """Returns the time taken by every phase of the solve, and solve
+        statistics, as described by Profiler"""
+        return self._profiler.to_dict()
+
+    def get_stopping_reasons(self) -> list[dict]:
+        """Returns the rules that stopped the solve, or the optimisation of an
+        objective priority, in the order they fired"""
+        return self._stopping_reasons
+
+    def components(self) -> list[tuple[list[str], list[str]]]:
+        """
+        Finds the connected components of the graph linking every tutor to
+        the session streams they are available for. Constraints only link
+        streams through a tutor available for them, so components share no
+        constraints. Every objective but spread is a sum over components,
+        spread is measured from the mean hours of all tutors, which differs
+        from the mean of a component.
+        Returns: list of (tutor ids, session stream ids) of every component
+            with at least one tutor and one session stream
+        """
+        tutor_ids = list(self._tutors)
+        stream_ids = list(self._session_streams)
+        if not tutor_ids or not stream_ids:
+            return []
+        available = sp.csr_matrix(
+            availability_matrix(
+                list(self._tutors.values()),
+                list(self._session_streams.values()),
+            )
+        )
+        _, labels = connected_components(
+            sp.bmat([[None, available], [available.T, None]]), directed=False
+        )
+        components: dict[int, tuple[list[str], list[str]]] = {}
+        for tutor_id, label in zip(tutor_ids, labels[: len(tutor_ids)]):
+            components.setdefault(label, ([], []))[0].append(tutor_id)
+        for stream_id, label in zip(stream_ids, labels[len(tutor_ids) :]):
+            components.setdefault(label, ([], []))[1].append(stream_id)
+        return [
+            (tutor_ids, stream_ids)
+            for tutor_ids, stream_ids in components.values()
+            if tutor_ids and stream_ids
+        ]
+
+    def _required_hours(self, stream_ids) -> float:
+        """Hours of the streams times their number of tutors, as counted by
+        the unallocated hours objective"""
+        return sum(
+            self._session_streams[stream_id].number_of_tutors
+            * self._session_streams[stream_id].total_hours()
+            for stream_id in stream_ids
+        )
+
+    def _component_stopping_rules(
+        self, components: list[tuple[list[str], list[str]]]
+    ) -> list[Optional[StoppingRules]]:
+        """
+        Splits the unallocated hours target of the stopping rules between
+        components by their share of the hours to allocate, so that the solve
+        stops at the target of the whole input. Streams of no component have
+        no available tutor and are unallocated in any solution, so their hours
+        use up the target first. Gaps are relative, so components which all
+        reach the gap of a priority reach it together.
+        Args:
+            components: (tutor ids, session stream ids) of every component
+        Returns: stopping rules of every component
+        """
+        rules = self._stopping_rules
+        if rules is None or rules.unallocated_hours is None:
+            return [rules] * len(components)
+        hours = [
+            self._required_hours(stream_ids) for _, stream_ids in components
+        ]
+        target = rules.unallocated_hours - (
+            self._required_hours(self._session_streams) - sum(hours)
+        )
+        return [
+            dataclasses.replace(
+                rules,
+                unallocated_hours=max(
+                    0.0, target * component_hours / max(sum(hours), 1e-10)
+                ),
+            )
+            for component_hours in hours
+        ]
+
+    def solve_decomposed(
+        self,
+        processes: Optional[int] = None,
+        min_pairs: int = DECOMPOSITION_MIN_PAIRS,
+    ) -> int:
+        """
+        Solves every connected component as its own model, in parallel
+        processes. The spread objective of every component aims for the mean
+        hours of its own tutors. Components share the timeout of the solve,
+        those which can't start before it passes are left unallocated.
+        The unallocated hours target of the stopping rules is split between
+        components, but the largest difference to the mean hours of the max
+        spread mode can't be, so that mode solves a single model.
+        Inputs with fewer than min_pairs available pairs of a tutor and a
+        stream are solved as one model in this process.
+        Args:
+            processes: maximum number of components solved at once, defaults
+                to the number of threads, or the number of cores
+            min_pairs: smallest number of available pairs of an input solved
+                by component
+        Returns: GRB.OPTIMAL if every component was solved, otherwise the
+            status of a component that wasn't
+        """
+        processes = processes or self._threads or os.cpu_count() or 1
+        if processes <= 1 or self._spread_mode == "max":
+            return self.solve()
+        pairs = availability_matrix(
+            list(self._tutors.values()), list(self._session_streams.values())
+        ).sum()
+        if pairs < min_pairs:
+            return self.solve()
+        components = self.components()
+        if len(components) <= 1:
+            return self.solve()
+
+        processes = min(processes, len(components))
+        kwargs = {
+            "new_threshold": self._new_threshold,
+            "initial_allocation": self._initial_allocation,
+            "spread_mode": self._spread_mode,
+            "backend": self._backend,
+            "threads": max(1, (self._threads or processes) // processes),
+            "resources": self._resources.split(processes),
+        }
+        # Components waiting for a process only get the time left, so that
+        # the whole solve ends by the timeout
+        deadline = time.monotonic() + self._timeout
+        # Largest components are popped first, so that small ones fill the
+        # gaps
+        queued = sorted(
+            zip(components, self._component_stopping_rules(components)),
+            key=lambda component: len(component[0][0]) * len(component[0][1]),
+        )
+        progress = None
+        if self._progress is not None:
+            progress = ProgressReporter(
+                self._progress,
+                self._session_streams,
+                interval=self._progress_interval,
+                components=len(components),
+            )
+            progress.report()
+        results = []
+        # Components left unallocated as the timeout passed before they
+        # started
+        skipped = 0
+        # Gurobi environments can't be shared with forked processes
+        with ProcessPoolExecutor(
+            processes, mp_context=mp.get_context("spawn")
+        ) as executor:
+            running = set()
+            while queued or running:
+                while queued and len(running) < processes:
+                    (tutor_ids, stream_ids), stopping_rules = queued.pop()
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        skipped += 1
+                        continue
+                    running.add(
+                        executor.submit(
+                            _solve_component,
+                            type(self),
+                            [self._tutors[tutor_id] for tutor_id in tutor_ids],
+                            [
+                                self._session_streams[stream_id]
+                                for stream_id in stream_ids
+                            ],
+                            list(self._weeks.values()),
+                            dict(
+                                kwargs,
+                                timeout=timeout,
+                                stopping_rules=stopping_rules,
+                            ),
+                        )
                     )
-                    self._results[session_stream_id].append(tutor_id)
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    (
+                        status,
+                        allocation,
+                        stopping_reasons,
+                        profile,
+                    ) = future.result()
+                    results.append((status, allocation))
+                    self._stopping_reasons.extend(stopping_reasons)
+                    self._profiler.add_component(profile)
+                    if progress is not None and status == GRB.OPTIMAL:
+                        progress.component_solved(allocation)
+        if skipped:
+            self._stopping_reasons.append(
+                {"rule": "timeout", "components_skipped": skipped}
+            )
+        for status, allocation in results:
+            if status != GRB.OPTIMAL:
+                return status
+            self._results.update(allocation)
+        return GRB.OPTIMAL
+
+    def _populate_allocation(self):
+        for (
+            tutor_id,
+            session_stream_id,
+        ), allocation_var in self._allocation_var.items():
+            if allocation_var.x > 0.99:
+                self._results[session_stream_id].append(tutor_id)
 
     def get_results(self):
         return self._results
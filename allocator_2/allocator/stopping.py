@@ -0,0 +1,130 @@
+import time
+from typing import Optional
+
+from gurobipy.gurobipy import GRB, Model
+
+from .schema import StoppingRules
+
+# Gap at which Gurobi considers an optimisation pass solved by default
+_OPTIMAL_GAP = 1e-4
+
+
+class StoppingPolicy:
+    """
+    Applies stopping rules to a multi-objective model, and records which rules
+    stopped the solve. The gap and unallocated hours targets end the
+    optimisation pass of their objective priority through the parameters of
+    that pass, so lower priorities are still optimised afterwards. The
+    no improvement time ends the whole solve from the callback, like the time
+    limit does.
+    """
+
+    def __init__(self, rules: StoppingRules, unallocated_hours_priority: int):
+        """
+        Args:
+            rules: stopping rules to apply
+            unallocated_hours_priority: priority of the objective minimising
+                unallocated hours, which must be the only objective with that
+                priority
+        """
+        self._rules = rules
+        self._unallocated_hours_priority = unallocated_hours_priority
+        # Priority of every optimisation pass, highest first
+        self._priorities: list[int] = []
+        self._pass = 0
+        self._incumbent: Optional[float] = None
+        self._bound: Optional[float] = None
+        self._last_improvement = time.time()
+        # Rules that stopped the solve, or the optimisation of a priority
+        self.fired: list[dict] = []
+        # True if the solve was ended by a rule rather than interrupted
+        self.terminated = False
+
+    def apply(self, model: Model):
+        """Sets the gap and objective targets of every optimisation pass"""
+        priorities = set()
+        for objective in range(model.NumObj):
+            model.setParam("ObjNumber", objective)
+            priorities.add(model.ObjNPriority)
+        self._priorities = sorted(priorities, reverse=True)
+        for index, priority in enumerate(self._priorities):
+            env = model.getMultiobjEnv(index)
+            gap = self._rules.mip_gap.get(priority)
+            if gap is not None:
+                env.setParam("MIPGap", gap)
+            if (
+                priority == self._unallocated_hours_priority
+                and self._rules.unallocated_hours is not None
+            ):
+                env.setParam("BestObjStop", self._rules.unallocated_hours)
+
+    def objectives_solved(self, objectives_solved: int):
+        """Records the rule that ended the last optimisation pass, if any,
+        and starts the next pass"""
+        if objectives_solved <= self._pass:
+            return
+        self._record_pass_rule()
+        self._pass = objectives_solved
+        self._incumbent = None
+        self._bound = None
+        self._last_improvement = time.time()
+
+    def solution(self, objective: float, bound: float):
+        """Updates the incumbent with a new solution"""
+        if self._incumbent is None or objective < self._incumbent:
+            self._incumbent = objective
+            self._last_improvement = time.time()
+        self._bound = bound
+
+    def mip(self, model: Model, incumbent: float, bound: float):
+        """Updates the incumbent and bound, and ends the solve if the
+        incumbent hasn't improved for long enough"""
+        if abs(incumbent) < GRB.INFINITY:
+            self.solution(incumbent, bound)
+        window = self._rules.no_improvement_time
+        if (
+            window is not None
+            and self._incumbent is not None
+            and not self.terminated
+            and time.time() - self._last_improvement >= window
+        ):
+            self.fired.append(
+                {
+                    "rule": "no_improvement_time",
+                    "priority": self._priority(),
+                    "gap": self._gap(),
+                }
+            )
+            self.terminated = True
+            model.terminate()
+
+    def _priority(self) -> Optional[int]:
+        if self._pass < len(self._priorities):
+            return self._priorities[self._pass]
+        return None
+
+    def _gap(self) -> Optional[float]:
+        if self._incumbent is None or self._bound is None:
+            return None
+        return abs(self._bound - self._incumbent) / max(
+            abs(self._incumbent), 1e-10
+        )
+
+    def _record_pass_rule(self):
+        gap = self._gap()
+        # Passes solved to optimality weren't stopped by a rule
+        if gap is None or gap <= _OPTIMAL_GAP:
+            return
+        priority = self._priority()
+        if (
+            priority == self._unallocated_hours_priority
+            and self._rules.unallocated_hours is not None
+            and self._incumbent <= self._rules.unallocated_hours
+        ):
+            self.fired.append(
+                {"rule": "unallocated_hours", "priority": priority, "gap": gap}
+            )
+        elif gap <= self._rules.mip_gap.get(priority, _OPTIMAL_GAP):
+            self.fired.append(
+                {"rule": "mip_gap", "priority": priority, "gap": gap}
+            )
@@ -0,0 +1,66 @@
+from typing import Hashable, Iterable
+
+from .schema import SessionStream, Staff
+
+
+def _groups(keys: Iterable[tuple[str, Hashable]]) -> list[list[str]]:
+    groups: dict[Hashable, list[str]] = {}
+    for id_, key in keys:
+        groups.setdefault(key, []).append(id_)
+    return [group for group in groups.values() if len(group) > 1]
+
+
+def equivalent_tutors(staff: Iterable[Staff]) -> list[list[str]]:
+    """
+    Groups tutors that can be swapped in any allocation without changing its
+    feasibility or objective values.
+    Args:
+        staff: tutors to group
+    Returns: list of groups of at least 2 tutor ids, in input order
+    """
+    return _groups(
+        (
+            tutor.id,
+            (
+                tutor.new,
+                tutor.type_preference,
+                tutor.max_contiguous_hours,
+                tutor.max_weekly_hours,
+                tuple(
+                    (day, tuple(starts), tuple(ends))
+                    for day, (starts, ends) in sorted(
+                        tutor._available_times.items()
+                    )
+                    if starts
+                ),
+            ),
+        )
+        for tutor in staff
+    )
+
+
+def equivalent_streams(
+    session_streams: Iterable[SessionStream],
+) -> list[list[str]]:
+    """
+    Groups session streams whose allocated tutors can be swapped in any
+    allocation without changing its feasibility or objective values.
+    Args:
+        session_streams: session streams to group
+    Returns: list of groups of at least 2 session stream ids, in input order
+    """
+    return _groups(
+        (
+            stream.id,
+            (
+                stream.type,
+                stream.day,
+                stream.time.start_time,
+                stream.time.end_time,
+                stream.number_of_tutors,
+                stream.is_root,
+                tuple(sorted(stream.weeks)),
+            ),
+        )
+        for stream in session_streams
+    )
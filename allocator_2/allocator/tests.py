@@ -1,3 +1,1418 @@
-from django.test import TestCase
+import copy
+import dataclasses
+import importlib.util
+import itertools
+import json
+import os
+import pickle
+import random
+import subprocess
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from unittest import mock, skipUnless
+from urllib.parse import urlencode
 
-# Create your tests here.
+import psutil
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from gurobipy.gurobipy import GRB
+from scipy.optimize import OptimizeResult
+
+from .allocation import RUNNING_STATE, Allocator
+from .backends import from_gurobi
+from .cache import cache_result, get_cached_result, input_hash
+from .constants import (
+    KILLED_TITLE,
+    REQUESTED_MESSAGE,
+    REQUESTED_TITLE,
+    TIMEOUT_MESSAGE,
+)
+from .decoding import InputError, decode_input_data, decode_request
+from .generator import generate_payload
+from .heuristic import GreedyAllocator
+from .intervals import clash_cliques, streams_clash
+from .long_poll import state_version
+from .matrix_solver import MatrixSolver
+from .models import AllocationBatch, AllocationState, CachedResult
+from .problem import NO_PREFERENCE, ProblemArrays
+from .progress import ProgressReporter
+from .resources import JobResources, job_resources
+from .schema import (
+    InputData,
+    SessionStream,
+    Staff,
+    StoppingRules,
+    Timeslot,
+    availability_matrix,
+)
+from .views import _decode_batch
+from .solver import Solver, lazy_constraints
+from .symmetry import equivalent_streams, equivalent_tutors
+from .type_hints import AllocationStatus, IsoDay
+from .utils import terminate_process_tree
+from .worker import _queued_jobs, claim_next_job, release_jobs, run_job
+
+
+def _input_data(seed: int) -> InputData:
+    """Small random timetable, solvable with a size-limited license"""
+    rng = random.Random(seed)
+    weeks = [{"id": week, "name": str(week)} for week in range(1, 4)]
+    session_streams = []
+    for i in range(8):
+        start = rng.choice([8, 9, 10, 11, 12, 13, 14])
+        session_streams.append(
+            {
+                "id": f"stream-{i}",
+                "name": f"P{i:02}",
+                "type": rng.choice(["Practical", "Tutorial"]),
+                "day": rng.randint(1, 3),
+                "number_of_tutors": rng.randint(1, 2),
+                "location": "Room",
+                "is_root": rng.random() < 0.8,
+                "time": [start, start + rng.choice([1, 2, 3])],
+                "weeks": sorted(rng.sample(range(1, 4), rng.randint(1, 3))),
+            }
+        )
+    staff = []
+    for i in range(4):
+        availabilities = {}
+        for day in range(1, 4):
+            if rng.random() < 0.8:
+                start = rng.choice([8, 9, 10])
+                availabilities[day] = [
+                    [start, start + rng.randint(3, 6)],
+                    [start + 6, 18],
+                ]
+        staff.append(
+            {
+                "id": f"tutor-{i}",
+                "name": f"Tutor {i}",
+                "new": rng.random() < 0.3,
+                "availabilities": availabilities,
+                "type_preference": rng.choice([None, "Practical", "Tutorial"]),
+                "max_contiguous_hours": rng.choice([2, 3, 24]),
+                "max_weekly_hours": rng.choice([4, 6, 100]),
+            }
+        )
+    return InputData(
+        timetable_id="00000000-0000-0000-0000-000000000000",
+        weeks=weeks,
+        session_streams=session_streams,
+        staff=staff,
+    )
+
+
+def _stream(stream_id: str, day: int, start: float, end: float, **kwargs):
+    """JSON of a session stream running in week 1, unless weeks are given"""
+    return {
+        "id": stream_id,
+        "name": stream_id,
+        "type": "Practical",
+        "day": day,
+        "number_of_tutors": 1,
+        "location": "Room",
+        "is_root": False,
+        "time": [start, end],
+        "weeks": [1],
+        **kwargs,
+    }
+
+
+def _tutor(tutor_id: str, availabilities: dict, **kwargs) -> dict:
+    """JSON of a senior tutor"""
+    return {
+        "id": tutor_id,
+        "name": tutor_id,
+        "new": False,
+        "availabilities": availabilities,
+        **kwargs,
+    }
+
+
+def _timetable(session_streams: list[dict], staff: list[dict]) -> InputData:
+    return InputData(
+        timetable_id="00000000-0000-0000-0000-000000000000",
+        weeks=[{"id": week, "name": str(week)} for week in range(1, 4)],
+        session_streams=session_streams,
+        staff=staff,
+    )
+
+
+class MatrixSolverTest(SimpleTestCase):
+    def _solvers(self, seed):
+        data = _input_data(seed)
+        solvers = []
+        for solver_class in (Solver, MatrixSolver):
+            solver = solver_class(
+                data.staff, data.session_streams, data.weeks, timeout=60
+            )
+            solver._model.setParam("OutputFlag", 0)
+            solvers.append(solver)
+        return solvers
+
+    def test_equivalent_model_size(self):
+        for seed in range(5):
+            solver, matrix_solver = self._solvers(seed)
+            solver.build_model()
+            matrix_solver.build_model()
+            for attribute in (
+                "NumVars",
+                "NumBinVars",
+                "NumConstrs",
+                "NumNZs",
+                "NumObj",
+            ):
+                self.assertEqual(
+                    solver._model.getAttr(attribute),
+                    matrix_solver._model.getAttr(attribute),
+                    f"{attribute} differs for seed {seed}",
+                )
+
+    @staticmethod
+    def _objective_values(model):
+        """Objective values summed per priority, as objectives sharing a
+        priority can trade off against each other"""
+        values = {}
+        for objective in range(model.NumObj):
+            model.setParam("ObjNumber", objective)
+            values[model.ObjNPriority] = (
+                values.get(model.ObjNPriority, 0) + model.ObjNVal
+            )
+        return values
+
+    def test_equivalent_objectives(self):
+        for seed in range(5):
+            solver, matrix_solver = self._solvers(seed)
+            solver.solve()
+            matrix_solver.solve()
+            values = self._objective_values(solver._model)
+            matrix_values = self._objective_values(matrix_solver._model)
+            self.assertEqual(values.keys(), matrix_values.keys())
+            for priority, value in values.items():
+                self.assertAlmostEqual(
+                    value,
+                    matrix_values[priority],
+                    msg=f"Priority {priority} differs for seed {seed}",
+                )
+
+    def test_equivalent_program(self):
+        """The linear program built for other backends is the one extracted
+        from the Gurobi model"""
+        for seed in range(5):
+            data = _input_data(seed)
+            solver, program_solver = (
+                MatrixSolver(
+                    data.staff,
+                    data.session_streams,
+                    data.weeks,
+                    timeout=60,
+                    backend=backend,
+                )
+                for backend in ("gurobi", "highs")
+            )
+            solver.build_model()
+            program_solver.build_model()
+            self.assertIsNone(program_solver._model)
+            program = from_gurobi(solver._model)
+            built = program_solver._linear_program()
+            self.assertEqual(program.matrix.shape, built.matrix.shape)
+            self.assertEqual((program.matrix != built.matrix).nnz, 0)
+            for attribute in ("row_lb", "row_ub", "lb", "ub", "integer"):
+                self.assertTrue(
+                    (
+                        getattr(program, attribute) == getattr(built, attribute)
+                    ).all(),
+                    f"{attribute} differs for seed {seed}",
+                )
+            self.assertEqual(len(program.objectives), len(built.objectives))
+            for objective, built_objective in zip(
+                program.objectives, built.objectives
+            ):
+                self.assertEqual(objective.priority, built_objective.priority)
+                self.assertTrue(
+                    (
+                        objective.coefficients == built_objective.coefficients
+                    ).all()
+                )
+                self.assertAlmostEqual(
+                    objective.constant, built_objective.constant
+                )
+
+
+class BackendTest(SimpleTestCase):
+    @staticmethod
+    def _priority_values(data, backend):
+        """Objective values of a MatrixSolver solve, summed per priority"""
+        solver = MatrixSolver(
+            data.staff,
+            data.session_streams,
+            data.weeks,
+            timeout=60,
+            backend=backend,
+        )
+        if solver._model is not None:
+            solver._model.setParam("OutputFlag", 0)
+        solver.solve()
+        values = {}
+        for priority, value in zip(
+            solver.objective_priorities(), solver.objective_values()
+        ):
+            values[priority] = values.get(priority, 0) + value
+        return values
+
+    def _assert_equivalent_objectives(self, backend):
+        for seed in range(5):
+            data = _input_data(seed)
+            values = self._priority_values(data, "gurobi")
+            backend_values = self._priority_values(data, backend)
+            self.assertEqual(values.keys(), backend_values.keys())
+            for priority, value in values.items():
+                self.assertAlmostEqual(
+                    value,
+                    backend_values[priority],
+                    places=4,
+                    msg=f"Priority {priority} differs for seed {seed}",
+                )
+
+    def test_highs_objectives(self):
+        self._assert_equivalent_objectives("highs")
+
+    @skipUnless(importlib.util.find_spec("ortools"), "requires ortools")
+    def test_cpsat_objectives(self):
+        self._assert_equivalent_objectives("cpsat")
+
+    def test_without_gurobi_model(self):
+        """Other backends build and solve the model without Gurobi"""
+        data = _input_data(0)
+        with mock.patch(
+            "allocator.solver.Model", side_effect=AssertionError("Model built")
+        ):
+            solver = MatrixSolver(
+                data.staff,
+                data.session_streams,
+                data.weeks,
+                timeout=60,
+                backend="highs",
+            )
+            self.assertEqual(solver.solve(), GRB.OPTIMAL)
+        self.assertTrue(any(solver.get_results().values()))
+
+    def test_time_limit_without_solution(self):
+        """A time limit passing before any solution is found isn't reported
+        as a generated allocation"""
+        data = _input_data(0)
+        solver = MatrixSolver(
+            data.staff,
+            data.session_streams,
+            data.weeks,
+            timeout=60,
+            backend="highs",
+        )
+        with mock.patch(
+            "scipy.optimize.milp",
+            return_value=OptimizeResult(status=1, x=None),
+        ):
+            self.assertEqual(solver.solve(), GRB.TIME_LIMIT)
+        self.assertFalse(any(solver.get_results().values()))
+        with mock.patch(
+            "allocator.allocation.MatrixSolver.solve_decomposed",
+            return_value=GRB.TIME_LIMIT,
+        ):
+            output = Allocator(data).run_allocation()
+        self.assertEqual(output.type, AllocationStatus.ERROR)
+        self.assertEqual(output.message, TIMEOUT_MESSAGE)
+
+
+class LazyConstraintsTest(SimpleTestCase):
+    def test_incumbent_after_solution(self):
+        """Incumbents of a pass are only reported once a solution of that
+        pass was accepted"""
+        reports = []
+        progress = ProgressReporter(reports.append, ["stream"], interval=0)
+        callback = lazy_constraints(
+            {("tutor", "stream"): None},
+            lambda model, vars_dict, solution: False,
+            progress=progress,
+        )
+        values = {
+            GRB.Callback.MULTIOBJ_OBJCNT: 0,
+            GRB.Callback.MIP_OBJBST: 400000019,
+            GRB.Callback.MIP_OBJBND: 5,
+            GRB.Callback.MIPSOL_OBJ: 10,
+            GRB.Callback.MIPSOL_OBJBND: 5,
+        }
+        model = mock.Mock(cbGet=values.get, cbGetSolution=lambda variables: [1])
+        for objective_count in (0, 1):
+            values[GRB.Callback.MULTIOBJ_OBJCNT] = objective_count
+            callback(model, GRB.Callback.MULTIOBJ)
+            callback(model, GRB.Callback.MIP)
+            self.assertIsNone(reports[-1]["incumbent"])
+            self.assertEqual(reports[-1]["bound"], 5)
+            callback(model, GRB.Callback.MIPSOL)
+            values[GRB.Callback.MIP_OBJBST] = 10
+            callback(model, GRB.Callback.MIP)
+            self.assertEqual(reports[-1]["incumbent"], 10)
+            values[GRB.Callback.MIP_OBJBST] = 400000019
+
+
+class GreedyAllocatorTest(SimpleTestCase):
+    def test_draft_is_feasible(self):
+        """Fixing the model to the draft allocation leaves it feasible"""
+        for seed in range(5):
+            data = _input_data(seed)
+            draft = GreedyAllocator(
+                data.staff, data.session_streams, data.weeks
+            ).run()
+            solver = Solver(
+                data.staff, data.session_streams, data.weeks, timeout=60
+            )
+            solver._model.setParam("OutputFlag", 0)
+            solver.build_model()
+            for (tutor_id, stream_id), var in solver._allocation_var.items():
+                var.LB = var.UB = int(tutor_id in draft[stream_id])
+            solver._model.optimize(
+                lazy_constraints(
+                    solver._allocation_var,
+                    solver._setup_contiguous_hours_constraint,
+                )
+            )
+            self.assertEqual(
+                solver._model.Status, GRB.OPTIMAL, f"Seed {seed} infeasible"
+            )
+
+    def test_long_contiguous_chain(self):
+        """Streams reached through many chains are only extended once"""
+        # Two parallel streams in each of 40 back to back quarter hours
+        streams = [
+            _stream(f"{slot}-{i}", 1, 8 + slot / 4, 8.25 + slot / 4)
+            for slot in range(40)
+            for i in range(2)
+        ]
+        data = _timetable(
+            streams + [_stream("last", 1, 18, 19)],
+            [_tutor("t", {1: [[8, 19]]})],
+        )
+        allocator = GreedyAllocator(
+            data.staff, data.session_streams, data.weeks
+        )
+        for stream in streams:
+            allocator._add("t", stream["id"])
+        last = data.session_streams[-1]
+        self.assertEqual(allocator._contiguous_hours("t", last), 11)
+
+    def test_draft_of_exact_solve(self):
+        """The draft an exact solve starts from balances hours like the
+        solver, and leaves most of the timeout to the solver"""
+        data = dataclasses.replace(
+            _input_data(0), new_threshold=0.5, timeout=10
+        )
+        with mock.patch(
+            "allocator.allocation.GreedyAllocator", wraps=GreedyAllocator
+        ) as greedy, mock.patch(
+            "allocator.allocation.MatrixSolver", wraps=MatrixSolver
+        ) as solver:
+            Allocator(data).run_allocation()
+        self.assertEqual(greedy.call_args.kwargs["new_threshold"], 0.5)
+        self.assertAlmostEqual(greedy.call_args.kwargs["time_limit"], 0.1)
+        self.assertEqual(solver.call_args.kwargs["new_threshold"], 0.5)
+
+
+class ClashCliquesTest(SimpleTestCase):
+    @staticmethod
+    def _random_streams(rng: random.Random) -> list[SessionStream]:
+        streams = []
+        for i in range(rng.randint(2, 25)):
+            start = rng.randrange(16, 36) / 2
+            streams.append(
+                SessionStream(
+                    id=f"stream-{i}",
+                    name=f"P{i:02}",
+                    type="Practical",
+                    day=rng.randint(1, 2),
+                    number_of_tutors=1,
+                    location="Room",
+                    is_root=False,
+                    # Zero length streams clash with streams running then
+                    time=Timeslot(start, start + rng.choice([0, 0.5, 1, 2])),
+                    weeks=rng.sample(range(1, 5), rng.randint(1, 3)),
+                )
+            )
+        return streams
+
+    def test_cover_clashing_pairs(self):
+        """At most one stream of every clique allows the same sets of streams
+        as at most one stream of every clashing pair"""
+        for seed in range(50):
+            streams = self._random_streams(random.Random(seed))
+            cliques = clash_cliques(streams)
+            by_id = {stream.id: stream for stream in streams}
+            covered = set()
+            for clique in cliques:
+                self.assertGreaterEqual(len(clique), 2)
+                for i, stream_id in enumerate(clique):
+                    for other_id in clique[i + 1 :]:
+                        self.assertTrue(
+                            streams_clash(by_id[stream_id], by_id[other_id]),
+                            f"{stream_id} and {other_id} don't clash for "
+                            f"seed {seed}",
+                        )
+                        covered.add(frozenset((stream_id, other_id)))
+            clashing = {
+                frozenset((stream.id, other.id))
+                for i, stream in enumerate(streams)
+                for other in streams[i + 1 :]
+                if streams_clash(stream, other)
+            }
+            self.assertEqual(covered, clashing, f"Seed {seed}")
+            # Cliques contained in others would only add redundant rows
+            for clique in cliques:
+                self.assertFalse(
+                    any(set(clique) < set(other) for other in cliques),
+                    f"{clique} isn't maximal for seed {seed}",
+                )
+
+
+class SymmetryTest(SimpleTestCase):
+    def test_equivalent_tutors(self):
+        """Tutors with the same constraints are grouped, whatever their names
+        and however their availabilities are split"""
+        staff = _timetable(
+            [],
+            [
+                _tutor("tutor-0", {1: [[9, 14]]}),
+                _tutor("tutor-1", {1: [[9, 14]]}, type_preference="Practical"),
+                _tutor("tutor-2", {1: [[9, 12], [12, 14]]}),
+                _tutor("tutor-3", {1: [[9, 14]]}, max_weekly_hours=6),
+                _tutor("tutor-4", {1: [[9, 14]], 2: []}),
+                _tutor("tutor-5", {1: [[9, 13]]}),
+                _tutor("tutor-6", {1: [[9, 14]]}, new=True),
+            ],
+        ).staff
+        self.assertEqual(
+            equivalent_tutors(staff), [["tutor-0", "tutor-2", "tutor-4"]]
+        )
+
+    def test_equivalent_streams(self):
+        session_streams = _timetable(
+            [
+                _stream("stream-0", 1, 9, 11, weeks=[1, 2]),
+                _stream("stream-1", 1, 9, 11, weeks=[2, 1], location="Lab"),
+                _stream("stream-2", 1, 9, 11, weeks=[1]),
+                _stream("stream-3", 1, 9, 11, weeks=[1, 2], is_root=True),
+                _stream("stream-4", 1, 9, 11, weeks=[1, 2], type="Tutorial"),
+                _stream("stream-5", 1, 9, 11, weeks=[1, 2], number_of_tutors=2),
+                _stream("stream-6", 2, 9, 11, weeks=[1, 2]),
+                _stream("stream-7", 1, 10, 11, weeks=[1, 2]),
+            ],
+            [],
+        ).session_streams
+        self.assertEqual(
+            equivalent_streams(session_streams), [["stream-0", "stream-1"]]
+        )
+
+    @staticmethod
+    def _duplicated_input_data(seed: int) -> InputData:
+        """Random timetable with a copy of its first tutor and stream"""
+        data = _input_data(seed)
+        data.staff.append(dataclasses.replace(data.staff[0], id="tutor-copy"))
+        stream = copy.copy(data.session_streams[0])
+        stream.id = "stream-copy"
+        data.session_streams.append(stream)
+        return data
+
+    @staticmethod
+    def _priority_values(data: InputData) -> dict[int, float]:
+        solver = MatrixSolver(
+            data.staff, data.session_streams, data.weeks, timeout=60
+        )
+        solver._model.setParam("OutputFlag", 0)
+        assert solver.solve() == GRB.OPTIMAL
+        return MatrixSolverTest._objective_values(solver._model)
+
+    def test_same_objectives(self):
+        """Ordering interchangeable tutors and streams only removes swapped
+        copies of allocations, so the optimal objectives don't change"""
+        for seed in range(5):
+            data = self._duplicated_input_data(seed)
+            self.assertIn(
+                ["tutor-0", "tutor-copy"], equivalent_tutors(data.staff)
+            )
+            self.assertIn(
+                ["stream-0", "stream-copy"],
+                equivalent_streams(data.session_streams),
+            )
+            values = self._priority_values(data)
+            with mock.patch(
+                "allocator.solver.equivalent_tutors", return_value=[]
+            ), mock.patch(
+                "allocator.solver.equivalent_streams", return_value=[]
+            ):
+                unordered_values = self._priority_values(data)
+            self.assertEqual(values.keys(), unordered_values.keys())
+            for priority, value in values.items():
+                self.assertAlmostEqual(
+                    value,
+                    unordered_values[priority],
+                    msg=f"Priority {priority} differs for seed {seed}",
+                )
+
+
+class WarmStartTest(SimpleTestCase):
+    # Tutor t can work at most 2 of the 3 back to back streams a, b and c
+    data = _timetable(
+        [
+            _stream("a", 1, 9, 10),
+            _stream("b", 1, 10, 11),
+            _stream("c", 1, 11, 12),
+            _stream("d", 1, 13, 14),
+        ],
+        [
+            _tutor("t", {1: [[8, 18]]}, max_contiguous_hours=2),
+            _tutor("u", {1: [[13, 14]]}),
+        ],
+    )
+
+    def _first_solution(self, initial_allocation) -> tuple[dict, bool]:
+        """Returns the first solution found from the initial allocation, and
+        if the contiguous hours constraint rejected it"""
+        solver = MatrixSolver(
+            self.data.staff,
+            self.data.session_streams,
+            self.data.weeks,
+            timeout=60,
+            initial_allocation=initial_allocation,
+        )
+        solver._model.setParam("OutputFlag", 0)
+        solver.build_model()
+        solver._setup_initial_allocation()
+        solutions = []
+
+        def contiguous_hours(model, allocation_vars, solution):
+            rejected = solver._setup_contiguous_hours_constraint(
+                model, allocation_vars, solution
+            )
+            solutions.append(
+                (
+                    {key for key, value in solution.items() if value > 0.5},
+                    rejected,
+                )
+            )
+            return rejected
+
+        solver._model.optimize(
+            lazy_constraints(solver._allocation_var, contiguous_hours)
+        )
+        return solutions[0]
+
+    def test_feasible_start(self):
+        """A feasible previous allocation is the first incumbent"""
+        self.assertEqual(
+            self._first_solution({"a": ["t"], "b": ["t"], "d": ["u"]}),
+            ({("t", "a"), ("t", "b"), ("u", "d")}, False),
+        )
+
+    def test_contiguous_hours_start(self):
+        """Previous allocations over the contiguous hours of a tutor are
+        trimmed instead of the whole start being rejected"""
+        self.assertEqual(
+            self._first_solution(
+                {"a": ["t"], "b": ["t"], "c": ["t"], "d": ["t"]}
+            ),
+            ({("t", "a"), ("t", "b"), ("t", "d")}, False),
+        )
+
+
+class ContiguousHoursTest(SimpleTestCase):
+    # b and c run in different weeks, so the chain through c is longer than
+    # the maximum contiguous hours but the one through b isn't
+    data = _timetable(
+        [
+            _stream("a", 1, 9, 10, weeks=[1, 2]),
+            _stream("b", 1, 10, 11, weeks=[1]),
+            _stream("c", 1, 10, 11, weeks=[2]),
+            _stream("d", 1, 11, 13, weeks=[2]),
+        ],
+        [_tutor("t", {1: [[8, 18]]}, max_contiguous_hours=3)],
+    )
+
+    def _solver(self) -> MatrixSolver:
+        solver = MatrixSolver(
+            self.data.staff,
+            self.data.session_streams,
+            self.data.weeks,
+            timeout=60,
+        )
+        solver._model.setParam("OutputFlag", 0)
+        return solver
+
+    @staticmethod
+    def _violations(solver: MatrixSolver, stream_ids: list[str]):
+        """Chains of stream ids over the maximum contiguous hours of the
+        tutor t"""
+        problem = solver._problem
+        return [
+            [problem.stream_ids[stream] for stream in chain]
+            for chain in solver._contiguous_violations(
+                problem.tutor_index["t"],
+                [problem.stream_index[stream_id] for stream_id in stream_ids],
+            )
+        ]
+
+    def test_branching_chain(self):
+        """Chains are found through every stream following a stream, not
+        only the first one"""
+        solver = self._solver()
+        solver.build_model()
+        self.assertEqual(
+            self._violations(solver, ["a", "b", "c", "d"]), [["d", "c", "a"]]
+        )
+        self.assertEqual(self._violations(solver, ["a", "b", "d"]), [])
+
+    def test_shortest_chain(self):
+        """Only the shortest end of a chain over the limit is cut off"""
+        data = _timetable(
+            [_stream(str(hour), 1, hour, hour + 1) for hour in range(9, 13)],
+            [_tutor("t", {1: [[8, 18]]}, max_contiguous_hours=2)],
+        )
+        solver = MatrixSolver(
+            data.staff, data.session_streams, data.weeks, timeout=60
+        )
+        solver.build_model()
+        self.assertEqual(
+            self._violations(solver, ["12", "9", "10", "11"]),
+            [["11", "10", "9"]],
+        )
+
+    def test_solution_within_limit(self):
+        solver = self._solver()
+        self.assertEqual(solver.solve(), GRB.OPTIMAL)
+        stream_ids = [
+            stream_id
+            for stream_id, tutor_ids in solver.get_results().items()
+            if tutor_ids
+        ]
+        self.assertEqual(self._violations(solver, stream_ids), [])
+        # Only one of the 1 hour streams a and c is left unallocated
+        self.assertEqual(
+            sum(
+                solver._problem.stream_duration[
+                    solver._problem.stream_index[stream_id]
+                ]
+                for stream_id in stream_ids
+            ),
+            4,
+        )
+
+
+class DecompositionTest(SimpleTestCase):
+    @staticmethod
+    def _solver(**kwargs) -> MatrixSolver:
+        """Solver of 4 components, with a stream and a tutor on every day, and
+        a stream no tutor is available for. Streams run for as many hours as
+        their day number."""
+        data = _timetable(
+            [_stream(f"stream-{day}", day, 9, 9 + day) for day in range(1, 6)],
+            [_tutor(f"tutor-{day}", {day: [[8, 18]]}) for day in range(1, 5)],
+        )
+        return MatrixSolver(
+            data.staff, data.session_streams, data.weeks, **kwargs
+        )
+
+    @staticmethod
+    def _solve_components(solver: MatrixSolver, times=None) -> dict:
+        """
+        Solves components in threads instead of processes, allocating their
+        tutor to their stream.
+        Args:
+            solver: solver of the components
+            times: values of time.monotonic in the solver
+        Returns: stream id: arguments of the solver of every component
+        """
+        component_kwargs = {}
+
+        def solve_component(solver_class, tutors, streams, weeks, kwargs):
+            component_kwargs[streams[0].id] = kwargs
+            return GRB.OPTIMAL, {streams[0].id: [tutors[0].id]}, [], {}
+
+        with mock.patch(
+            "allocator.solver.ProcessPoolExecutor",
+            lambda processes, mp_context: ThreadPoolExecutor(processes),
+        ), mock.patch(
+            "allocator.solver._solve_component", solve_component
+        ), mock.patch(
+            "allocator.solver.time",
+            **{"monotonic.side_effect": times or itertools.repeat(0)},
+        ):
+            status = solver.solve_decomposed(processes=2, min_pairs=0)
+        assert status == GRB.OPTIMAL
+        return component_kwargs
+
+    def test_shared_timeout(self):
+        """Components waiting for a process only get the time left, and
+        aren't solved once the timeout passed"""
+        solver = self._solver(timeout=10)
+        self.assertEqual(len(solver.components()), 4)
+        # Start of the solve, then the start of every component
+        component_kwargs = self._solve_components(solver, [0, 0, 4, 7, 12])
+        # Largest components start first
+        self.assertEqual(
+            [kwargs["timeout"] for kwargs in component_kwargs.values()],
+            [10, 6, 3],
+        )
+        self.assertIn(
+            {"rule": "timeout", "components_skipped": 1},
+            solver.get_stopping_reasons(),
+        )
+        self.assertEqual(solver.get_results()["stream-1"], [])
+
+    def test_split_unallocated_hours(self):
+        """Components stop once their share of the unallocated hours left
+        after the stream without tutors is reached"""
+        solver = self._solver(
+            stopping_rules=StoppingRules(mip_gap={2: 0.1}, unallocated_hours=15)
+        )
+        component_kwargs = self._solve_components(solver)
+        for day in range(1, 5):
+            rules = component_kwargs[f"stream-{day}"]["stopping_rules"]
+            # 5 unallocated hours of stream-5, then 1 hour out of the 10 of
+            # the components for every hour of the component
+            self.assertAlmostEqual(rules.unallocated_hours, day)
+            self.assertEqual(rules.mip_gap, {2: 0.1})
+
+    def test_small_input_not_decomposed(self):
+        """Inputs too small to gain from solving components in processes are
+        solved as one model"""
+        solver = self._solver()
+        with mock.patch.object(
+            solver, "solve", return_value=GRB.OPTIMAL
+        ) as solve, mock.patch("allocator.solver.ProcessPoolExecutor") as pool:
+            self.assertEqual(
+                solver.solve_decomposed(processes=2, min_pairs=5), GRB.OPTIMAL
+            )
+        solve.assert_called_once_with()
+        pool.assert_not_called()
+
+    def test_max_spread_not_decomposed(self):
+        """The largest difference to the mean hours is taken over every tutor,
+        so it isn't split between components"""
+        solver = self._solver(spread_mode="max")
+        with mock.patch.object(
+            solver, "solve", return_value=GRB.OPTIMAL
+        ) as solve:
+            self.assertEqual(solver.solve_decomposed(processes=2), GRB.OPTIMAL)
+        solve.assert_called_once_with()
+
+
+class GeneratorTest(SimpleTestCase):
+    def test_seeded(self):
+        payload = generate_payload(0, tutors=20, streams=50)
+        self.assertEqual(payload, generate_payload(0, tutors=20, streams=50))
+        self.assertNotEqual(payload, generate_payload(1, tutors=20, streams=50))
+        data = InputData(**payload)
+        self.assertEqual(len(data.staff), 20)
+        self.assertEqual(len(data.session_streams), 50)
+        self.assertEqual(len(data.weeks), 13)
+
+    def test_dummy_staff(self):
+        """Dummy tutors are available every weekday"""
+        tutor = Staff.create_dummy(0)
+        weekdays = [IsoDay.MON, IsoDay.TUE, IsoDay.WED, IsoDay.THU, IsoDay.FRI]
+        self.assertEqual(sorted(tutor.availabilities), weekdays)
+        for day in weekdays:
+            self.assertTrue(
+                tutor.is_available(
+                    SessionStream(
+                        id="stream",
+                        name="P01",
+                        type="Practical",
+                        day=day,
+                        number_of_tutors=1,
+                        location="Room",
+                        is_root=True,
+                        time=Timeslot(9, 10),
+                    )
+                ),
+                f"Not available on {day.name}",
+            )
+
+
+class ProblemArraysTest(SimpleTestCase):
+    def test_compiled_attributes(self):
+        data = InputData(**generate_payload(0, tutors=20, streams=50))
+        problem = ProblemArrays.from_input(data)
+        for index, stream in enumerate(data.session_streams):
+            self.assertEqual(problem.stream_ids[index], stream.id)
+            self.assertEqual(problem.stream_day[index], stream.day)
+            self.assertEqual(
+                problem.stream_start[index], stream.time.start_time.value * 60
+            )
+            self.assertEqual(
+                problem.stream_total_hours[index], stream.total_hours()
+            )
+            self.assertEqual(
+                problem.session_types[problem.stream_type[index]], stream.type
+            )
+            self.assertEqual(
+                [
+                    problem.week_ids[week]
+                    for week in problem.stream_weeks[index].nonzero()[0]
+                ],
+                stream.weeks,
+            )
+        for index, tutor in enumerate(data.staff):
+            self.assertEqual(problem.tutor_new[index], tutor.new)
+            if tutor.type_preference is None:
+                self.assertEqual(problem.tutor_preference[index], NO_PREFERENCE)
+            else:
+                self.assertEqual(
+                    problem.session_types[problem.tutor_preference[index]],
+                    tutor.type_preference,
+                )
+        self.assertEqual(
+            list(zip(problem.pair_tutor, problem.pair_stream)),
+            list(
+                zip(
+                    *availability_matrix(
+                        data.staff, data.session_streams
+                    ).nonzero()
+                )
+            ),
+        )
+        with self.assertRaises(ValueError):
+            problem.stream_day[0] = 0
+
+    def test_streams_clash(self):
+        data = InputData(**generate_payload(0, tutors=5, streams=40))
+        problem = ProblemArrays.from_input(data)
+        for stream, other in itertools.product(
+            range(len(data.session_streams)), repeat=2
+        ):
+            self.assertEqual(
+                problem.streams_clash(stream, other),
+                streams_clash(
+                    data.session_streams[stream], data.session_streams[other]
+                ),
+            )
+
+    def test_pickle(self):
+        """Solvers of components are sent the input in other processes"""
+        data = InputData(**generate_payload(0, tutors=5, streams=10))
+        for instance in (
+            data.weeks[0],
+            data.session_streams[0].time,
+            data.session_streams[0],
+            ProblemArrays.from_input(data),
+        ):
+            self.assertEqual(
+                repr(pickle.loads(pickle.dumps(instance))), repr(instance)
+            )
+
+
+class DecodingTest(SimpleTestCase):
+    def test_same_input_data(self):
+        # Session types of generated payloads are enums, parsed as strings
+        payload = json.loads(
+            json.dumps(generate_payload(0, tutors=20, streams=50, timeout=5))
+        )
+        payload["stopping_rules"] = {"mip_gap": {"2": 0.1}}
+        request_data, data = decode_request(json.dumps({"data": payload}))
+        self.assertEqual(request_data["data"], payload)
+        self.assertEqual(data, InputData(**copy.deepcopy(payload)))
+
+    def test_invalid_values(self):
+        payload = json.loads(
+            json.dumps(generate_payload(0, tutors=2, streams=2))
+        )
+        for change, path in (
+            (lambda data: data.pop("staff"), "data: missing staff"),
+            (
+                lambda data: data["session_streams"][1].update(extra=1),
+                "data.session_streams[1]: unknown extra",
+            ),
+            (
+                lambda data: data["session_streams"][0].update(time=[10, 9]),
+                "data.session_streams[0].time: ends before it starts",
+            ),
+            (
+                lambda data: data["session_streams"][0].update(is_root=1),
+                "data.session_streams[0].is_root: expected boolean",
+            ),
+            (
+                lambda data: data["staff"][1].update(
+                    availabilities={"8": [[9, 10]]}
+                ),
+                "data.staff[1].availabilities: expected ISO day",
+            ),
+            (
+                lambda data: data["staff"][0].update(max_weekly_hours="10"),
+                "data.staff[0].max_weekly_hours: expected number",
+            ),
+            (lambda data: data.update(mode="fast"), "data.mode: expected"),
+        ):
+            data = copy.deepcopy(payload)
+            change(data)
+            with self.assertRaisesMessage(InputError, path):
+                decode_input_data(data)
+        with self.assertRaisesMessage(InputError, "Invalid JSON"):
+            decode_request(b'{"data": NaN}')
+        for priority in ("1", 1.5, True, 2 ** 31):
+            with self.assertRaisesMessage(
+                InputError, "request.priority: expected integer"
+            ):
+                decode_request(
+                    json.dumps({"data": payload, "priority": priority})
+                )
+
+
+class BatchDecodingTest(SimpleTestCase):
+    def test_shared_input_data(self):
+        payload = json.loads(
+            json.dumps(generate_payload(0, tutors=5, streams=10))
+        )
+        other = dict(payload, timetable_id="other")
+        requests = _decode_batch(
+            json.dumps({"requests": [{"data": payload}, {"data": other}]})
+        )
+        (_, data, data_hash), (_, other_data, other_hash) = requests
+        self.assertEqual(data_hash, other_hash)
+        self.assertEqual(other_data.timetable_id, "other")
+        # Duplicates share the schema objects of the first request
+        self.assertIs(other_data.session_streams[0], data.session_streams[0])
+        with self.assertRaisesMessage(
+            InputError, "requests[1].data.timetable_id"
+        ):
+            _decode_batch(
+                json.dumps({"requests": [{"data": payload}, {"data": payload}]})
+            )
+        with self.assertRaisesMessage(
+            InputError, "requests[1].priority: expected integer"
+        ):
+            _decode_batch(
+                json.dumps(
+                    {
+                        "requests": [
+                            {"data": payload},
+                            {"data": other, "priority": None},
+                        ]
+                    }
+                )
+            )
+
+
+@override_settings(ALLOCATOR_WORKER_POOL=True)
+class RequestAllocationTest(TestCase):
+    def _request(self, payload: dict, **request):
+        return self.client.post(
+            "/allocator/request-allocation/",
+            json.dumps({"data": payload, **request}),
+            content_type="application/json",
+        )
+
+    def test_priority(self):
+        payload = json.loads(
+            json.dumps(generate_payload(0, tutors=2, streams=2))
+        )
+        timetable_id = payload["timetable_id"]
+        self.assertEqual(self._request(payload, priority=5).status_code, 200)
+        state = AllocationState.objects.get(timetable_id=timetable_id)
+        self.assertEqual(state.priority, 5)
+        # Requests with new input data replace the queued allocation
+        payload["timeout"] = 10
+        self.assertEqual(self._request(payload, priority=7).status_code, 200)
+        state.refresh_from_db()
+        self.assertEqual(state.priority, 7)
+        response = self._request(payload, priority="high")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("request.priority", response.json()["message"])
+
+
+class CheckAllocationTest(TestCase):
+    timetable_id = "00000000-0000-0000-0000-000000000000"
+
+    def setUp(self):
+        self.state = AllocationState.objects.create(
+            timetable_id=self.timetable_id,
+            data_hash=b"hash",
+            request_time=timezone.now(),
+            timeout=60,
+            type=AllocationStatus.GENERATED,
+            result={"stream": ["tutor"]},
+        )
+
+    def test_invalid_id(self):
+        for path in (
+            "/allocator/check-allocation/timetable",
+            "/allocator/async/check-allocation/timetable?wait=1",
+            "/allocator/check-batch-allocation/batch",
+        ):
+            response = self.client.get(path)
+            self.assertEqual(response.status_code, 400, path)
+            self.assertEqual(response.json()["type"], AllocationStatus.ERROR)
+
+    async def test_long_poll_timeout(self):
+        """Long polls return the same version once they waited for the
+        version to change for wait seconds"""
+        path = f"/allocator/async/check-allocation/{self.timetable_id}"
+        version = (await self.async_client.get(path)).json()["version"]
+        self.assertIsNotNone(version)
+        start = time.monotonic()
+        with override_settings(ALLOCATOR_LONG_POLL_INTERVAL=0.05):
+            response = await self.async_client.get(
+                f"{path}?{urlencode({'wait': 0.2, 'since': version})}"
+            )
+        self.assertGreaterEqual(time.monotonic() - start, 0.2)
+        self.assertEqual(response.status_code, 200)
+        status = response.json()
+        self.assertEqual(status["version"], version)
+        self.assertEqual(status["result"], {"stream": ["tutor"]})
+
+
+class CheckBatchAllocationTest(TestCase):
+    # Process ids of running allocations
+    running_pids = {101, 102}
+
+    def _state(self, pid, **fields) -> AllocationState:
+        """Saves an allocation requested a minute ago by the allocation
+        process pid, None if it's queued"""
+        return AllocationState.objects.create(
+            timetable_id=uuid.uuid4(),
+            data_hash=b"hash",
+            request_time=timezone.now() - timedelta(minutes=1),
+            timeout=600,
+            pid=pid,
+            **{
+                "type": AllocationStatus.REQUESTED,
+                "title": REQUESTED_TITLE,
+                "message": REQUESTED_MESSAGE,
+                **fields,
+            },
+        )
+
+    def _check(self, path: str) -> dict:
+        with mock.patch(
+            "allocator.views.psutil.pid_exists",
+            lambda pid: pid in self.running_pids,
+        ):
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_queued(self):
+        """Queued allocations are reported as queued and left unchanged"""
+        state = self._state(None)
+        with self.assertNumQueries(1):
+            status = self._check(
+                f"/allocator/check-allocation/{state.timetable_id}"
+            )
+        self.assertEqual(status["type"], AllocationStatus.QUEUED)
+        self.assertEqual(status["version"], state_version(state.updated_at))
+        state.refresh_from_db()
+        self.assertEqual(state.type, AllocationStatus.REQUESTED)
+
+    def test_bulk_changes(self):
+        """Allocations of a batch changing state are saved with a query for
+        every state they change to"""
+        states = {
+            "queued": self._state(None),
+            "started": self._state(101),
+            "running": self._state(102, **RUNNING_STATE, progress={"gap": 0.1}),
+            "killed": self._state(103, progress={"gap": 0.1}),
+            "killed_running": self._state(104, **RUNNING_STATE),
+            "generated": self._state(
+                None, type=AllocationStatus.GENERATED, result={}
+            ),
+        }
+        batch = AllocationBatch.objects.create()
+        batch.allocations.add(*states.values())
+        # Allocations, then the started and the killed allocations
+        with self.assertNumQueries(3):
+            response = self._check(
+                f"/allocator/check-batch-allocation/{batch.id}"
+            )
+        self.assertEqual(
+            {
+                name: response["allocations"][str(state.timetable_id)]["type"]
+                for name, state in states.items()
+            },
+            {
+                "queued": AllocationStatus.QUEUED,
+                "started": AllocationStatus.NOT_READY,
+                "running": AllocationStatus.NOT_READY,
+                "killed": AllocationStatus.ERROR,
+                "killed_running": AllocationStatus.ERROR,
+                "generated": AllocationStatus.GENERATED,
+            },
+        )
+        self.assertEqual(
+            response["counts"],
+            {
+                AllocationStatus.QUEUED: 1,
+                AllocationStatus.NOT_READY: 2,
+                AllocationStatus.ERROR: 2,
+                AllocationStatus.GENERATED: 1,
+            },
+        )
+        saved = {
+            name: AllocationState.objects.get(pk=state.pk)
+            for name, state in states.items()
+        }
+        self.assertEqual(saved["queued"].type, AllocationStatus.REQUESTED)
+        self.assertEqual(saved["started"].type, AllocationStatus.NOT_READY)
+        self.assertEqual(saved["killed"].title, KILLED_TITLE)
+        self.assertIsNone(saved["killed"].progress)
+        self.assertEqual(saved["killed_running"].title, KILLED_TITLE)
+        # Versions of changed allocations are returned
+        for name in ("started", "killed"):
+            self.assertEqual(
+                response["allocations"][str(saved[name].timetable_id)][
+                    "version"
+                ],
+                state_version(saved[name].updated_at),
+            )
+
+
+def _reversed_keys(value):
+    """Reverses the order of the members of every object in parsed JSON"""
+    if type(value) is dict:
+        return {
+            key: _reversed_keys(member)
+            for key, member in reversed(list(value.items()))
+        }
+    if type(value) is list:
+        return [_reversed_keys(item) for item in value]
+    return value
+
+
+class ResultCacheTest(TestCase):
+    payload = json.loads(json.dumps(generate_payload(0, tutors=5, streams=10)))
+
+    def setUp(self):
+        # Every use of the cache is a minute after the previous one
+        start = timezone.now()
+        minutes = itertools.count()
+        patcher = mock.patch(
+            "allocator.cache.timezone.now",
+            lambda: start + timedelta(minutes=next(minutes)),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def _cache(data_hash: bytes, result: dict, stopped_by=None):
+        cache_result(
+            data_hash,
+            {
+                "type": AllocationStatus.GENERATED,
+                "result": result,
+                "runtime": 1,
+                "stopped_by": stopped_by or [],
+            },
+        )
+
+    def test_canonical_input(self):
+        """Input data of another timetable with members in another order
+        uses the cached result"""
+        self._cache(input_hash(self.payload), {"stream-0": ["tutor-0"]})
+        other = dict(
+            _reversed_keys(self.payload),
+            timetable_id="11111111-1111-1111-1111-111111111111",
+        )
+        self.assertNotEqual(json.dumps(other), json.dumps(self.payload))
+        cached_result = get_cached_result(input_hash(other))
+        self.assertIsNotNone(cached_result)
+        self.assertEqual(cached_result.result, {"stream-0": ["tutor-0"]})
+
+    def test_changed_input(self):
+        self._cache(input_hash(self.payload), {"stream-0": ["tutor-0"]})
+        changed = copy.deepcopy(self.payload)
+        changed["session_streams"][0]["number_of_tutors"] += 1
+        self.assertIsNone(get_cached_result(input_hash(changed)))
+
+    def test_stopped_allocation(self):
+        """Allocations stopped before they were solved aren't cached"""
+        for stopped_by in (
+            [{"rule": "timeout"}],
+            [{"rule": "mip_gap", "priority": 2, "gap": 0.01}],
+            [{"rule": "timeout", "components_skipped": 1}],
+        ):
+            self._cache(b"stopped", {}, stopped_by)
+            self.assertIsNone(get_cached_result(b"stopped"))
+
+    @override_settings(ALLOCATOR_RESULT_CACHE_SIZE=2)
+    def test_least_recently_used_eviction(self):
+        self._cache(b"first", {})
+        self._cache(b"second", {})
+        # Using the first result makes the second the least recently used
+        self.assertIsNotNone(get_cached_result(b"first"))
+        self._cache(b"third", {})
+        self.assertEqual(
+            {
+                bytes(data_hash)
+                for data_hash in CachedResult.objects.values_list(
+                    "data_hash", flat=True
+                )
+            },
+            {b"first", b"third"},
+        )
+        self._cache(b"fourth", {})
+        self.assertIsNone(get_cached_result(b"first"))
+        self.assertIsNotNone(get_cached_result(b"third"))
+
+
+class WorkerTest(TestCase):
+    @staticmethod
+    def _job(data_hash: bytes, minutes: int, **fields) -> AllocationState:
+        """Saves a queued allocation requested that many minutes ago"""
+        return AllocationState.objects.create(
+            timetable_id=uuid.uuid4(),
+            data_hash=data_hash,
+            request_time=timezone.now() - timedelta(minutes=minutes),
+            timeout=60,
+            **{
+                "type": AllocationStatus.REQUESTED,
+                "input_data": {},
+                **fields,
+            },
+        )
+
+    def _claim(self, pid: int) -> AllocationState:
+        with mock.patch("allocator.worker.os.getpid", return_value=pid):
+            return claim_next_job()
+
+    def test_concurrent_claims(self):
+        """Workers which read the queue before another worker claimed a job
+        don't claim it again"""
+        first = self._job(b"first", 2)
+        second = self._job(b"second", 1)
+        # Both workers see every job as queued
+        with mock.patch(
+            "allocator.worker._queued_jobs",
+            lambda: AllocationState.objects.order_by("request_time"),
+        ):
+            self.assertEqual(self._claim(101).pk, first.pk)
+            self.assertEqual(self._claim(102).pk, second.pk)
+            self.assertIsNone(self._claim(103))
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.pid, second.pid), (101, 102))
+        self.assertEqual(first.type, AllocationStatus.NOT_READY)
+
+    def test_skip_running_input_data(self):
+        """Jobs with the same input data as a running job wait for it"""
+        self._job(b"running", 3, pid=101, type=AllocationStatus.NOT_READY)
+        self._job(b"running", 2)
+        other = self._job(b"other", 1)
+        self.assertEqual(self._claim(102).pk, other.pk)
+        self.assertIsNone(self._claim(103))
+
+    def test_release_jobs(self):
+        """Jobs of a worker that quit stop holding back jobs with the same
+        input data"""
+        dead = self._job(b"data", 2, pid=101, type=AllocationStatus.NOT_READY)
+        waiting = self._job(b"data", 1)
+        self.assertFalse(_queued_jobs().exists())
+        self.assertEqual(release_jobs(101), 1)
+        dead.refresh_from_db()
+        self.assertEqual(dead.type, AllocationStatus.ERROR)
+        self.assertEqual(dead.title, KILLED_TITLE)
+        self.assertEqual(_queued_jobs().get().pk, waiting.pk)
+
+    def test_scheduling(self):
+        first = self._job(b"first", 2, priority=0)
+        urgent = self._job(b"urgent", 1, priority=5)
+        with override_settings(ALLOCATOR_SCHEDULING="fifo"):
+            self.assertEqual(_queued_jobs().first().pk, first.pk)
+        with override_settings(ALLOCATOR_SCHEDULING="priority"):
+            self.assertEqual(self._claim(101).pk, urgent.pk)
+            self.assertEqual(self._claim(102).pk, first.pk)
+
+    def test_run_cached_job(self):
+        """Jobs whose result was cached while they were queued aren't run"""
+        job = self._job(b"cached", 1)
+        CachedResult.objects.create(
+            data_hash=b"cached",
+            result={"stream": ["tutor"]},
+            runtime=5,
+            last_used=timezone.now(),
+        )
+        job = self._claim(os.getpid())
+        # Queued input data is empty, so running the job would fail
+        run_job(job, JobResources())
+        job.refresh_from_db()
+        self.assertEqual(job.type, AllocationStatus.GENERATED)
+        self.assertEqual(job.result, {"stream": ["tutor"]})
+        self.assertIsNone(job.pid)
+
+
+class TerminateProcessTreeTest(SimpleTestCase):
+    def test_children_terminated(self):
+        """Processes started by a terminated allocation are terminated too"""
+        sleep = [sys.executable, "-c", "import time; time.sleep(60)"]
+        parent = subprocess.Popen(
+            [
+                sys.executable,
+                "-c",
+                f"import subprocess; subprocess.run({sleep!r})",
+            ]
+        )
+        self.addCleanup(parent.wait)
+        process = psutil.Process(parent.pid)
+        for _ in range(100):
+            children = process.children(recursive=True)
+            if children:
+                break
+            time.sleep(0.05)
+        self.assertEqual(len(children), 1)
+        terminate_process_tree(parent.pid)
+        _, alive = psutil.wait_procs([process, *children], timeout=5)
+        self.assertEqual(alive, [])
+
+
+class ResourcesTest(SimpleTestCase):
+    @override_settings(
+        ALLOCATOR_THREADS_PER_JOB=0,
+        ALLOCATOR_MEMORY_PER_JOB=8,
+        ALLOCATOR_NODEFILE_START=0.5,
+        ALLOCATOR_NODEFILE_DIR="/tmp/nodes",
+    )
+    def test_job_resources(self):
+        resources = job_resources(jobs=2, threads=3)
+        self.assertEqual(
+            resources.gurobi_parameters(),
+            {
+                "Threads": 3,
+                "MemLimit": 8,
+                "NodefileStart": 4,
+                "NodefileDir": "/tmp/nodes",
+            },
+        )
+        self.assertEqual(
+            resources.split(2), JobResources(1, 4, 2, "/tmp/nodes")
+        )
+
+    @override_settings(ALLOCATOR_MEMORY_PER_JOB=0, ALLOCATOR_MEMORY_SHARE=0)
+    def test_unlimited_memory(self):
+        resources = job_resources(jobs=1)
+        self.assertIsNone(resources.mem_limit)
+        self.assertNotIn("NodefileStart", resources.gurobi_parameters())
+
+    def test_applied_resources(self):
+        data = InputData(**generate_payload(0, tutors=5, streams=10))
+        solver = Solver(
+            data.staff,
+            data.session_streams,
+            data.weeks,
+            resources=JobResources(threads=2, mem_limit=4, nodefile_start=1),
+        )
+        self.assertEqual(
+            solver.get_profile()["resources"],
+            {
+                "Threads": 2,
+                "MemLimit": 4,
+                "NodefileStart": 1,
+                "NodefileDir": ".",
+            },
+        )
@@ -35,6 +35,7 @@ class IsoDay(IntEnum):
 
 class AllocationStatus(StrEnum):
     REQUESTED = "REQUESTED"
+    QUEUED = "QUEUED"
     NOT_READY = "NOT_READY"
     NOT_EXIST = "NOT_EXIST"
     ERROR = "ERROR"
@@ -49,3 +50,7 @@ class AllocationOutput:
     message: str
     runtime: int
     result: dict = field(default_factory=dict)
+    # Stopping rules that ended the solve before the time limit
+    stopped_by: list = field(default_factory=list)
+    # Time taken by every phase of the allocation and solve statistics
+    stats: dict = field(default_factory=dict)
@@ -1,7 +1,19 @@
 from django.urls import path
-from allocator.views import request_allocation, check_allocation
+from allocator.views import (
+    request_allocation,
+    check_allocation,
+    request_batch_allocation,
+    check_batch_allocation,
+    request_allocation_async,
+    check_allocation_async,
+)
 
 urlpatterns = [
     path("request-allocation/", request_allocation),
     path("check-allocation/<str:timetable_id>", check_allocation),
+    path("request-batch-allocation/", request_batch_allocation),
+    path("check-batch-allocation/<str:batch_id>", check_batch_allocation),
+    # Served by ASGI servers, check-allocation supports long polls
+    path("async/request-allocation/", request_allocation_async),
+    path("async/check-allocation/<str:timetable_id>", check_allocation_async),
 ]
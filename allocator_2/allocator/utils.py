@@ -1,3 +1,6 @@
+import psutil
+
+
 def seconds_to_eta(seconds: int) -> str:
     if seconds < 120:
         return f"{seconds} seconds"
@@ -25,3 +28,24 @@ def seconds_to_time(seconds: int) -> str:
     if second_remainder > 0:
         str_time += plural("second", second_remainder)
     return str_time
+
+
+def terminate_process_tree(pid: int) -> None:
+    """
+    Terminates a process and every process it started, e.g. the processes
+    solving components of an allocation, which would otherwise keep solving
+    and holding Gurobi threads until their timeout.
+    Args:
+        pid: process to terminate
+    """
+    try:
+        process = psutil.Process(pid)
+        # Children are found before they're orphaned by their parent dying
+        processes = [process, *process.children(recursive=True)]
+    except psutil.NoSuchProcess:
+        return
+    for process in processes:
+        try:
+            process.terminate()
+        except psutil.NoSuchProcess:
+            pass
@@ -1,48 +1,140 @@
-import hashlib
-import json
+import dataclasses
 import multiprocessing as mp
+import uuid
+from collections import Counter
 from typing import Optional
 
 import psutil
 
-from django.http import JsonResponse
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.http import (
+    HttpResponseBadRequest,
+    HttpResponseNotAllowed,
+    JsonResponse,
+)
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST, require_GET
 from django.utils import timezone
 
+from .cache import cached_result_state, input_hash, get_cached_result
+from .decoding import (
+    InputError,
+    decode_input_data,
+    decode_request,
+    loads,
+    request_priority,
+)
 from .constants import (
+    INVALID_REQUEST_TITLE,
     REQUESTED_MESSAGE,
     REQUESTED_TITLE,
-    NOT_READY_TITLE,
-    NOT_READY_MESSAGE,
-    KILLED_TITLE,
-    KILLED_MESSAGE,
+    QUEUED_TITLE,
+    QUEUED_MESSAGE,
 )
-from .type_hints import AllocationStatus
-from .allocation import Allocator, _run_allocation
+from .type_hints import AllocationStatus, Allocation
+from .allocation import (
+    Allocator,
+    _run_allocation,
+    KILLED_STATE,
+    RUNNING_STATE,
+)
+from .long_poll import StatePoller, state_version
+from .resources import job_resources
+from .models import AllocationBatch, AllocationState, CachedResult
 from .schema import InputData
-from .models import AllocationState
-from .utils import seconds_to_eta
+from .utils import seconds_to_eta, terminate_process_tree
+from .worker import PENDING_STATUSES
 
+# Status type: fields saved when a checked allocation changes to that type
+_STATE_CHANGES = {
+    AllocationStatus.NOT_READY: RUNNING_STATE,
+    AllocationStatus.ERROR: KILLED_STATE,
+}
 
-def _replace_existing_allocation(
+
+def _start_allocation(
     allocation_state: AllocationState,
     allocator: Allocator,
-    timetable_id: str,
-    new_timeout: Optional[int] = None,
+    json_data: dict,
+    initial_allocation: Optional[Allocation] = None,
 ) -> None:
-    try:
-        proc = psutil.Process(pid=allocation_state.pid)
-        proc.terminate()
-    except psutil.NoSuchProcess:
-        pass
+    """
+    Saves the allocation state, then queues the allocation for the worker pool
+    if enabled, otherwise starts a new process to run it.
+    """
+    allocation_state.pid = None
+    allocation_state.progress = None
+    allocation_state.stopped_by = None
+    allocation_state.stats = None
+    if settings.ALLOCATOR_WORKER_POOL:
+        allocation_state.input_data = json_data
+        allocation_state.initial_allocation = initial_allocation
+        allocation_state.save()
+        return
+    # The new process only writes its result to the saved state
+    allocation_state.save()
+    allocator.set_initial_allocation(initial_allocation)
+    # Processes of other requests keep the resources they started with, the
+    # new one shares the machine with every running allocation
+    running = AllocationState.objects.filter(
+        type__in=(AllocationStatus.REQUESTED, AllocationStatus.NOT_READY),
+        pid__isnull=False,
+    ).count()
+    allocator.set_resources(job_resources(running + 1))
     new_process = mp.Process(
-        target=_run_allocation, args=(allocator, timetable_id)
+        target=_run_allocation,
+        args=(
+            allocator,
+            str(allocation_state.timetable_id),
+            bytes(allocation_state.data_hash),
+        ),
     )
     new_process.start()
+    allocation_state.pid = new_process.pid
+    AllocationState.objects.filter(
+        timetable_id=allocation_state.timetable_id
+    ).update(pid=new_process.pid)
+
+
+def _use_cached_result(
+    allocation_state: AllocationState, cached_result: CachedResult
+) -> None:
+    """Saves a cached result as the generated allocation, without running
+    the allocation again"""
+    for field, value in cached_result_state(cached_result).items():
+        setattr(allocation_state, field, value)
+    allocation_state.save()
+
+
+def _stop_allocation(allocation_state: AllocationState) -> None:
+    """Terminates the process running the allocation and the processes it
+    started, if it's running"""
+    if (
+        allocation_state.type
+        in (AllocationStatus.REQUESTED, AllocationStatus.NOT_READY)
+        and allocation_state.pid is not None
+    ):
+        terminate_process_tree(allocation_state.pid)
+
+
+def _replace_existing_allocation(
+    allocation_state: AllocationState,
+    allocator: Allocator,
+    json_data: dict,
+    data_hash: bytes,
+    priority: int,
+    new_timeout: Optional[int] = None,
+) -> None:
+    _stop_allocation(allocation_state)
+    # Start from the previous allocation, parts of it made infeasible by
+    # the new data are dropped by the solver
+    initial_allocation = allocation_state.result
     if new_timeout is not None:
         allocation_state.timeout = new_timeout
-    allocation_state.pid = new_process.pid
+    allocation_state.data_hash = data_hash
+    allocation_state.priority = priority
     allocation_state.result = None
     allocation_state.type = AllocationStatus.REQUESTED
     allocation_state.message = REQUESTED_MESSAGE.format(
@@ -50,18 +142,54 @@ def _replace_existing_allocation(
     )
     allocation_state.title = "Allocation Successfully Requested"
     allocation_state.request_time = timezone.now()
-    allocation_state.save()
+    cached_result = get_cached_result(data_hash)
+    if cached_result is not None:
+        _use_cached_result(allocation_state, cached_result)
+        return
+    _start_allocation(
+        allocation_state, allocator, json_data, initial_allocation
+    )
 
 
-@csrf_exempt
-@require_POST
-def request_allocation(request):
-    # TODO: later upgrade to realtime notification using Redis
-    json_data = json.loads(request.body)["data"]
-    data_hash = hashlib.sha256(
-        json.dumps(json_data, separators=(":", ",")).encode()
-    ).digest()
-    data = InputData(**json_data)
+def _parse_uuid(value: str, path: str) -> uuid.UUID:
+    """
+    Parses an id in the URL of a request.
+    Args:
+        value: id in the URL
+        path: name of the id in error messages
+    Returns: the parsed id
+    Raises:
+        InputError: if the id isn't a UUID
+    """
+    try:
+        return uuid.UUID(value)
+    except ValueError:
+        raise InputError(f"{path}: expected UUID")
+
+
+def _invalid_request(error: InputError) -> JsonResponse:
+    return JsonResponse(
+        {
+            "type": AllocationStatus.ERROR,
+            "message": str(error),
+            "title": INVALID_REQUEST_TITLE,
+        },
+        status=400,
+    )
+
+
+def _allocate(request_data: dict, data: InputData, data_hash: bytes) -> dict:
+    """
+    Requests the allocation of a timetable, unless it's already allocated or
+    being allocated with the same input data.
+    Args:
+        request_data: parsed allocation request
+        data: input data of the request
+        data_hash: hash of the input data of the request
+    Returns: status of the allocation
+    """
+    json_data = request_data["data"]
+    priority = request_priority(request_data)
     allocator = Allocator(data)
     timetable_id = data.timetable_id
     try:
@@ -71,110 +199,348 @@ def request_allocation(request):
         # Found object, request already made
         # Hash matches, no state change
         if data_hash == allocation_state.data_hash:
-            if allocation_state.type in (
-                AllocationStatus.REQUESTED,
-                AllocationStatus.NOT_READY,
-            ):
-                # Result not found yet, allocation still running
-                if allocation_state.type == AllocationStatus.REQUESTED:
-                    allocation_state.type = AllocationStatus.NOT_READY
-                    allocation_state.title = NOT_READY_TITLE
-                    allocation_state.message = NOT_READY_MESSAGE
-                    allocation_state.save()
-                eta = int(
-                    allocation_state.request_time.timestamp()
-                    + allocation_state.timeout
-                    - timezone.now().timestamp()
-                )
-                allocation_state.message = allocation_state.message.format(
-                    time=seconds_to_eta(max(eta, 0))
-                )
+            if allocation_state.type in PENDING_STATUSES:
+                # Allocation still queued or running
+                _save_state_changes([allocation_state])
+                status = _state_status(allocation_state)
+                return {
+                    key: status[key]
+                    for key in ("type", "message", "title", "result")
+                }
             elif allocation_state.type == AllocationStatus.ERROR:
                 _replace_existing_allocation(
-                    allocation_state, allocator, timetable_id
+                    allocation_state, allocator, json_data, data_hash, priority
                 )
         else:
             # Hash doesn't match, request remade with modified data
             _replace_existing_allocation(
-                allocation_state, allocator, timetable_id, data.timeout
+                allocation_state,
+                allocator,
+                json_data,
+                data_hash,
+                priority,
+                data.timeout,
             )
     except AllocationState.DoesNotExist:
         # No object found, new request
-        new_process = mp.Process(
-            target=_run_allocation, args=(allocator, timetable_id)
-        )
-        new_process.start()
         allocation_state = AllocationState(
             timetable_id=timetable_id,
             data_hash=data_hash,
-            pid=new_process.pid,
             request_time=timezone.now(),
             timeout=data.timeout,
+            priority=priority,
             type=AllocationStatus.REQUESTED,
             title=REQUESTED_TITLE,
             message=REQUESTED_MESSAGE,
         )
-        allocation_state.save()
-        allocation_state.message = allocation_state.message.format(
-            time=seconds_to_eta(data.timeout)
-        )
+        cached_result = get_cached_result(data_hash)
+        if cached_result is not None:
+            _use_cached_result(allocation_state, cached_result)
+        else:
+            _start_allocation(allocation_state, allocator, json_data)
+            allocation_state.message = allocation_state.message.format(
+                time=seconds_to_eta(data.timeout)
+            )
+    return {
+        "type": allocation_state.type,
+        "message": allocation_state.message,
+        "title": allocation_state.title,
+        "result": allocation_state.result,
+    }
+
+
+def _request_allocation(body: bytes) -> JsonResponse:
+    """Requests the allocation of the request body, see request_allocation"""
+    try:
+        request_data, data = decode_request(body)
+    except InputError as error:
+        return _invalid_request(error)
     return JsonResponse(
-        {
-            "type": allocation_state.type,
-            "message": allocation_state.message,
-            "title": allocation_state.title,
-            "result": allocation_state.result,
-        }
+        _allocate(request_data, data, input_hash(request_data["data"]))
     )
 
 
-@require_GET
-def check_allocation(request, timetable_id):
+def _state_change(
+    allocation_state: AllocationState,
+) -> Optional[AllocationStatus]:
+    """
+    Finds how checking an allocation changes its saved state: requested
+    allocations whose process started are running, and those whose process
+    can't be found anymore were killed. Queued allocations don't have a
+    process yet and don't change.
+    Args:
+        allocation_state: checked allocation state
+    Returns: status type the allocation changes to, see _STATE_CHANGES, None
+        if it doesn't change
+    """
+    if (
+        allocation_state.type not in PENDING_STATUSES
+        or allocation_state.pid is None
+    ):
+        return None
+    if not psutil.pid_exists(allocation_state.pid):
+        # For some reason cannot find pid, maybe process was killed
+        return AllocationStatus.ERROR
+    if allocation_state.type == AllocationStatus.REQUESTED:
+        return AllocationStatus.NOT_READY
+    return None
+
+
+def _save_state_changes(allocation_states: list[AllocationState]) -> None:
+    """
+    Saves how checking the allocations changes their state, see
+    _state_change, with a single query for every status type they change to,
+    and applies the changes to the allocation states.
+    """
+    changed: dict[AllocationStatus, list[AllocationState]] = {}
+    for allocation_state in allocation_states:
+        new_type = _state_change(allocation_state)
+        if new_type is not None:
+            changed.setdefault(new_type, []).append(allocation_state)
+    updated_at = timezone.now()
+    for new_type, states in changed.items():
+        fields = _STATE_CHANGES[new_type]
+        # Only the status is written, a full save could overwrite a result
+        # saved by the allocation in the meantime
+        AllocationState.objects.filter(
+            timetable_id__in=[state.timetable_id for state in states],
+            type__in=PENDING_STATUSES,
+        ).update(updated_at=updated_at, **fields)
+        for allocation_state in states:
+            allocation_state.updated_at = updated_at
+            for field, value in fields.items():
+                setattr(allocation_state, field, value)
+
+
+def _state_status(allocation_state: AllocationState) -> dict:
+    """Returns the status of an allocation, see check_allocation. Changes of
+    the state by the check must be saved first, see _save_state_changes"""
+    status_type = allocation_state.type
+    title = allocation_state.title
+    message = allocation_state.message
+    if status_type in PENDING_STATUSES:
+        if allocation_state.pid is None:
+            # Waiting for a worker, or for its process to start
+            status_type = AllocationStatus.QUEUED
+            title = QUEUED_TITLE
+            message = QUEUED_MESSAGE
+        else:
+            eta = int(
+                allocation_state.request_time.timestamp()
+                + allocation_state.timeout
+                - timezone.now().timestamp()
+            )
+            message = message.format(time=seconds_to_eta(max(eta, 0)))
+    # Progress of a running allocation, with its best allocation so far
+    progress = dict(allocation_state.progress or {})
+    best_result = progress.pop("best_allocation", None)
+    return {
+        "type": status_type,
+        "message": message,
+        "title": title,
+        "result": allocation_state.result,
+        "progress": progress or None,
+        "best_result": best_result,
+        "stopped_by": allocation_state.stopped_by,
+        "stats": allocation_state.stats,
+        "version": state_version(allocation_state.updated_at),
+    }
+
+
+def _allocation_status(timetable_id: uuid.UUID) -> dict:
+    """Returns the allocation state of the timetable, see check_allocation"""
     try:
         allocation_state = AllocationState.objects.get(
             timetable_id=timetable_id
         )
-        # Request has been made
-        if allocation_state.type in (
-            AllocationStatus.REQUESTED,
-            AllocationStatus.NOT_READY,
-        ):
-            if psutil.pid_exists(allocation_state.pid):
-                # Result not found yet, allocation still running
-                if allocation_state.type == AllocationStatus.REQUESTED:
-                    allocation_state.type = AllocationStatus.NOT_READY
-                    allocation_state.title = NOT_READY_TITLE
-                    allocation_state.message = NOT_READY_MESSAGE
-                    allocation_state.save()
-                eta = int(
-                    allocation_state.request_time.timestamp()
-                    + allocation_state.timeout
-                    - timezone.now().timestamp()
-                )
-                allocation_state.message = allocation_state.message.format(
-                    time=seconds_to_eta(max(eta, 0))
-                )
-            else:
-                # For some reason cannot find pid, maybe process was killed
-                allocation_state.type = AllocationStatus.ERROR
-                allocation_state.title = KILLED_TITLE
-                allocation_state.message = KILLED_MESSAGE
-                allocation_state.save()
-        return JsonResponse(
-            {
-                "type": allocation_state.type,
-                "message": allocation_state.message,
-                "title": allocation_state.title,
-                "result": allocation_state.result,
-            }
-        )
     except AllocationState.DoesNotExist:
         # Request has not been made
+        return {
+            "type": AllocationStatus.NOT_EXIST,
+            "message": "No request for an allocation of this timetable "
+            "has been made",
+            "title": "Allocation not found",
+            "version": None,
+        }
+    _save_state_changes([allocation_state])
+    return _state_status(allocation_state)
+
+
+@csrf_exempt
+@require_POST
+def request_allocation(request):
+    # TODO: later upgrade to realtime notification using Redis
+    return _request_allocation(request.body)
+
+
+@require_GET
+def check_allocation(request, timetable_id):
+    try:
+        timetable_id = _parse_uuid(timetable_id, "timetable_id")
+    except InputError as error:
+        return _invalid_request(error)
+    return JsonResponse(_allocation_status(timetable_id))
+
+
+def _decode_batch(body: bytes) -> list[tuple[dict, InputData, bytes]]:
+    """
+    Parses a batch of allocation requests, decoding input data shared by
+    several timetables only once.
+    Args:
+        body: JSON object with the allocation requests in its requests member
+    Returns: parsed request, input data and its hash of every request
+    Raises:
+        InputError: if the batch isn't valid JSON or a request is invalid
+    """
+    batch_data = loads(body)
+    if (
+        type(batch_data) is not dict
+        or type(batch_data.get("requests")) is not list
+    ):
+        raise InputError("request: expected object with requests array")
+    # data hash: input data decoded for that hash
+    decoded: dict[bytes, InputData] = {}
+    timetable_ids = set()
+    requests = []
+    for index, request_data in enumerate(batch_data["requests"]):
+        path = f"requests[{index}]"
+        if type(request_data) is not dict or "data" not in request_data:
+            raise InputError(f"{path}: expected object with data member")
+        request_priority(request_data, path)
+        json_data = request_data["data"]
+        data_hash = input_hash(json_data) if type(json_data) is dict else None
+        data = decoded.get(data_hash)
+        if data is None:
+            try:
+                data = decode_input_data(json_data)
+            except InputError as error:
+                raise InputError(f"{path}.{error}")
+            decoded[data_hash] = data
+        else:
+            # Only the timetable differs from the input data of an earlier
+            # request, which is checked already
+            timetable_id = json_data.get("timetable_id")
+            if type(timetable_id) is not str:
+                raise InputError(f"{path}.data.timetable_id: expected string")
+            data = dataclasses.replace(data, timetable_id=timetable_id)
+        if data.timetable_id in timetable_ids:
+            raise InputError(
+                f"{path}.data.timetable_id: {data.timetable_id} is already "
+                f"in the batch"
+            )
+        timetable_ids.add(data.timetable_id)
+        requests.append((request_data, data, data_hash))
+    return requests
+
+
+@csrf_exempt
+@require_POST
+def request_batch_allocation(request):
+    """
+    Requests the allocation of many timetables at once, queued for the
+    allocation workers. Timetables with the same input data are allocated
+    once. Returns the id of the batch, for check_batch_allocation, and the
+    status of every allocation by timetable.
+    """
+    if not settings.ALLOCATOR_WORKER_POOL:
+        return _invalid_request(
+            InputError(
+                "Batch allocations are run by allocation workers, which "
+                "aren't enabled"
+            )
+        )
+    try:
+        requests = _decode_batch(request.body)
+    except InputError as error:
+        return _invalid_request(error)
+    # Allocations are only queued, so a single transaction saves them all
+    with transaction.atomic():
+        batch = AllocationBatch.objects.create()
+        statuses = {
+            data.timetable_id: _allocate(request_data, data, data_hash)
+            for request_data, data, data_hash in requests
+        }
+        batch.allocations.add(*statuses)
+    return JsonResponse({"batch_id": batch.id, "allocations": statuses})
+
+
+@require_GET
+def check_batch_allocation(request, batch_id):
+    """Returns the status of every allocation of a batch by timetable, and
+    the number of allocations of every status type"""
+    try:
+        batch_id = _parse_uuid(batch_id, "batch_id")
+    except InputError as error:
+        return _invalid_request(error)
+    # Input data is only read by the workers
+    allocation_states = list(
+        AllocationState.objects.filter(batches=batch_id).defer(
+            "input_data", "initial_allocation"
+        )
+    )
+    _save_state_changes(allocation_states)
+    statuses = {
+        str(allocation_state.timetable_id): _state_status(allocation_state)
+        for allocation_state in allocation_states
+    }
+    # Batches have at least one allocation
+    if (
+        not statuses
+        and not AllocationBatch.objects.filter(pk=batch_id).exists()
+    ):
         return JsonResponse(
             {
                 "type": AllocationStatus.NOT_EXIST,
-                "message": "No request for an allocation of this timetable "
-                "has been made",
-                "title": "Allocation not found",
+                "message": "No batch of allocations with this id",
+                "title": "Batch not found",
             }
         )
+    return JsonResponse(
+        {
+            "batch_id": batch_id,
+            "allocations": statuses,
+            "counts": Counter(status["type"] for status in statuses.values()),
+        }
+    )
+
+
+# Django 3.2 decorators don't support async views, so these check the method
+# and are exempted from CSRF themselves
+async def request_allocation_async(request):
+    """Same as request_allocation, for ASGI servers"""
+    if request.method != "POST":
+        return HttpResponseNotAllowed(["POST"])
+    return await sync_to_async(_request_allocation)(request.body)
+
+
+request_allocation_async.csrf_exempt = True
+
+
+async def check_allocation_async(request, timetable_id):
+    """
+    Same as check_allocation, for ASGI servers. Given the version of an
+    earlier response in since, and wait seconds, returns as soon as the
+    allocation state changes from that version, or after waiting that long,
+    so that clients learn of new progress and results without polling.
+    Clients send an empty since if the allocation wasn't requested yet.
+    """
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
+    try:
+        timetable_id = _parse_uuid(timetable_id, "timetable_id")
+    except InputError as error:
+        return _invalid_request(error)
+    try:
+        wait = min(
+            float(request.GET.get("wait", 0)),
+            settings.ALLOCATOR_LONG_POLL_TIMEOUT,
+        )
+    except ValueError:
+        return HttpResponseBadRequest("wait must be a number of seconds")
+    status = await sync_to_async(_allocation_status)(timetable_id)
+    since = request.GET.get("since")
+    if wait > 0 and since == (status["version"] or ""):
+        poller = StatePoller.current(settings.ALLOCATOR_LONG_POLL_INTERVAL)
+        if await poller.wait(timetable_id, status["version"], wait):
+            status = await sync_to_async(_allocation_status)(timetable_id)
+    return JsonResponse(status)
@@ -0,0 +1,170 @@
+import multiprocessing as mp
+import os
+import signal
+import time
+from typing import Optional
+
+from django.conf import settings
+from django.db import connections
+
+from .allocation import (
+    Allocator,
+    _allocation_result,
+    KILLED_STATE,
+    RUNNING_STATE,
+)
+from .cache import cache_result, cached_result_state, get_cached_result
+from .decoding import decode_input_data
+from .models import AllocationState
+from .resources import JobResources
+from .type_hints import AllocationStatus
+from .utils import terminate_process_tree
+
+PENDING_STATUSES = (AllocationStatus.REQUESTED, AllocationStatus.NOT_READY)
+
+
+def _queued_jobs():
+    # Jobs with the same input data as a running job wait for its result,
+    # which is then cached
+    running = AllocationState.objects.filter(
+        type__in=PENDING_STATUSES, pid__isnull=False
+    ).values("data_hash")
+    queued = AllocationState.objects.filter(
+        type__in=PENDING_STATUSES,
+        pid__isnull=True,
+        input_data__isnull=False,
+    ).exclude(data_hash__in=running)
+    if settings.ALLOCATOR_SCHEDULING == "priority":
+        return queued.order_by("-priority", "request_time")
+    return queued.order_by("request_time")
+
+
+def claim_next_job() -> Optional[AllocationState]:
+    """
+    Claims the next queued allocation for this process
+    Returns: the claimed allocation state, or None if nothing is queued
+    """
+    pid = os.getpid()
+    queued = _queued_jobs().values_list("timetable_id", flat=True)
+    for timetable_id in queued[:10]:
+        # Another worker may have claimed the job in the meantime
+        claimed = AllocationState.objects.filter(
+            timetable_id=timetable_id, pid__isnull=True
+        ).update(pid=pid, **RUNNING_STATE)
+        if claimed:
+            return AllocationState.objects.get(timetable_id=timetable_id)
+    return None
+
+
+def run_job(allocation_state: AllocationState, resources: JobResources):
+    """Runs a claimed allocation and saves its result"""
+    # The job is replaced and requeued if its data changes while running
+    claimed = AllocationState.objects.filter(
+        timetable_id=allocation_state.timetable_id, pid=os.getpid()
+    )
+    cached_result = get_cached_result(bytes(allocation_state.data_hash))
+    if cached_result is not None:
+        claimed.update(**cached_result_state(cached_result))
+        return
+    allocator = Allocator(
+        decode_input_data(allocation_state.input_data),
+        initial_allocation=allocation_state.initial_allocation,
+        resources=resources,
+        progress=lambda progress: claimed.update(progress=progress),
+        progress_interval=settings.ALLOCATOR_PROGRESS_INTERVAL,
+    )
+    result = _allocation_result(allocator)
+    claimed.update(pid=None, **result)
+    cache_result(bytes(allocation_state.data_hash), result)
+
+
+def release_jobs(pid: int) -> int:
+    """
+    Marks the jobs claimed by a worker that quit as killed, so that jobs with
+    the same input data don't wait for them.
+    Args:
+        pid: process id of the worker
+    Returns: number of released jobs
+    """
+    return AllocationState.objects.filter(
+        type__in=PENDING_STATUSES, pid=pid
+    ).update(**KILLED_STATE)
+
+
+def _worker_main(resources: JobResources, poll_interval: float):
+    # Terminating a worker and its processes is how running jobs are
+    # cancelled
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    # Database connections must not be shared with the parent process
+    connections.close_all()
+    while True:
+        allocation_state = claim_next_job()
+        if allocation_state is None:
+            time.sleep(poll_interval)
+            continue
+        run_job(allocation_state, resources)
+
+
+class WorkerPool:
+    """
+    Fixed number of long-lived worker processes which run queued allocations
+    from the AllocationState table. Workers that die, e.g. because their job
+    was cancelled, are replaced, and the job they were running is reported
+    as killed.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        resources: JobResources,
+        poll_interval: float,
+    ):
+        """
+        Args:
+            workers: number of worker processes
+            resources: resources of the allocation run by every worker
+            poll_interval: seconds idle workers wait before checking the
+                queue again
+        """
+        self._workers = workers
+        self._resources = resources
+        self._poll_interval = poll_interval
+        # Workers may start their own processes, so they can't be daemons
+        self._context = mp.get_context("fork")
+        self._processes: list[mp.Process] = []
+        self._running = False
+
+    def _start_worker(self) -> mp.Process:
+        process = self._context.Process(
+            target=_worker_main,
+            args=(self._resources, self._poll_interval),
+            daemon=False,
+        )
+        process.start()
+        return process
+
+    def _stop(self, *_):
+        self._running = False
+
+    def run(self):
+        """Runs the workers until this process is interrupted or terminated"""
+        connections.close_all()
+        self._running = True
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        self._processes = [self._start_worker() for _ in range(self._workers)]
+        try:
+            while self._running:
+                for index, process in enumerate(self._processes):
+                    if not process.is_alive():
+                        process.join()
+                        release_jobs(process.pid)
+                        self._processes[index] = self._start_worker()
+                time.sleep(self._poll_interval)
+        finally:
+            for process in self._processes:
+                terminate_process_tree(process.pid)
+            for process in self._processes:
+                process.join()
+                release_jobs(process.pid)
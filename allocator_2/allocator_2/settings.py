@@ -127,3 +127,63 @@ STATIC_URL = "/static/"
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+
+# Allocation workers
+# When enabled, allocation requests are queued in the database and run by
+# `python manage.py run_allocation_workers` instead of a process per request
+
+ALLOCATOR_WORKER_POOL = os.environ.get("ALLOCATOR_WORKER_POOL") == "1"
+
+# Number of allocations to run at once
+ALLOCATOR_WORKERS = int(
+    os.environ.get("ALLOCATOR_WORKERS", max(1, (os.cpu_count() or 1) // 4))
+)
+
+# Gurobi threads per allocation, 0 splits cores evenly between workers
+ALLOCATOR_THREADS_PER_JOB = int(os.environ.get("ALLOCATOR_THREADS_PER_JOB", 0))
+
+# Most memory in GB Gurobi may use per allocation, 0 splits
+# ALLOCATOR_MEMORY_SHARE of the memory of the machine evenly between workers
+ALLOCATOR_MEMORY_PER_JOB = float(os.environ.get("ALLOCATOR_MEMORY_PER_JOB", 0))
+
+# Share of the memory of the machine used by all allocations, 0 doesn't limit
+# their memory
+ALLOCATOR_MEMORY_SHARE = float(os.environ.get("ALLOCATOR_MEMORY_SHARE", 0.8))
+
+# Share of the memory limit of an allocation used by branch and bound nodes
+# before further nodes are written to disk, 0 keeps every node in memory
+ALLOCATOR_NODEFILE_START = float(
+    os.environ.get("ALLOCATOR_NODEFILE_START", 0.5)
+)
+
+# Directory of the node files, defaults to the temporary directory
+ALLOCATOR_NODEFILE_DIR = os.environ.get("ALLOCATOR_NODEFILE_DIR", "")
+
+# Order queued allocations are run in, either "fifo" or "priority"
+ALLOCATOR_SCHEDULING = os.environ.get("ALLOCATOR_SCHEDULING", "fifo")
+
+# Seconds idle workers wait before checking the queue again
+ALLOCATOR_POLL_INTERVAL = float(os.environ.get("ALLOCATOR_POLL_INTERVAL", 1))
+
+# Number of generated allocations kept for reuse by requests with identical
+# input data, 0 disables the cache
+ALLOCATOR_RESULT_CACHE_SIZE = int(
+    os.environ.get("ALLOCATOR_RESULT_CACHE_SIZE", 256)
+)
+
+# Minimum seconds between progress updates saved by a running allocation
+ALLOCATOR_PROGRESS_INTERVAL = float(
+    os.environ.get("ALLOCATOR_PROGRESS_INTERVAL", 5)
+)
+
+# Longest a long poll of check-allocation waits for a change, in seconds
+ALLOCATOR_LONG_POLL_TIMEOUT = float(
+    os.environ.get("ALLOCATOR_LONG_POLL_TIMEOUT", 30)
+)
+
+# Seconds between checks for changes of the allocations waited on by long
+# polls, all long polls of a server process share these checks
+ALLOCATOR_LONG_POLL_INTERVAL = float(
+    os.environ.get("ALLOCATOR_LONG_POLL_INTERVAL", 0.5)
+)
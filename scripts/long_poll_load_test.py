@@ -0,0 +1,221 @@
+"""
+Load test of check-allocation, comparing clients polling it with clients
+long polling the async endpoint.
+
+Runs the ASGI application in this process against a temporary database,
+with running allocations saving progress at a fixed interval, and reports
+the requests made, the database queries they ran, and how long clients took
+to see new progress. Run from the repository root:
+
+    python scripts/long_poll_load_test.py --clients 200 --duration 20
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from urllib.parse import urlencode
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "allocator_2"))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "allocator_2.settings")
+os.environ.setdefault("DJANGO_SECRET", "load-test")
+
+
+def setup_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--clients", type=int, default=200, help="number of waiting clients"
+    )
+    parser.add_argument(
+        "--timetables",
+        type=int,
+        default=20,
+        help="number of running allocations the clients wait on",
+    )
+    parser.add_argument(
+        "--duration", type=float, default=20, help="seconds each mode runs"
+    )
+    parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=1,
+        help="seconds between requests of polling clients",
+    )
+    parser.add_argument(
+        "--progress-interval",
+        type=float,
+        default=5,
+        help="seconds between progress saved by every allocation",
+    )
+    return parser
+
+
+class _Stats:
+    def __init__(self):
+        self.requests = 0
+        self.queries = 0
+        # Seconds between progress being saved and a client receiving it
+        self.delays: list[float] = []
+
+    def count_query(self, execute, sql, params, many, context):
+        self.queries += 1
+        return execute(sql, params, many, context)
+
+
+async def _get(application, path: str, query: str = "") -> dict:
+    """Sends a GET request to the ASGI application, returns the JSON body"""
+    import json
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": [(b"host", b"localhost")],
+        "client": ("127.0.0.1", 0),
+        "server": ("localhost", 80),
+    }
+    body = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.body":
+            body.append(message.get("body", b""))
+
+    await application(scope, receive, send)
+    return json.loads(b"".join(body))
+
+
+async def _save_progress(timetable_ids, saved: dict, interval: float, end):
+    from asgiref.sync import sync_to_async
+    from allocator.models import AllocationState
+
+    step = 0
+    while time.perf_counter() < end:
+        for timetable_id in timetable_ids:
+            step += 1
+            await sync_to_async(
+                AllocationState.objects.filter(timetable_id=timetable_id).update
+            )(progress={"incumbent": step})
+            saved[timetable_id] = time.perf_counter()
+            # Allocations report progress at different times
+            await asyncio.sleep(interval / len(timetable_ids))
+
+
+async def _client(application, timetable_id, saved, stats, args, end, long):
+    path = f"/allocator/async/check-allocation/{timetable_id}"
+    version = None
+    while time.perf_counter() < end:
+        query = ""
+        if long and version is not None:
+            query = urlencode(
+                {"since": version, "wait": end - time.perf_counter()}
+            )
+        status = await _get(application, path, query)
+        stats.requests += 1
+        if version is not None and status["version"] != version:
+            stats.delays.append(time.perf_counter() - saved[timetable_id])
+        version = status["version"]
+        if not long:
+            await asyncio.sleep(args.poll_interval)
+
+
+async def _run_mode(application, timetable_ids, args, long: bool) -> _Stats:
+    from asgiref.sync import sync_to_async
+    from django.db import connection
+
+    stats = _Stats()
+    # Views query the database from the thread of sync_to_async, which has
+    # its own connection
+    await sync_to_async(
+        lambda: connection.execute_wrappers.append(stats.count_query)
+    )()
+    saved = {}
+    end = time.perf_counter() + args.duration
+    await asyncio.gather(
+        _save_progress(timetable_ids, saved, args.progress_interval, end),
+        *(
+            _client(
+                application,
+                timetable_ids[client % len(timetable_ids)],
+                saved,
+                stats,
+                args,
+                end,
+                long,
+            )
+            for client in range(args.clients)
+        ),
+    )
+    await sync_to_async(
+        lambda: connection.execute_wrappers.remove(stats.count_query)
+    )()
+    return stats
+
+
+def _report(name: str, stats: _Stats, duration: float):
+    delays = sorted(stats.delays) or [float("nan")]
+    print(
+        f"{name:<10} {stats.requests / duration:>10.1f} "
+        f"{stats.queries / duration:>10.1f} "
+        f"{statistics.mean(delays) * 1000:>10.0f} "
+        f"{delays[int(len(delays) * 0.95)] * 1000:>10.0f}"
+    )
+
+
+def main():
+    args = setup_parser().parse_args()
+    import django
+    from django.conf import settings
+
+    with tempfile.TemporaryDirectory() as directory:
+        settings.DATABASES["default"]["NAME"] = Path(directory) / "db.sqlite3"
+        settings.ALLOWED_HOSTS = ["localhost"]
+        django.setup()
+        from django.core.management import call_command
+        from django.utils import timezone
+        from allocator.models import AllocationState
+        from allocator.type_hints import AllocationStatus
+        from allocator_2.asgi import application
+
+        call_command("migrate", verbosity=0)
+        timetable_ids = [uuid.uuid4() for _ in range(args.timetables)]
+        AllocationState.objects.bulk_create(
+            AllocationState(
+                timetable_id=timetable_id,
+                data_hash=b"",
+                request_time=timezone.now(),
+                timeout=3600,
+                type=AllocationStatus.NOT_READY,
+                message="Estimated time remaining: {time}.",
+            )
+            for timetable_id in timetable_ids
+        )
+        print(
+            f"{args.clients} clients waiting on {args.timetables} "
+            f"allocations saving progress every {args.progress_interval}s"
+        )
+        print(
+            f"{'mode':<10} {'requests/s':>10} {'queries/s':>10} "
+            f"{'delay ms':>10} {'p95 ms':>10}"
+        )
+        for name, long in (("poll", False), ("long poll", True)):
+            stats = asyncio.run(
+                _run_mode(application, timetable_ids, args, long)
+            )
+            _report(name, stats, args.duration)
+
+
+if __name__ == "__main__":
+    main()